@@ -19,6 +19,14 @@ class UserResponse(UserBase):
     class Config:
         orm_mode = True
 
+class Principal(BaseModel):
+    """Snapshot of an authenticated user and their roles; safe to share across requests."""
+    id: int
+    username: Optional[str]
+    email: str
+    created_at: Optional[datetime]
+    roles: List[str] = []
+
 class RoleBase(BaseModel):
     name: str
 
@@ -12,7 +12,7 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(50), unique=True, index=True)
     hashed_password = Column(String(255))
-    email = Column(String(100))
+    email = Column(String(100), index=True)
     created_at = Column(TIMESTAMP, default=datetime.utcnow)
     roles = relationship("Role", secondary="user_roles", back_populates="users")
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, TIMESTAMP, ForeignKey, Integer
+from sqlalchemy import Column, String, Float, TIMESTAMP, ForeignKey, Integer, BigInteger, Text, JSON, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -51,3 +51,84 @@ class YearlyAverageConsumption(Base):
     year = Column(Integer)  # Store the year for which the average is applicable
 
     product = relationship("Product")
+
+    # One average per product and year; bulk upserts key on it and latest_averages() joins back on it
+    __table_args__ = (UniqueConstraint('product_code', 'year', name='uq_yearly_average_product_year'),)
+
+
+class ConsumptionTotal(Base):
+    # Consumption uploaded from files per (product, year), summed over uploads; see app.utils.averages
+    __tablename__ = 'consumption_totals'
+    product_code = Column(String(50), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    consumed = Column(Float)
+
+
+class ConsumptionCoverage(Base):
+    # Days of each year the uploaded consumption files cover, summed over uploads
+    __tablename__ = 'consumption_coverage'
+    year = Column(Integer, primary_key=True)
+    observed_days = Column(Float)
+
+
+class StockRollup(Base):
+    # Inventory totals per (product, warehouse), kept current by app.utils.rollups.
+    # City and region totals group this table, not the inventory.
+    __tablename__ = 'stock_rollup'
+    product_code = Column(String(50), primary_key=True)
+    warehouse_code = Column(String(50), primary_key=True, index=True)
+    quantity = Column(BigInteger)
+    row_count = Column(Integer)  # inventory rows behind the total
+
+
+class InventorySnapshot(Base):
+    # One per upload or inventory edit; its rows in inventory_history are what changed
+    __tablename__ = 'inventory_snapshots'
+    id = Column(Integer, primary_key=True)
+    taken_at = Column(TIMESTAMP, index=True)
+    source = Column(String(20))  # replace / delta / upsert / api / baseline
+    changed_rows = Column(Integer)
+
+
+class InventoryHistory(Base):
+    # Append-only: an inventory row's values whenever a snapshot changed it. A row
+    # that was deleted, or moved to another product or warehouse, gets a NULL
+    # quantity under its old codes. Ids grow with time, so the latest row of an
+    # inventory code at or before a snapshot is its state in that snapshot.
+    __tablename__ = 'inventory_history'
+    id = Column(Integer, primary_key=True)
+    snapshot_id = Column(Integer, ForeignKey('inventory_snapshots.id'), index=True)
+    inventory_code = Column(String(50))
+    product_code = Column(String(50))
+    warehouse_code = Column(String(50))
+    quantity = Column(Integer)
+    __table_args__ = (
+        Index('ix_inventory_history_inventory', 'inventory_code', 'id'),
+        Index('ix_inventory_history_product', 'product_code', 'id'),
+    )
+
+
+class InventorySearchTerm(Base):
+    # Prefix index for inventory search: every code and product name word of an
+    # inventory row, lowercased. The primary key doubles as the term index.
+    __tablename__ = 'inventory_search_terms'
+    term = Column(String(100), primary_key=True)
+    inventory_code = Column(String(50), primary_key=True)
+    weight = Column(Integer)
+
+
+class ImportJob(Base):
+    __tablename__ = 'import_jobs'
+    job_id = Column(String(36), primary_key=True)
+    kind = Column(String(20))  # inventory / products / averages
+    filename = Column(String(255))
+    status = Column(String(20), index=True)  # queued, running, succeeded, failed
+    worker = Column(String(100))  # host:pid that owns the job
+    rows_processed = Column(Integer, default=0)
+    rows_per_sec = Column(Float)
+    result = Column(JSON)
+    error = Column(Text)
+    created_at = Column(TIMESTAMP)
+    started_at = Column(TIMESTAMP)
+    finished_at = Column(TIMESTAMP)
+    heartbeat_at = Column(TIMESTAMP)  # renewed while running; a stale one frees the job's slot
@@ -1,7 +1,7 @@
-from datetime import datetime
+from datetime import date, datetime
 
 from pydantic import BaseModel
-from typing import List, Generic, TypeVar, Optional
+from typing import List, Generic, TypeVar, Optional, Dict, Any
 
 T = TypeVar('T')
 
@@ -13,6 +13,18 @@ class PaginatedResponse(BaseModel, Generic[T]):
     data: List[T]
 
 
+class CursorPaginatedResponse(BaseModel, Generic[T]):
+    total_count: Optional[int]  # None when include_total=false
+    page_size: int
+    next_cursor: Optional[str]  # None on the last page
+    data: List[T]
+
+
+class BatchGetResponse(BaseModel, Generic[T]):
+    data: List[T]  # in the order the codes were requested
+    missing: List[str]
+
+
 #------------------------------------------------------------------------------
 class ProductBase(BaseModel):
     product_code: str
@@ -111,3 +123,83 @@ class YearlyAverageConsumption(YearlyAverageConsumptionBase):
 
     class Config:
         orm_mode = True
+
+
+#------------------------------------------------------------------------------
+class StockTotal(BaseModel):
+    # Only the codes of the requested group_by levels are set
+    product_code: Optional[str]
+    warehouse_code: Optional[str]
+    city_code: Optional[str]
+    region_code: Optional[str]
+    quantity: int
+    stock_value: float
+    rows: int
+
+
+class StockForecast(BaseModel):
+    product_code: str
+    quantity: int
+    average_usage: Optional[float]
+    days_of_cover: Optional[float]  # None when the product has no consumption
+    stockout_date: Optional[date]
+    reorder: bool
+
+
+#------------------------------------------------------------------------------
+class InventorySnapshot(BaseModel):
+    id: int
+    taken_at: datetime
+    source: str
+    changed_rows: int
+
+    class Config:
+        orm_mode = True
+
+
+class InventoryAsOf(BaseModel):
+    inventory_code: str
+    product_code: str
+    warehouse_code: str
+    quantity: int
+    timestamp: datetime  # when the row last changed
+
+
+class QuantityPoint(BaseModel):
+    snapshot_id: int
+    taken_at: datetime
+    quantity: int
+
+
+#------------------------------------------------------------------------------
+class BatchItemResult(BaseModel):
+    index: int  # position in the request
+    key: Any  # the item's code, or its key fields for composite keys
+    status: str  # created / updated / deleted / failed / skipped
+    detail: Optional[str]
+
+
+class BatchResponse(BaseModel):
+    requested: int
+    succeeded: int
+    failed: int
+    applied: bool  # False when an atomic batch was rejected
+    results: List[BatchItemResult]
+
+
+#------------------------------------------------------------------------------
+class ImportJob(BaseModel):
+    job_id: str
+    kind: str
+    filename: Optional[str]
+    status: str
+    rows_processed: Optional[int]
+    rows_per_sec: Optional[float]
+    result: Optional[Dict[str, Any]]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, Float, TIMESTAMP, Integer
+
+from app.default.models import Base
+
+
+class JoinedInventory(Base):
+    # Read model behind GET /joined/inventory: each inventory row with its warehouse
+    # and product names and the latest applicable yearly average, kept current by
+    # app.utils.read_model. The primary key makes a warehouse one range scan.
+    __tablename__ = 'joined_inventory'
+    warehouse_code = Column(String(50), primary_key=True)
+    inventory_code = Column(String(50), primary_key=True, index=True)
+    product_code = Column(String(50), index=True)
+    quantity = Column(Integer)
+    timestamp = Column(TIMESTAMP)
+    warehouse_name = Column(String(100))
+    product_name = Column(String(100))
+    average_consumption = Column(Float)
+    average_year = Column(Integer)  # year of average_consumption
@@ -1,6 +1,18 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import products, warehouses, cities, inventory, regions, auth,joined, average_consumption
+from app.routers import products, warehouses, cities, inventory, regions, auth,joined, average_consumption, jobs, admin, metrics, stock, history
+from app.auth_model import User
+from app.database import engine, SessionLocal
+from app.default.models import Base
+from app.utils.averages import ensure_average_uniqueness
+from app.utils.jobs import ensure_import_jobs, fail_interrupted_jobs
+from app.utils.search import ensure_search_index
+from app.utils.read_model import ensure_joined, refresh_for_new_year
+from app.utils.rollups import ensure_stock_rollup
+from app.utils.history import ensure_history
+from app.utils.request_metrics import RequestMetricsMiddleware
+from app.utils.schema import ensure_indexes
+from app.utils.security import verify_api_key
 
 app = FastAPI()
 
@@ -13,6 +25,9 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Per-route latency, SQL count and DB time; served on /metrics
+app.add_middleware(RequestMetricsMiddleware)
+
 # Include routers
 app.include_router(products.router, prefix="/products", tags=["Products"])
 app.include_router(warehouses.router, prefix="/warehouses", tags=["Warehouses"])
@@ -22,3 +37,29 @@ app.include_router(regions.router, prefix="/regions", tags=["Regions"])
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(joined.router, prefix="/joined", tags=["joined"])
 app.include_router(average_consumption.router, prefix="/average", tags=["average"])
+app.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+# Cache flushes, runtime switches and the slow-query log are operator-only
+app.include_router(admin.router, prefix="/admin", tags=["admin"], dependencies=[Depends(verify_api_key)])
+app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+app.include_router(stock.router, prefix="/stock", tags=["stock"])
+app.include_router(history.router, prefix="/history", tags=["history"])
+
+
+@app.on_event("startup")
+def startup():
+    # Creates tables added since the last deploy (e.g. import_jobs); existing ones are left alone
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        ensure_import_jobs(db)
+        # Login and registration look users up by email
+        ensure_indexes(engine, User.__table__)
+        fail_interrupted_jobs(db)
+        ensure_average_uniqueness(db)
+        ensure_search_index(db)
+        ensure_joined(db)
+        ensure_stock_rollup(db)
+        ensure_history(db)
+        refresh_for_new_year(db)
+    finally:
+        db.close()
@@ -0,0 +1,79 @@
+from typing import Optional
+from fastapi import APIRouter, Query
+from app.utils.cache import reference_cache_stats, set_reference_cache_enabled, invalidate_reference, \
+    reference_caches, principal_cache
+from app.utils.fast_json import fast_json_settings, set_fast_json_enabled
+from app.utils.passwords import password_pool_stats
+from app.utils.pool_metrics import pool_stats
+from app.utils.slow_queries import slow_queries, slow_query_settings, configure_slow_query_log, \
+    clear_slow_queries
+
+router = APIRouter()
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    return reference_cache_stats()
+
+
+@router.put("/cache")
+async def configure_cache(enabled: bool = Query(..., description="Turn the reference-data cache on or off")):
+    set_reference_cache_enabled(enabled)
+    return reference_cache_stats()
+
+
+@router.delete("/cache")
+async def clear_cache():
+    invalidate_reference(*reference_caches)
+    return {"status": "Cache cleared"}
+
+
+@router.get("/fast-json")
+async def get_fast_json_settings():
+    return fast_json_settings()
+
+
+@router.put("/fast-json")
+async def configure_fast_json(enabled: bool = Query(..., description="Serve the large list endpoints as column "
+                                                                       "tuples encoded with orjson")):
+    return set_fast_json_enabled(enabled)
+
+
+@router.get("/principal-cache")
+async def get_principal_cache_stats():
+    return principal_cache.stats()
+
+
+@router.delete("/principal-cache")
+async def clear_principal_cache():
+    principal_cache.clear()
+    return {"status": "Principal cache cleared"}
+
+
+@router.get("/pool")
+async def get_pool_stats():
+    return pool_stats()
+
+
+@router.get("/password-pool")
+async def get_password_pool_stats():
+    return password_pool_stats()
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(limit: int = Query(50, ge=1, le=1000)):
+    return {"settings": slow_query_settings(), "entries": slow_queries(limit)}
+
+
+@router.put("/slow-queries")
+async def configure_slow_queries(
+        enabled: Optional[bool] = Query(None, description="Turn the slow-query log on or off"),
+        threshold_ms: Optional[float] = Query(None, ge=0, description="Log statements slower than this")
+):
+    return configure_slow_query_log(enabled, threshold_ms)
+
+
+@router.delete("/slow-queries")
+async def clear_slow_query_log():
+    clear_slow_queries()
+    return {"status": "Slow-query log cleared"}
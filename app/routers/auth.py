@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Header
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from jose import JWTError, jwt
+import time
 from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordBearer
 
 from app import auth_model
 from app.auth import auth_schema
-from app.database import get_db
+from app.database import get_db, get_async_db
+from app.utils.cache import MISSING, principal_cache, invalidate_principal
+from app.utils.passwords import hash_password, verify_password
 from app.utils.security import verify_api_key
 
 router = APIRouter()
@@ -15,7 +19,6 @@ SECRET_KEY = "7c7f55abb883c3d4b16f69a15e0c29fc"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -25,48 +28,54 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 @router.post("/register", response_model=auth_schema.UserResponse)
-def register(user: auth_schema.UserCreate, db: Session = Depends(get_db)):
+async def register(user: auth_schema.UserCreate, db: AsyncSession = Depends(get_async_db)):
     try:
         # Check if the email is already registered
-        db_user = db.query(auth_model.User).filter(auth_model.User.email == user.email).first()
+        db_user = await db.scalar(select(auth_model.User).filter(auth_model.User.email == user.email))
         if db_user:
             raise HTTPException(status_code=400, detail="Email already registered")
 
-        # Hash the password
-        hashed_password = pwd_context.hash(user.password)
+        # Hash the password in the password pool (503 when it is saturated)
+        hashed_password = await hash_password(user.password)
 
-        # Create new user
-        db_user = auth_model.User(username=user.username, hashed_password=hashed_password, email=user.email)
+        # Create new user with the default role
+        default_role = await db.scalar(select(auth_model.Role).filter(auth_model.Role.name == "user"))
+        db_user = auth_model.User(username=user.username, hashed_password=hashed_password, email=user.email,
+                                  roles=[default_role] if default_role else [])
         db.add(db_user)
-        db.commit()
+        await db.commit()
 
-        # Fetch the default role
-        default_role = db.query(auth_model.Role).filter(auth_model.Role.name == "user").first()
-        if default_role:
-            db_user.roles.append(default_role)
-            db.commit()
-
-        db.refresh(db_user)
+        await db.refresh(db_user)
         return db_user
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/login", response_model=auth_schema.Token)
-def login(user: auth_schema.UserCreate, db: Session = Depends(get_db), api_key: str = Depends(verify_api_key)):
+async def login(user: auth_schema.UserCreate, db: AsyncSession = Depends(get_async_db),
+                api_key: str = Depends(verify_api_key)):
     print(f"Received user data: {user}")
     print(f"API Key: {api_key}")
 
     # Check if user exists by email
-    db_user = db.query(auth_model.User).filter(auth_model.User.email == user.email).first()
+    db_user = await db.scalar(select(auth_model.User).filter(auth_model.User.email == user.email))
     print(f"Database user: {db_user}")
 
     if not db_user:
         raise HTTPException(status_code=401, detail="Invalid email")
 
-    if not pwd_context.verify(user.password, db_user.hashed_password):
+    valid, new_hash = await verify_password(user.password, db_user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid password")
 
+    # Stored with another bcrypt cost (or scheme): upgrade it now that we have the plain password
+    if new_hash:
+        db_user.hashed_password = new_hash
+        await db.commit()
+
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(data={"sub": user.email}, expires_delta=access_token_expires)
 
@@ -76,6 +85,11 @@ def login(user: auth_schema.UserCreate, db: Session = Depends(get_db), api_key:
 
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    # A cached token was already verified, and its entry expires no later than the token
+    principal = principal_cache.get(token)
+    if principal is not MISSING:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -86,12 +100,32 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        db_user = db.query(auth_model.User).filter(auth_model.User.email == email).first()
+        db_user = (
+            db.query(auth_model.User)
+            .options(selectinload(auth_model.User.roles))
+            .filter(auth_model.User.email == email)
+            .first()
+        )
         if db_user is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    return db_user
+
+    principal = auth_schema.Principal(
+        id=db_user.id, username=db_user.username, email=db_user.email, created_at=db_user.created_at,
+        roles=[role.name for role in db_user.roles],
+    )
+    expires_in = payload["exp"] - time.time() if "exp" in payload else principal_cache.ttl
+    if expires_in > 0:
+        principal_cache.set(token, principal, ttl=min(principal_cache.ttl, expires_in))
+    return principal
+
+
+@event.listens_for(auth_model.User, "after_update")
+@event.listens_for(auth_model.User, "after_delete")
+def _evict_principal(mapper, connection, target):
+    # Fires for role changes too: editing user.roles marks the user dirty
+    invalidate_principal(target.id)
 
 def verify_api_key(api_key: str = Header(...)):
     if api_key != SECRET_KEY:  # Replace with your actual API key
@@ -99,7 +133,7 @@ def verify_api_key(api_key: str = Header(...)):
     return api_key
 
 @router.get("/me", response_model=auth_schema.UserResponse)
-def get_current_user_info(current_user: auth_model.User = Depends(get_current_user)):
+def get_current_user_info(current_user: auth_schema.Principal = Depends(get_current_user)):
     print("auth check: "+ str(datetime.now()))
     return current_user
 
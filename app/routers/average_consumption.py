@@ -1,64 +1,165 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+import os
+from itertools import chain
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.default.models import YearlyAverageConsumption
+from app.database import get_db, get_async_db
+from app.default.models import Product, YearlyAverageConsumption
 from app.default.schemas import YearlyAverageConsumption as YearlyAverageConsumptionSchema, \
-    YearlyAverageConsumptionCreate
+    YearlyAverageConsumptionCreate, BatchResponse
+from app.utils.batch import ATOMIC_DESCRIPTION, BatchTable, apply_batch
+from app.utils.averages import compute_averages
+from app.utils.fast_json import fast_json_enabled, json_response, list_json
+from app.utils.ingestion import ingest_consumption
+from app.utils.jobs import submit_import
+from app.utils.read_model import refresh_joined_products
+from app.utils.spreadsheet import spreadsheet_format, spool_upload, iter_upload_chunks
 
 router = APIRouter()
 
 
+def _refresh_averaged_products(db, previous, rows):
+    refresh_joined_products(db, {average["product_code"] for average in previous + rows})
+
+
+# New averages are keyed on their product and year, existing ones on their id
+AVERAGE_BATCH = BatchTable(YearlyAverageConsumption, YearlyAverageConsumptionCreate, ['product_code', 'year'],
+                           references={'product_code': Product.product_code}, after_write=_refresh_averaged_products)
+AVERAGE_BY_ID_BATCH = BatchTable(YearlyAverageConsumption, YearlyAverageConsumptionSchema, ['id'],
+                                 references={'product_code': Product.product_code},
+                                 after_write=_refresh_averaged_products)
+
+
+def _import_consumption_file(db: Session, path: str, file_format: str, replace: bool):
+    # Parsing and the bulk upsert are blocking, so this runs in the threadpool
+    try:
+        chunks = iter_upload_chunks(path, file_format)
+        first = next(chunks, None)
+        if first is None:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty or not in the expected format.")
+
+        return ingest_consumption(db, chain([first], chunks), replace=replace)
+    finally:
+        os.remove(path)
+
+
 @router.get("/", response_model=List[YearlyAverageConsumptionSchema])
-async def get_all_yearly_average_consumptions(db: Session = Depends(get_db)):
-    averages = db.query(YearlyAverageConsumption).all()
+async def get_all_yearly_average_consumptions(db: AsyncSession = Depends(get_async_db)):
+    if fast_json_enabled():
+        return json_response(await list_json(db, YearlyAverageConsumption, YearlyAverageConsumptionSchema))
+    averages = (await db.scalars(select(YearlyAverageConsumption))).all()
     return averages
 
 
+@router.post("/compute")
+def compute_yearly_averages(year: Optional[int] = Query(None, description="Only store the averages of this year"),
+                            db: Session = Depends(get_db)):
+    # Reads the whole inventory history and upserts in bulk through the sync engine, so it runs in the threadpool
+    stats = compute_averages(db, year=year)
+    return {"status": "Yearly averages computed from inventory history", **stats}
+
+
+@router.post("/upload/")
+async def upload_consumption(
+        file: UploadFile = File(...),
+        background: bool = Query(False, description="Run the import as a background job and return its id"),
+        replace: bool = Query(False, description="Drop the consumption earlier uploads stored for the file's years; "
+                                                 "by default the file adds to it"),
+        db: Session = Depends(get_db)
+):
+    file_format = spreadsheet_format(file)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail="Invalid file format. Only Excel and SpreadsheetML files are supported.")
+
+    path = await spool_upload(file)
+    if background:
+        job = await run_in_threadpool(submit_import, db, 'averages', path, file_format, file.filename,
+                                      replace=replace)
+        return JSONResponse(status_code=202, content={"job_id": job.job_id, "status": job.status})
+
+    try:
+        stats = await run_in_threadpool(_import_consumption_file, db, path, file_format, replace)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "Yearly averages uploaded successfully", **stats}
+
+
+@router.post("/batch/create", response_model=BatchResponse)
+async def batch_create_yearly_averages(items: List[Dict[str, Any]],
+                                       atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                                       db: AsyncSession = Depends(get_async_db)):
+    return await apply_batch(db, 'create', items, AVERAGE_BATCH, atomic)
+
+
+@router.post("/batch/update", response_model=BatchResponse)
+async def batch_update_yearly_averages(items: List[Dict[str, Any]],
+                                       atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                                       db: AsyncSession = Depends(get_async_db)):
+    return await apply_batch(db, 'update', items, AVERAGE_BY_ID_BATCH, atomic)
+
+
+@router.post("/batch/delete", response_model=BatchResponse)
+async def batch_delete_yearly_averages(ids: List[int], atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                                       db: AsyncSession = Depends(get_async_db)):
+    return await apply_batch(db, 'delete', ids, AVERAGE_BY_ID_BATCH, atomic)
+
+
 @router.get("/{id}", response_model=YearlyAverageConsumptionSchema)
-async def get_yearly_average_consumption(id: int, db: Session = Depends(get_db)):
-    average = db.query(YearlyAverageConsumption).filter_by(id = id).first()
+async def get_yearly_average_consumption(id: int, db: AsyncSession = Depends(get_async_db)):
+    average = await db.scalar(select(YearlyAverageConsumption).filter_by(id = id))
     if not average:
         raise HTTPException(status_code=404, detail="Yearly Average Consumption not found.")
     return average
 
 
 @router.post("/create/", response_model=YearlyAverageConsumptionSchema)
-async def create_yearly_average_consumption(average: YearlyAverageConsumptionCreate, db: Session = Depends(get_db)):
-    existing_average = db.query(YearlyAverageConsumption).filter_by(product_code=average.product_code,
-                                                                    year=average.year).first()
+async def create_yearly_average_consumption(average: YearlyAverageConsumptionCreate,
+                                            db: AsyncSession = Depends(get_async_db)):
+    existing_average = await db.scalar(select(YearlyAverageConsumption).filter_by(product_code=average.product_code,
+                                                                                  year=average.year))
     if existing_average:
         raise HTTPException(status_code=400,
                             detail="Yearly Average Consumption already exists for this product and year.")
 
     db_average = YearlyAverageConsumption(**average.dict())
     db.add(db_average)
-    db.commit()
-    db.refresh(db_average)
+    await db.flush()
+    await db.run_sync(refresh_joined_products, [db_average.product_code])
+    await db.commit()
+    await db.refresh(db_average)
     return db_average
 
 
 @router.put("/update/{id}", response_model=YearlyAverageConsumptionSchema)
 async def update_yearly_average_consumption(id: int, average: YearlyAverageConsumptionCreate,
-                                            db: Session = Depends(get_db)):
-    db_average = db.query(YearlyAverageConsumption).filter(YearlyAverageConsumption.id == id).first()
+                                            db: AsyncSession = Depends(get_async_db)):
+    db_average = await db.scalar(select(YearlyAverageConsumption).where(YearlyAverageConsumption.id == id))
     if not db_average:
         raise HTTPException(status_code=404, detail="Yearly Average Consumption not found")
 
+    previous_product = db_average.product_code
     for key, value in average.dict().items():
         setattr(db_average, key, value)
 
-    db.commit()
-    db.refresh(db_average)
+    await db.flush()
+    await db.run_sync(refresh_joined_products, {previous_product, db_average.product_code})
+    await db.commit()
+    await db.refresh(db_average)
     return db_average
 
 
 @router.delete("/delete/{id}")
-async def delete_yearly_average_consumption(id: int, db: Session = Depends(get_db)):
-    average = db.query(YearlyAverageConsumption).filter_by(id=id).first()
+async def delete_yearly_average_consumption(id: int, db: AsyncSession = Depends(get_async_db)):
+    average = await db.scalar(select(YearlyAverageConsumption).filter_by(id=id))
     if not average:
         raise HTTPException(status_code=404, detail="Yearly Average Consumption not found.")
 
-    db.delete(average)
-    db.commit()
+    await db.delete(average)
+    await db.flush()
+    await db.run_sync(refresh_joined_products, [average.product_code])
+    await db.commit()
     return {"status": "Yearly Average Consumption deleted successfully"}
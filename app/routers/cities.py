@@ -1,55 +1,102 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.default.models import City
-from app.default.schemas import City as CitySchema, CityCreate
+from typing import Any, Dict, List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.default.models import City, Region
+from app.default.schemas import City as CitySchema, CityCreate, BatchResponse, BatchGetResponse
+from app.utils.batch import ATOMIC_DESCRIPTION, CODES_DESCRIPTION, BatchTable, apply_batch, split_codes, \
+    in_request_order
+from app.utils.cache import cached_reference, cached_references, invalidate_reference, load_all, load_one, \
+    load_many, ALL, ALL_JSON
+from app.utils.fast_json import fast_json_enabled, json_response, list_json
 
 router = APIRouter()
 
+CITY_BATCH = BatchTable(City, CityCreate, ['city_code'], references={'region_code': Region.region_code})
+
+
+@router.post("/batch/create", response_model=BatchResponse)
+async def batch_create_cities(items: List[Dict[str, Any]], atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                              db: AsyncSession = Depends(get_async_db)):
+    result = await apply_batch(db, 'create', items, CITY_BATCH, atomic)
+    invalidate_reference('cities')
+    return result
+
+@router.post("/batch/update", response_model=BatchResponse)
+async def batch_update_cities(items: List[Dict[str, Any]], atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                              db: AsyncSession = Depends(get_async_db)):
+    result = await apply_batch(db, 'update', items, CITY_BATCH, atomic)
+    invalidate_reference('cities')
+    return result
+
+@router.post("/batch/delete", response_model=BatchResponse)
+async def batch_delete_cities(city_codes: List[str], atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                              db: AsyncSession = Depends(get_async_db)):
+    result = await apply_batch(db, 'delete', city_codes, CITY_BATCH, atomic)
+    invalidate_reference('cities')
+    return result
+
+
 @router.get("/", response_model=List[CitySchema])
-async def get_all_cities(db: Session = Depends(get_db)):
-    cities = db.query(City).all()
-    return cities
+async def get_all_cities(db: AsyncSession = Depends(get_async_db)):
+    if fast_json_enabled():
+        # Cached as the encoded body, so a hit skips validation and encoding as well
+        body = await cached_reference('cities', ALL_JSON, lambda: list_json(db, City, CitySchema))
+        return json_response(body)
+    return await cached_reference('cities', ALL, lambda: load_all(db, City, CitySchema))
+
+# Declared before /{city_code} so "batch" is not taken for a code
+@router.get("/batch", response_model=BatchGetResponse[CitySchema])
+async def get_cities_batch(codes: str = Query(..., description=CODES_DESCRIPTION),
+                          db: AsyncSession = Depends(get_async_db)):
+    codes = split_codes(codes)
+    found = await cached_references('cities', codes, lambda missed: load_many(
+        db, City, CitySchema, City.city_code, missed))
+    return in_request_order(codes, found)
+
 
 @router.get("/{city_code}", response_model=CitySchema)
-async def get_city(city_code: str, db: Session = Depends(get_db)):
-    city = db.query(City).filter_by(city_code=city_code).first()
+async def get_city(city_code: str, db: AsyncSession = Depends(get_async_db)):
+    city = await cached_reference('cities', city_code, lambda: load_one(db, City, CitySchema, city_code=city_code))
     if not city:
         raise HTTPException(status_code=404, detail="City not found.")
     return city
 
 @router.post("/create/", response_model=CitySchema)
-async def create_city(city: CityCreate, db: Session = Depends(get_db)):
-    existing_city = db.query(City).filter_by(city_code=city.city_code).first()
+async def create_city(city: CityCreate, db: AsyncSession = Depends(get_async_db)):
+    existing_city = await db.scalar(select(City).filter_by(city_code=city.city_code))
     if existing_city:
         raise HTTPException(status_code=400, detail="City already exists.")
 
     db_city = City(**city.dict())
     db.add(db_city)
-    db.commit()
-    db.refresh(db_city)
+    await db.commit()
+    invalidate_reference('cities')
+    await db.refresh(db_city)
     return db_city
 
 @router.put("/update/{city_code}", response_model=CitySchema)
-async def update_city(city_code: str, city: CityCreate, db: Session = Depends(get_db)):
-    db_city = db.query(City).filter(City.city_code == city_code).first()
+async def update_city(city_code: str, city: CityCreate, db: AsyncSession = Depends(get_async_db)):
+    db_city = await db.scalar(select(City).where(City.city_code == city_code))
     if not db_city:
         raise HTTPException(status_code=404, detail="City not found")
 
     for key, value in city.dict().items():
         setattr(db_city, key, value)
 
-    db.commit()
-    db.refresh(db_city)
+    await db.commit()
+    invalidate_reference('cities')
+    await db.refresh(db_city)
     return db_city
 
 @router.delete("/delete/{city_code}")
-async def delete_city(city_code: str, db: Session = Depends(get_db)):
-    city = db.query(City).filter_by(city_code=city_code).first()
+async def delete_city(city_code: str, db: AsyncSession = Depends(get_async_db)):
+    city = await db.scalar(select(City).filter_by(city_code=city_code))
     if not city:
         raise HTTPException(status_code=404, detail="City not found.")
 
-    db.delete(city)
-    db.commit()
+    await db.delete(city)
+    await db.commit()
+    invalidate_reference('cities')
     return {"status": "City deleted successfully"}
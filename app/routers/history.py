@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.default.models import InventorySnapshot
+from app.default.schemas import InventorySnapshot as InventorySnapshotSchema, InventoryAsOf, QuantityPoint
+from app.utils.history import stock_as_of, product_history, quantity_series
+
+router = APIRouter()
+
+
+@router.get("/snapshots", response_model=List[InventorySnapshotSchema])
+async def get_snapshots(
+        since: Optional[datetime] = None,
+        limit: int = Query(100, ge=1, le=1000),
+        db: AsyncSession = Depends(get_async_db)
+):
+    query = select(InventorySnapshot).order_by(InventorySnapshot.id.desc()).limit(limit)
+    if since:
+        query = query.where(InventorySnapshot.taken_at >= since)
+    return (await db.scalars(query)).all()
+
+
+@router.get("/stock", response_model=List[InventoryAsOf])
+async def get_stock_as_of(
+        at: datetime = Query(..., description="Point in time, e.g. 2024-06-30T23:59:59"),
+        product_code: Optional[str] = None,
+        warehouse_code: Optional[str] = None,
+        db: AsyncSession = Depends(get_async_db)
+):
+    rows = (await db.execute(stock_as_of(at, product_code=product_code, warehouse_code=warehouse_code))).all()
+    return [
+        {"inventory_code": code, "product_code": product, "warehouse_code": warehouse, "quantity": quantity,
+         "timestamp": taken_at}
+        for code, product, warehouse, quantity, taken_at in rows
+    ]
+
+
+@router.get("/products/{product_code}/series", response_model=List[QuantityPoint])
+async def get_quantity_series(
+        product_code: str,
+        warehouse_code: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        db: AsyncSession = Depends(get_async_db)
+):
+    rows = (await db.execute(product_history(product_code, warehouse_code))).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="No history found for this product.")
+    return quantity_series(rows, start=start, end=end)
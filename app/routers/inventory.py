@@ -1,14 +1,31 @@
-from io import BytesIO
+import os
+from itertools import chain
 
-import pandas as pd
 from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.logger import logger
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, text, delete
-from typing import List, Optional
-from app.default.models import Product, Warehouse, Inventory, City
-from app.default.schemas import InventoryCreate, Inventory as InventorySchema, PaginatedResponse
-from app.database import get_db
+from typing import Any, Dict, List, Optional, Union
+from app.default.models import Product, Warehouse, Inventory
+from app.default.schemas import InventoryCreate, Inventory as InventorySchema, PaginatedResponse, \
+    CursorPaginatedResponse, BatchResponse, BatchGetResponse
+from app.database import get_db, get_async_db
+from app.utils.batch import ATOMIC_DESCRIPTION, CODES_DESCRIPTION, BatchTable, apply_batch, split_codes, \
+    in_request_order
+from app.utils.cache import load_many
+from app.utils.fast_json import fast_json_enabled, json_response, page_json, schema_columns
+from app.utils.ingestion import ingest_inventory
+from app.utils.jobs import submit_import
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.search import search_tokens, search_ranking, index_inventory, unindex_inventory, \
+    rebuild_search_index
+from app.utils.read_model import refresh_joined, remove_joined
+from app.utils.history import record_edit
+from app.utils.rollups import apply_stock_changes
+from app.utils.spreadsheet import spreadsheet_format, spool_upload, iter_upload_chunks
 
 router = APIRouter()
 
@@ -17,71 +34,68 @@ class InventoryResponse(InventorySchema):
     class Config:
         orm_mode = True
 
-@router.post("/upload/")
-async def upload_inventory_data(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    try:
-        if file.content_type != 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet':
-            raise HTTPException(status_code=400, detail="Invalid file format. Only Excel files are supported.")
+def _inventory_row(inventory: Inventory):
+    # The fields the stock rollup and history track
+    return {"inventory_code": inventory.inventory_code, "product_code": inventory.product_code,
+            "warehouse_code": inventory.warehouse_code, "quantity": inventory.quantity}
+
+
+def _sync_inventory(db, previous, rows):
+    # The same upkeep as the single-row endpoints, for all rows of the batch at once
+    written = [row["inventory_code"] for row in rows]
+    removed = {row["inventory_code"] for row in previous} - set(written)
+    index_inventory(db, written)
+    unindex_inventory(db, removed)
+    refresh_joined(db, written)
+    remove_joined(db, removed)
+    apply_stock_changes(db, previous, rows)
+    record_edit(db, previous, rows)
+
+
+INVENTORY_BATCH = BatchTable(Inventory, InventoryCreate, ['inventory_code'],
+                             references={'product_code': Product.product_code,
+                                         'warehouse_code': Warehouse.warehouse_code},
+                             after_write=_sync_inventory)
 
-        content = await file.read()
-        df = pd.read_excel(BytesIO(content))
 
-        if df.empty:
+def _import_inventory_file(db: Session, path: str, file_format: str, mode: str):
+    # Parsing and the bulk load are blocking, so this runs in the threadpool
+    try:
+        chunks = iter_upload_chunks(path, file_format)
+        first = next(chunks, None)
+        if first is None:
             raise HTTPException(status_code=400, detail="Uploaded file is empty or not in the expected format.")
 
-        # Clear existing inventory data
-        db.execute(delete(Inventory))
-        db.commit()
-
-        # Process new inventory data
-        for _, row in df.iterrows():
-            product_code = row['Malzeme']
-            product_name = row['Malzeme Tanım']
-            depo_y = row['DepoY.']
-            uniq_id = row['UNIQID']
-            quantity = row['Toplam Miktar']
-
-            city_code = depo_y[:2]
-            warehouse_code = depo_y
-
-            city = db.query(City).filter_by(city_code=city_code).first()
-            if not city:
-                city = City(city_code=city_code, city_name=f"City {city_code}")
-                db.add(city)
-                db.commit()
-
-            warehouse = db.query(Warehouse).filter_by(warehouse_code=warehouse_code).first()
-            if not warehouse:
-                warehouse = Warehouse(warehouse_code=warehouse_code, warehouse_name=f"Warehouse {warehouse_code}",
-                                      city_code=city_code)
-                db.add(warehouse)
-                db.commit()
-
-            product = db.query(Product).filter_by(product_code=product_code).first()
-            if not product:
-                product = Product(product_code=product_code, product_name=product_name, unit_price=0)
-                db.add(product)
-                db.commit()
-
-            # Insert new inventory data
-            db.execute(text(f"""
-                INSERT INTO inventory (inventory_code, product_code, warehouse_code, quantity, timestamp)
-                VALUES (:inventory_code, :product_code, :warehouse_code, :quantity, :timestamp)
-                ON DUPLICATE KEY UPDATE 
-                product_code=VALUES(product_code),
-                warehouse_code=VALUES(warehouse_code),
-                quantity=VALUES(quantity),
-                timestamp=VALUES(timestamp)
-            """), {
-                "inventory_code": uniq_id,
-                "product_code": product_code,
-                "warehouse_code": warehouse_code,
-                "quantity": quantity,
-                "timestamp": pd.Timestamp.now()
-            })
-            db.commit()
-
-        return {"status": "Inventory data uploaded successfully"}
+        return ingest_inventory(db, chain([first], chunks), mode=mode)
+    finally:
+        os.remove(path)
+
+
+@router.post("/upload/")
+async def upload_inventory_data(
+        file: UploadFile = File(...),
+        background: bool = Query(False, description="Run the import as a background job and return its id"),
+        mode: str = Query("replace", regex="^(replace|delta|upsert)$",
+                          description="replace: swap in the uploaded inventory, delta: write only changed rows, "
+                                      "upsert: add/update rows and keep the rest"),
+        db: Session = Depends(get_db)
+):
+    try:
+        file_format = spreadsheet_format(file)
+        if file_format is None:
+            raise HTTPException(status_code=400, detail="Invalid file format. Only Excel and SpreadsheetML files are supported.")
+
+        path = await spool_upload(file)
+        if background:
+            job = await run_in_threadpool(submit_import, db, 'inventory', path, file_format, file.filename, mode=mode)
+            return JSONResponse(status_code=202, content={"job_id": job.job_id, "status": job.status})
+
+        stats = await run_in_threadpool(_import_inventory_file, db, path, file_format, mode)
+        return {"status": "Inventory data uploaded successfully", **stats}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in upload_inventory_data: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -89,69 +103,135 @@ async def upload_inventory_data(file: UploadFile = File(...), db: Session = Depe
 
 # Endpoint to create an inventory item
 @router.post("/create/", response_model=InventorySchema)
-async def create_inventory(inventory: InventoryCreate, db: Session = Depends(get_db)):
-    product = db.query(Product).filter_by(product_code=inventory.product_code).first()
+async def create_inventory(inventory: InventoryCreate, db: AsyncSession = Depends(get_async_db)):
+    product = await db.scalar(select(Product).filter_by(product_code=inventory.product_code))
     if not product:
         raise HTTPException(status_code=400, detail="Product not found.")
 
-    warehouse = db.query(Warehouse).filter_by(warehouse_code=inventory.warehouse_code).first()
+    warehouse = await db.scalar(select(Warehouse).filter_by(warehouse_code=inventory.warehouse_code))
     if not warehouse:
         raise HTTPException(status_code=400, detail="Warehouse not found.")
 
     db_inventory = Inventory(**inventory.dict())
     db.add(db_inventory)
-    db.commit()
-    db.refresh(db_inventory)
+    await db.flush()
+    await db.run_sync(index_inventory, [db_inventory.inventory_code])
+    await db.run_sync(refresh_joined, [db_inventory.inventory_code])
+    await db.run_sync(apply_stock_changes, [], [_inventory_row(db_inventory)])
+    await db.run_sync(record_edit, [], [_inventory_row(db_inventory)])
+    await db.commit()
+    await db.refresh(db_inventory)
     return db_inventory
 
+@router.post("/batch/create", response_model=BatchResponse)
+async def batch_create_inventory(items: List[Dict[str, Any]],
+                                 atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                                 db: AsyncSession = Depends(get_async_db)):
+    return await apply_batch(db, 'create', items, INVENTORY_BATCH, atomic)
+
+
+@router.post("/batch/update", response_model=BatchResponse)
+async def batch_update_inventory(items: List[Dict[str, Any]],
+                                 atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                                 db: AsyncSession = Depends(get_async_db)):
+    return await apply_batch(db, 'update', items, INVENTORY_BATCH, atomic)
+
+
+@router.post("/batch/delete", response_model=BatchResponse)
+async def batch_delete_inventory(inventory_codes: List[str],
+                                 atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                                 db: AsyncSession = Depends(get_async_db)):
+    return await apply_batch(db, 'delete', inventory_codes, INVENTORY_BATCH, atomic)
+
 # Endpoint to get paginated and searchable inventories
-@router.get("/", response_model=PaginatedResponse[InventorySchema])
+@router.get("/", response_model=Union[PaginatedResponse[InventorySchema], CursorPaginatedResponse[InventorySchema]])
 async def get_inventories(
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         search: Optional[str] = Query(None, description="Search term for inventory data"),
         page: int = Query(1, ge=1, description="Page number for pagination"),
-        page_size: int = Query(50, ge=1, le=200, description="Number of items per page")
+        page_size: int = Query(50, ge=1, le=200, description="Number of items per page"),
+        cursor: Optional[str] = Query(None, description="Keyset pagination cursor from next_cursor; "
+                                                        "pass an empty value to get the first page"),
+        include_total: bool = Query(True, description="Count the matching rows (cursor pagination only)")
 ):
     try:
+        # The fast path selects the response fields as plain tuples and encodes them itself
+        fast = fast_json_enabled()
+        query = select(*schema_columns(Inventory, InventorySchema)) if fast else select(Inventory)
+        fetch = db.execute if fast else db.scalars
+        tokens = search_tokens(search) if search else []
+        ranking = None
+        if tokens:
+            # Prefix matches on codes and product name words, served from the search index
+            ranking = search_ranking(tokens).subquery()
+            query = query.join(ranking, Inventory.inventory_code == ranking.c.inventory_code)
+        count_query = select(func.count()).select_from(query.subquery())
+
+        if cursor is not None:
+            after = decode_cursor(cursor)
+            page_query = query.order_by(Inventory.inventory_code)
+            if after is not None:
+                page_query = page_query.where(Inventory.inventory_code > after)
+            # One extra row tells us whether there is a next page
+            inventories = (await fetch(page_query.limit(page_size + 1))).all()
+            next_cursor = encode_cursor(inventories[page_size - 1].inventory_code) if len(inventories) > page_size else None
+
+            result = {
+                "total_count": await db.scalar(count_query) if include_total else None,
+                "page_size": page_size,
+                "next_cursor": next_cursor,
+                "data": inventories[:page_size]
+            }
+            return json_response(page_json(InventorySchema, result)) if fast else result
+
         offset = (page - 1) * page_size
-        query = db.query(Inventory)
-        if search:
-            search = search.lower()
-            query = query.filter(
-                or_(
-                    Inventory.inventory_code.ilike(f"%{search}%"),
-                    Inventory.product_code.ilike(f"%{search}%"),
-                    Inventory.warehouse_code.ilike(f"%{search}%"),
-                    Inventory.quantity.ilike(f"%{search}%")
-                )
-            )
-
-        total_count = query.count()
-        inventories = query.offset(offset).limit(page_size).all()
-
-        return {
+        total_count = await db.scalar(count_query)
+        if ranking is not None:
+            query = query.order_by(ranking.c.rank.desc(), Inventory.inventory_code)
+        inventories = (await fetch(query.offset(offset).limit(page_size))).all()
+
+        result = {
             "total_count": total_count,
             "page": page,
             "page_size": page_size,
             "data": inventories
         }
+        return json_response(page_json(InventorySchema, result)) if fast else result
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+@router.post("/search/reindex")
+def reindex_inventory_search(db: Session = Depends(get_db)):
+    # Builds and swaps tables through the sync engine, so it runs in the threadpool
+    rebuild_search_index(db)
+    return {"status": "Inventory search index rebuilt"}
+
+
 @router.get("/warehouse/{warehouse_code}")
-async def get_warehouse_inventory(warehouse_code: str, db: Session = Depends(get_db)):
-    inventory = db.query(Inventory).filter(Inventory.warehouse_code == warehouse_code).all()
+async def get_warehouse_inventory(warehouse_code: str, db: AsyncSession = Depends(get_async_db)):
+    inventory = (await db.scalars(select(Inventory).where(Inventory.warehouse_code == warehouse_code))).all()
     if not inventory:
         raise HTTPException(status_code=404, detail="No inventory found for this warehouse code")
     return {"inventory": inventory}  # Test raw response
 
 
 
+# Declared before /{inventory_code} so "batch" is not taken for a code
+@router.get("/batch", response_model=BatchGetResponse[InventorySchema])
+async def get_inventory_batch(codes: str = Query(..., description=CODES_DESCRIPTION),
+                              db: AsyncSession = Depends(get_async_db)):
+    codes = split_codes(codes)
+    found = await load_many(db, Inventory, InventorySchema, Inventory.inventory_code, codes)
+    return in_request_order(codes, found)
+
+
 # Endpoint to get a single inventory item
 @router.get("/{inventory_code}", response_model=InventorySchema)
-async def get_inventory(inventory_code: str, db: Session = Depends(get_db)):
-    inventory = db.query(Inventory).filter_by(inventory_code=inventory_code).first()
+async def get_inventory(inventory_code: str, db: AsyncSession = Depends(get_async_db)):
+    inventory = await db.scalar(select(Inventory).filter_by(inventory_code=inventory_code))
     if not inventory:
         raise HTTPException(status_code=404, detail="Inventory not found.")
     return inventory
@@ -159,26 +239,38 @@ async def get_inventory(inventory_code: str, db: Session = Depends(get_db)):
 
 # Endpoint to delete an inventory item
 @router.delete("/delete/{inventory_code}")
-async def delete_inventory(inventory_code: str, db: Session = Depends(get_db)):
-    inventory = db.query(Inventory).filter_by(inventory_code=inventory_code).first()
+async def delete_inventory(inventory_code: str, db: AsyncSession = Depends(get_async_db)):
+    inventory = await db.scalar(select(Inventory).filter_by(inventory_code=inventory_code))
     if not inventory:
         raise HTTPException(status_code=404, detail="Inventory not found.")
 
-    db.delete(inventory)
-    db.commit()
+    await db.run_sync(unindex_inventory, [inventory_code])
+    await db.run_sync(remove_joined, [inventory_code])
+    await db.run_sync(apply_stock_changes, [_inventory_row(inventory)], [])
+    await db.run_sync(record_edit, [_inventory_row(inventory)], [])
+    await db.delete(inventory)
+    await db.commit()
     return {"status": "Inventory deleted successfully"}
 
 
 # Endpoint to update an inventory item
 @router.put("/update/{inventory_code}", response_model=InventorySchema)
-async def update_inventory(inventory_code: str, inventory: InventoryCreate, db: Session = Depends(get_db)):
-    db_inventory = db.query(Inventory).filter_by(inventory_code=inventory_code).first()
+async def update_inventory(inventory_code: str, inventory: InventoryCreate, db: AsyncSession = Depends(get_async_db)):
+    db_inventory = await db.scalar(select(Inventory).filter_by(inventory_code=inventory_code))
     if not db_inventory:
         raise HTTPException(status_code=404, detail="Inventory not found.")
 
+    previous = _inventory_row(db_inventory)
     for key, value in inventory.dict().items():
         setattr(db_inventory, key, value)
 
-    db.commit()
-    db.refresh(db_inventory)
+    await db.flush()
+    await db.run_sync(unindex_inventory, [inventory_code])
+    await db.run_sync(index_inventory, [db_inventory.inventory_code])
+    await db.run_sync(remove_joined, [inventory_code])
+    await db.run_sync(refresh_joined, [db_inventory.inventory_code])
+    await db.run_sync(apply_stock_changes, [previous], [_inventory_row(db_inventory)])
+    await db.run_sync(record_edit, [previous], [_inventory_row(db_inventory)])
+    await db.commit()
+    await db.refresh(db_inventory)
     return db_inventory
@@ -0,0 +1,29 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.default.models import ImportJob
+from app.default.schemas import ImportJob as ImportJobSchema
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[ImportJobSchema])
+async def get_import_jobs(
+        db: AsyncSession = Depends(get_async_db),
+        status: Optional[str] = Query(None, description="Filter by job status"),
+        limit: int = Query(50, ge=1, le=500, description="Number of most recent jobs to return")
+):
+    query = select(ImportJob)
+    if status:
+        query = query.where(ImportJob.status == status)
+    return (await db.scalars(query.order_by(ImportJob.created_at.desc()).limit(limit))).all()
+
+
+@router.get("/{job_id}", response_model=ImportJobSchema)
+async def get_import_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    job = await db.scalar(select(ImportJob).filter_by(job_id=job_id))
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found.")
+    return job
@@ -1,51 +1,117 @@
+import json
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.default.models import Inventory, Warehouse, Product, YearlyAverageConsumption
+from app.database import get_db, get_async_db, AsyncSessionLocal
+from app.default.models import City, Warehouse
+from app.joined.joined_models import JoinedInventory
 from app.joined.joined_schemas import JoinedInventoryResponse
+from app.utils.read_model import rebuild_joined, refresh_for_new_year
 
 router = APIRouter()
 
+STREAM_BATCH_SIZE = 1000  # rows fetched from the server-side cursor and written per chunk
+
+JOINED_COLUMNS = [
+    JoinedInventory.inventory_code,
+    JoinedInventory.product_code,
+    JoinedInventory.warehouse_code,
+    JoinedInventory.quantity,
+    JoinedInventory.timestamp,
+    JoinedInventory.warehouse_name,
+    JoinedInventory.product_name,
+    JoinedInventory.average_consumption
+]
+
 @router.get("/inventory", response_model=List[JoinedInventoryResponse])
-async def get_joined_inventory(warehouse_code: str, db: Session = Depends(get_db)):
+async def get_joined_inventory(warehouse_code: str, db: AsyncSession = Depends(get_async_db)):
     try:
-        query = (
-            db.query(
-                Inventory.inventory_code,
-                Inventory.product_code,
-                Inventory.warehouse_code,
-                Inventory.quantity,
-                Inventory.timestamp,
-                Warehouse.warehouse_name,
-                Product.product_name,
-                YearlyAverageConsumption.average_usage
-            )
-            .join(Warehouse, Inventory.warehouse_code == Warehouse.warehouse_code)
-            .join(Product, Inventory.product_code == Product.product_code)
-            .outerjoin(YearlyAverageConsumption, Inventory.product_code == YearlyAverageConsumption.product_code)
-            .filter(Inventory.warehouse_code == warehouse_code)
-            .all()
-        )
-
-        if not query:
+        await db.run_sync(refresh_for_new_year)
+
+        # One range scan on the read model's (warehouse_code, inventory_code) key
+        rows = (await db.execute(
+            select(*JOINED_COLUMNS)
+            .where(JoinedInventory.warehouse_code == warehouse_code)
+            .order_by(JoinedInventory.inventory_code)
+        )).mappings().all()
+
+        if not rows:
             raise HTTPException(status_code=404, detail="No inventory data found for the given warehouse")
 
-        results = [
-            {
-                "inventory_code": inv_code,
-                "product_code": prod_code,""
-                "warehouse_code": wh_code,
-                "quantity": quantity,
-                "timestamp": timestamp.isoformat(),
-                "warehouse_name": wh_name,
-                "product_name": prod_name,
-                "average_consumption": avg_usage
-            }
-            for inv_code, prod_code, wh_code, quantity, timestamp, wh_name, prod_name, avg_usage in query
-        ]
-
-        return results
+        return rows
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/rebuild")
+def rebuild_joined_inventory(db: Session = Depends(get_db)):
+    # Builds and swaps tables through the sync engine, so it runs in the threadpool
+    rebuild_joined(db)
+    return {"status": "Joined inventory rebuilt"}
+
+
+async def _resolve_warehouses(db, warehouse_codes, city_code, region_code):
+    """Warehouse codes selected by the filters, or ``None`` for every warehouse."""
+    if not (warehouse_codes or city_code or region_code):
+        return None
+    query = select(Warehouse.warehouse_code)
+    if warehouse_codes:
+        query = query.where(Warehouse.warehouse_code.in_(warehouse_codes))
+    if city_code:
+        query = query.where(Warehouse.city_code == city_code)
+    if region_code:
+        query = query.join(City, Warehouse.city_code == City.city_code).where(City.region_code == region_code)
+    return sorted((await db.scalars(query)).all())
+
+
+def _ndjson_line(row):
+    # Same fields and order as JoinedInventoryResponse
+    return json.dumps({
+        "inventory_code": row["inventory_code"],
+        "product_code": row["product_code"],
+        "warehouse_code": row["warehouse_code"],
+        "quantity": row["quantity"],
+        "timestamp": row["timestamp"].isoformat() if row["timestamp"] is not None else None,
+        "product_name": row["product_name"],
+        "warehouse_name": row["warehouse_name"],
+        "average_consumption": row["average_consumption"]
+    }, ensure_ascii=False) + "\n"
+
+
+async def _stream_joined(warehouse_codes):
+    # The session lives as long as the response body, not the request handler
+    async with AsyncSessionLocal() as db:
+        query = select(*JOINED_COLUMNS).order_by(JoinedInventory.warehouse_code, JoinedInventory.inventory_code)
+        if warehouse_codes is not None:
+            query = query.where(JoinedInventory.warehouse_code.in_(warehouse_codes))
+        # Server-side cursor: rows are fetched in batches while the response is written
+        result = await db.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for rows in result.mappings().partitions():
+            yield "".join(_ndjson_line(row) for row in rows)
+
+
+@router.get("/inventory/stream")
+async def stream_joined_inventory(
+        warehouse_code: Optional[List[str]] = Query(None, description="Warehouse codes; repeat or comma-separate"),
+        city_code: Optional[str] = Query(None, description="Every warehouse in this city"),
+        region_code: Optional[str] = Query(None, description="Every warehouse in this region"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """Joined inventory of many warehouses as newline-delimited JSON, one row per line.
+
+    Filters combine; with none, the whole inventory is streamed. Rows come
+    ordered by warehouse and inventory code.
+    """
+    codes = [code.strip() for value in warehouse_code or [] for code in value.split(",") if code.strip()]
+    warehouses = await _resolve_warehouses(db, codes, city_code, region_code)
+    if warehouses is not None and not warehouses:
+        raise HTTPException(status_code=404, detail="No warehouses found for the given filters")
+    await db.run_sync(refresh_for_new_year)
+
+    return StreamingResponse(_stream_joined(warehouses), media_type="application/x-ndjson")
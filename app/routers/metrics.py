@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.utils.metrics import render_metrics
+
+router = APIRouter()
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
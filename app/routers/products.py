@@ -1,84 +1,178 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from typing import Any, Dict, List
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from io import BytesIO
-import pandas as pd
-from app.database import get_db
-from app.default.models import Product, Inventory
-from app.default.schemas import Product as ProductSchema, ProductCreate
+import os
+from itertools import chain
+from app.database import get_db, get_async_db
+from app.default.models import Product, Inventory, StockRollup
+from app.default.schemas import Product as ProductSchema, ProductCreate, BatchResponse, BatchGetResponse
+from app.utils.batch import ATOMIC_DESCRIPTION, CODES_DESCRIPTION, BatchTable, apply_batch, split_codes, \
+    in_request_order
+from app.utils.bulk import IN_CLAUSE_SIZE, chunks
+from app.utils.cache import cached_reference, cached_references, invalidate_reference, load_all, load_one, \
+    load_many, ALL, ALL_JSON
+from app.utils.fast_json import fast_json_enabled, json_response, list_json
+from app.utils.ingestion import ingest_products
+from app.utils.jobs import submit_import
+from app.utils.read_model import refresh_joined_products, remove_joined_where
+from app.utils.history import record_removed_where
+from app.utils.rollups import remove_stock_where
+from app.utils.search import reindex_product, reindex_products, unindex_where
+from app.utils.spreadsheet import spreadsheet_format, spool_upload, iter_upload_chunks
 
 router = APIRouter()
 
 
-@router.post("/upload/")
-async def upload_data(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    if file.content_type != 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet':
-        raise HTTPException(status_code=400, detail="Invalid file format. Only Excel files are supported.")
+def _import_products_file(db: Session, path: str, file_format: str):
+    # Parsing and the bulk insert are blocking, so this runs in the threadpool
+    try:
+        chunks = iter_upload_chunks(path, file_format)
+        first = next(chunks, None)
+
+        # Check if necessary columns are present
+        if first is None or not {'Malzeme', 'Malzeme Tanım'}.issubset(first.columns):
+            raise HTTPException(status_code=400, detail="Excel file is missing required columns.")
+
+        return ingest_products(db, chain([first], chunks))
+    finally:
+        os.remove(path)
 
-    content = await file.read()
-    df = pd.read_excel(BytesIO(content))
 
-    # Check if necessary columns are present
-    if not {'Malzeme', 'Malzeme Tanım'}.issubset(df.columns):
-        raise HTTPException(status_code=400, detail="Excel file is missing required columns.")
+def _delete_inventory(db, previous, rows):
+    # Their inventory goes with them, as in delete_product
+    product_codes = [product['product_code'] for product in previous]
+    for chunk in chunks(product_codes, IN_CLAUSE_SIZE):
+        holding = Inventory.product_code.in_(chunk)
+        unindex_where(db, holding)
+        remove_joined_where(db, holding)
+        remove_stock_where(db, StockRollup.product_code.in_(chunk))
+        record_removed_where(db, holding)
+        db.execute(delete(Inventory).where(holding))
 
-    for _, row in df.iterrows():
-        product_code = row.get('Malzeme')
-        product_name = row.get('Malzeme Tanım')
-        if not product_code or not product_name:
-            continue  # Skip rows with missing data
 
-        product = db.query(Product).filter_by(product_code=product_code).first()
-        if not product:
-            product = Product(product_code=product_code, product_name=product_name, unit_price=0)
-            db.add(product)
-            db.commit()
+def _refresh_products(db, previous, rows):
+    # Product names are indexed for inventory search and copied into the joined read model
+    product_codes = [product['product_code'] for product in rows]
+    reindex_products(db, product_codes)
+    refresh_joined_products(db, product_codes)
 
-    return {"status": "Products uploaded successfully"}
+
+PRODUCT_BATCH = BatchTable(Product, ProductCreate, ['product_code'],
+                           before_delete=_delete_inventory, after_write=_refresh_products)
+
+
+@router.post("/upload/")
+async def upload_data(
+        file: UploadFile = File(...),
+        background: bool = Query(False, description="Run the import as a background job and return its id"),
+        db: Session = Depends(get_db)
+):
+    file_format = spreadsheet_format(file)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail="Invalid file format. Only Excel and SpreadsheetML files are supported.")
+
+    path = await spool_upload(file)
+    if background:
+        job = await run_in_threadpool(submit_import, db, 'products', path, file_format, file.filename)
+        return JSONResponse(status_code=202, content={"job_id": job.job_id, "status": job.status})
+
+    try:
+        stats = await run_in_threadpool(_import_products_file, db, path, file_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "Products uploaded successfully", **stats}
 
 
 @router.post("/create/", response_model=ProductSchema)
-async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
-    existing_product = db.query(Product).filter_by(product_code=product.product_code).first()
+async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_async_db)):
+    existing_product = await db.scalar(select(Product).filter_by(product_code=product.product_code))
     if existing_product:
         raise HTTPException(status_code=400, detail="Product already exists.")
 
     db_product = Product(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await db.commit()
+    invalidate_reference('products')
+    await db.refresh(db_product)
     return db_product
 
 
+@router.post("/batch/create", response_model=BatchResponse)
+async def batch_create_products(items: List[Dict[str, Any]], atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                                db: AsyncSession = Depends(get_async_db)):
+    result = await apply_batch(db, 'create', items, PRODUCT_BATCH, atomic)
+    invalidate_reference('products')
+    return result
+
+
+@router.post("/batch/update", response_model=BatchResponse)
+async def batch_update_products(items: List[Dict[str, Any]], atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                                db: AsyncSession = Depends(get_async_db)):
+    result = await apply_batch(db, 'update', items, PRODUCT_BATCH, atomic)
+    invalidate_reference('products')
+    return result
+
+
+@router.post("/batch/delete", response_model=BatchResponse)
+async def batch_delete_products(product_codes: List[str], atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                                db: AsyncSession = Depends(get_async_db)):
+    result = await apply_batch(db, 'delete', product_codes, PRODUCT_BATCH, atomic)
+    invalidate_reference('products')
+    return result
+
+
 @router.get("/", response_model=List[ProductSchema])
-async def get_products(db: Session = Depends(get_db)):
-    products = db.query(Product).all()
-    return products
+async def get_products(db: AsyncSession = Depends(get_async_db)):
+    if fast_json_enabled():
+        # Cached as the encoded body, so a hit skips validation and encoding as well
+        body = await cached_reference('products', ALL_JSON, lambda: list_json(db, Product, ProductSchema))
+        return json_response(body)
+    return await cached_reference('products', ALL, lambda: load_all(db, Product, ProductSchema))
+
+
+# Declared before /{product_code} so "batch" is not taken for a code
+@router.get("/batch", response_model=BatchGetResponse[ProductSchema])
+async def get_products_batch(codes: str = Query(..., description=CODES_DESCRIPTION),
+                            db: AsyncSession = Depends(get_async_db)):
+    codes = split_codes(codes)
+    found = await cached_references('products', codes, lambda missed: load_many(
+        db, Product, ProductSchema, Product.product_code, missed))
+    return in_request_order(codes, found)
 
 
 @router.get("/{product_code}", response_model=ProductSchema)
-async def get_product(product_code: str, db: Session = Depends(get_db)):
-    product = db.query(Product).filter_by(product_code=product_code).first()
+async def get_product(product_code: str, db: AsyncSession = Depends(get_async_db)):
+    product = await cached_reference('products', product_code, lambda: load_one(
+        db, Product, ProductSchema, product_code=product_code))
     if not product:
         raise HTTPException(status_code=404, detail="Product not found.")
     return product
 
 
 @router.delete("/delete/{product_code}")
-async def delete_product(product_code: str, db: Session = Depends(get_db)):
-    db.query(Inventory).filter(Inventory.product_code == product_code).delete(synchronize_session=False)
-    product = db.query(Product).filter_by(product_code=product_code).first()
+async def delete_product(product_code: str, db: AsyncSession = Depends(get_async_db)):
+    await db.run_sync(unindex_where, Inventory.product_code == product_code)
+    await db.run_sync(remove_joined_where, Inventory.product_code == product_code)
+    await db.run_sync(remove_stock_where, StockRollup.product_code == product_code)
+    await db.run_sync(record_removed_where, Inventory.product_code == product_code)
+    await db.execute(delete(Inventory).where(Inventory.product_code == product_code))
+    product = await db.scalar(select(Product).filter_by(product_code=product_code))
     if not product:
         raise HTTPException(status_code=404, detail="Product not found.")
 
-    db.delete(product)
-    db.commit()
+    await db.delete(product)
+    await db.commit()
+    invalidate_reference('products')
     return {"status": "Product deleted successfully"}
 
 @router.put("/update/{product_code}", response_model=ProductSchema)
-async def update_product(product_code: str, product: ProductCreate, db: Session = Depends(get_db)):
+async def update_product(product_code: str, product: ProductCreate, db: AsyncSession = Depends(get_async_db)):
     # Query to find the product by code
-    db_product = db.query(Product).filter(Product.product_code == product_code).first()
+    db_product = await db.scalar(select(Product).where(Product.product_code == product_code))
 
     # Check if the product exists
     if not db_product:
@@ -88,8 +182,14 @@ async def update_product(product_code: str, product: ProductCreate, db: Session
     for key, value in product.dict().items():
         setattr(db_product, key, value)
 
+    # Product names are indexed for inventory search and copied into the joined read model
+    await db.flush()
+    await db.run_sync(reindex_product, db_product.product_code)
+    await db.run_sync(refresh_joined_products, {product_code, db_product.product_code})
+
     # Commit changes to the database
-    db.commit()
-    db.refresh(db_product)
+    await db.commit()
+    invalidate_reference('products')
+    await db.refresh(db_product)
 
-    return db_product
\ No newline at end of file
+    return db_product
@@ -1,55 +1,98 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
+from typing import Any, Dict, List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.default.models import Region
-from app.default.schemas import Region as RegionSchema, RegionCreate
+from app.default.schemas import Region as RegionSchema, RegionCreate, BatchResponse, BatchGetResponse
+from app.utils.batch import ATOMIC_DESCRIPTION, CODES_DESCRIPTION, BatchTable, apply_batch, split_codes, \
+    in_request_order
+from app.utils.cache import cached_reference, cached_references, invalidate_reference, load_all, load_one, \
+    load_many, ALL
 
 router = APIRouter()
 
+REGION_BATCH = BatchTable(Region, RegionCreate, ['region_code'])
+
+
+@router.post("/batch/create", response_model=BatchResponse)
+async def batch_create_regions(items: List[Dict[str, Any]], atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                               db: AsyncSession = Depends(get_async_db)):
+    result = await apply_batch(db, 'create', items, REGION_BATCH, atomic)
+    invalidate_reference('regions')
+    return result
+
+@router.post("/batch/update", response_model=BatchResponse)
+async def batch_update_regions(items: List[Dict[str, Any]], atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                               db: AsyncSession = Depends(get_async_db)):
+    result = await apply_batch(db, 'update', items, REGION_BATCH, atomic)
+    invalidate_reference('regions')
+    return result
+
+@router.post("/batch/delete", response_model=BatchResponse)
+async def batch_delete_regions(region_codes: List[str], atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                               db: AsyncSession = Depends(get_async_db)):
+    result = await apply_batch(db, 'delete', region_codes, REGION_BATCH, atomic)
+    invalidate_reference('regions')
+    return result
+
+
 @router.get("/", response_model=List[RegionSchema])
-async def get_all_regions(db: Session = Depends(get_db)):
-    regions = db.query(Region).all()
-    return regions
+async def get_all_regions(db: AsyncSession = Depends(get_async_db)):
+    return await cached_reference('regions', ALL, lambda: load_all(db, Region, RegionSchema))
+
+# Declared before /{region_code} so "batch" is not taken for a code
+@router.get("/batch", response_model=BatchGetResponse[RegionSchema])
+async def get_regions_batch(codes: str = Query(..., description=CODES_DESCRIPTION),
+                           db: AsyncSession = Depends(get_async_db)):
+    codes = split_codes(codes)
+    found = await cached_references('regions', codes, lambda missed: load_many(
+        db, Region, RegionSchema, Region.region_code, missed))
+    return in_request_order(codes, found)
+
 
 @router.get("/{region_code}", response_model=RegionSchema)
-async def get_region(region_code: str, db: Session = Depends(get_db)):
-    region = db.query(Region).filter_by(region_code=region_code).first()
+async def get_region(region_code: str, db: AsyncSession = Depends(get_async_db)):
+    region = await cached_reference('regions', region_code, lambda: load_one(
+        db, Region, RegionSchema, region_code=region_code))
     if not region:
         raise HTTPException(status_code=404, detail="Region not found.")
     return region
 
 @router.post("/", response_model=RegionSchema)
-async def create_region(region: RegionCreate, db: Session = Depends(get_db)):
-    existing_region = db.query(Region).filter_by(region_code=region.region_code).first()
+async def create_region(region: RegionCreate, db: AsyncSession = Depends(get_async_db)):
+    existing_region = await db.scalar(select(Region).filter_by(region_code=region.region_code))
     if existing_region:
         raise HTTPException(status_code=400, detail="Region already exists.")
 
     db_region = Region(**region.dict())
     db.add(db_region)
-    db.commit()
-    db.refresh(db_region)
+    await db.commit()
+    invalidate_reference('regions')
+    await db.refresh(db_region)
     return db_region
 
 @router.put("/{region_code}", response_model=RegionSchema)
-async def update_region(region_code: str, region: RegionCreate, db: Session = Depends(get_db)):
-    db_region = db.query(Region).filter(Region.region_code == region_code).first()
+async def update_region(region_code: str, region: RegionCreate, db: AsyncSession = Depends(get_async_db)):
+    db_region = await db.scalar(select(Region).where(Region.region_code == region_code))
     if not db_region:
         raise HTTPException(status_code=404, detail="Region not found")
 
     for key, value in region.dict().items():
         setattr(db_region, key, value)
 
-    db.commit()
-    db.refresh(db_region)
+    await db.commit()
+    invalidate_reference('regions')
+    await db.refresh(db_region)
     return db_region
 
 @router.delete("/{region_code}", response_model=dict)
-async def delete_region(region_code: str, db: Session = Depends(get_db)):
-    region = db.query(Region).filter_by(region_code=region_code).first()
+async def delete_region(region_code: str, db: AsyncSession = Depends(get_async_db)):
+    region = await db.scalar(select(Region).filter_by(region_code=region_code))
     if not region:
         raise HTTPException(status_code=404, detail="Region not found.")
 
-    db.delete(region)
-    db.commit()
+    await db.delete(region)
+    await db.commit()
+    invalidate_reference('regions')
     return {"status": "Region deleted successfully"}
@@ -0,0 +1,55 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.database import get_db, get_async_db
+from app.default.schemas import StockTotal, StockForecast
+from app.utils.forecast import forecast_inputs, forecast_rows
+from app.utils.rollups import LEVELS, rebuild_stock_rollup, stock_totals
+
+router = APIRouter()
+
+
+@router.get("/totals", response_model=List[StockTotal], response_model_exclude_unset=True)
+async def get_stock_totals(
+        group_by: List[str] = Query(["region"], description="Levels to total by: product, warehouse, city, region"),
+        product_code: Optional[str] = None,
+        warehouse_code: Optional[str] = None,
+        city_code: Optional[str] = None,
+        region_code: Optional[str] = None,
+        db: AsyncSession = Depends(get_async_db)
+):
+    unknown = [level for level in group_by if level not in LEVELS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by level(s): {', '.join(unknown)}")
+
+    # Grouped in SQL over the (product, warehouse) rollup, not the inventory rows
+    query = stock_totals(list(dict.fromkeys(group_by)), product_code=product_code, warehouse_code=warehouse_code,
+                         city_code=city_code, region_code=region_code)
+    rows = (await db.execute(query)).mappings().all()
+    return [dict(row) for row in rows]
+
+
+@router.get("/forecast", response_model=List[StockForecast])
+async def get_stock_forecast(
+        warehouse_code: Optional[str] = None,
+        city_code: Optional[str] = None,
+        region_code: Optional[str] = None,
+        lead_time_days: float = Query(30, ge=0, description="Flag products whose cover is shorter than this"),
+        max_cover_days: Optional[float] = Query(None, ge=0, description="Only products with less cover than this"),
+        reorder_only: bool = False,
+        db: AsyncSession = Depends(get_async_db)
+):
+    rows = (await db.execute(forecast_inputs(warehouse_code=warehouse_code, city_code=city_code,
+                                             region_code=region_code))).all()
+    # Already plain JSON values, so skip re-validating thousands of rows through the response model
+    return JSONResponse(forecast_rows(rows, lead_time_days, max_cover_days=max_cover_days,
+                                      reorder_only=reorder_only))
+
+
+@router.post("/rebuild")
+def rebuild_stock_totals(db: Session = Depends(get_db)):
+    # Builds and swaps tables through the sync engine, so it runs in the threadpool
+    rebuild_stock_rollup(db)
+    return {"status": "Stock rollup rebuilt"}
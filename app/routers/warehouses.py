@@ -1,9 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
-from app.default.models import Warehouse, Inventory
-from app.default.schemas import Warehouse as WarehouseSchema, WarehouseCreate
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List
+from app.database import get_async_db
+from app.default.models import City, Warehouse, Inventory, StockRollup
+from app.default.schemas import Warehouse as WarehouseSchema, WarehouseCreate, BatchResponse, BatchGetResponse
+from app.utils.batch import ATOMIC_DESCRIPTION, CODES_DESCRIPTION, BatchTable, apply_batch, split_codes, \
+    in_request_order
+from app.utils.bulk import IN_CLAUSE_SIZE, chunks
+from app.utils.cache import cached_reference, cached_references, invalidate_reference, load_all, load_one, \
+    load_many, ALL, ALL_JSON
+from app.utils.fast_json import fast_json_enabled, json_response, list_json
+from app.utils.read_model import refresh_joined_warehouse, refresh_joined_warehouses, remove_joined_where
+from app.utils.history import record_removed_where
+from app.utils.rollups import remove_stock_where
+from app.utils.search import unindex_where
 
 router = APIRouter()
 
@@ -11,32 +22,96 @@ class WarehouseResponse(WarehouseSchema):
     class Config:
         orm_mode = True
 
+
+def _delete_inventory(db, previous, rows):
+    # Their inventory goes with them, as in delete_warehouse
+    warehouse_codes = [warehouse['warehouse_code'] for warehouse in previous]
+    for chunk in chunks(warehouse_codes, IN_CLAUSE_SIZE):
+        holding = Inventory.warehouse_code.in_(chunk)
+        unindex_where(db, holding)
+        remove_joined_where(db, holding)
+        remove_stock_where(db, StockRollup.warehouse_code.in_(chunk))
+        record_removed_where(db, holding)
+        db.execute(delete(Inventory).where(holding))
+
+
+def _refresh_warehouses(db, previous, rows):
+    # Warehouse names are copied into the joined read model
+    refresh_joined_warehouses(db, [warehouse['warehouse_code'] for warehouse in rows])
+
+
+WAREHOUSE_BATCH = BatchTable(Warehouse, WarehouseCreate, ['warehouse_code'], references={'city_code': City.city_code},
+                             before_delete=_delete_inventory, after_write=_refresh_warehouses)
+
+
+@router.post("/batch/create", response_model=BatchResponse)
+async def batch_create_warehouses(items: List[Dict[str, Any]],
+                                  atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                                  db: AsyncSession = Depends(get_async_db)):
+    result = await apply_batch(db, 'create', items, WAREHOUSE_BATCH, atomic)
+    invalidate_reference('warehouses')
+    return result
+
+
+@router.post("/batch/update", response_model=BatchResponse)
+async def batch_update_warehouses(items: List[Dict[str, Any]],
+                                  atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                                  db: AsyncSession = Depends(get_async_db)):
+    result = await apply_batch(db, 'update', items, WAREHOUSE_BATCH, atomic)
+    invalidate_reference('warehouses')
+    return result
+
+
+@router.post("/batch/delete", response_model=BatchResponse)
+async def batch_delete_warehouses(warehouse_codes: List[str],
+                                  atomic: bool = Query(False, description=ATOMIC_DESCRIPTION),
+                                  db: AsyncSession = Depends(get_async_db)):
+    result = await apply_batch(db, 'delete', warehouse_codes, WAREHOUSE_BATCH, atomic)
+    invalidate_reference('warehouses')
+    return result
+
+
 @router.get("/", response_model=List[WarehouseResponse])
-async def get_all_warehouses(db: Session = Depends(get_db)):
-    return db.query(Warehouse).all()
+async def get_all_warehouses(db: AsyncSession = Depends(get_async_db)):
+    if fast_json_enabled():
+        # Cached as the encoded body, so a hit skips validation and encoding as well
+        body = await cached_reference('warehouses', ALL_JSON, lambda: list_json(db, Warehouse, WarehouseResponse))
+        return json_response(body)
+    return await cached_reference('warehouses', ALL, lambda: load_all(db, Warehouse, WarehouseResponse))
+
+# Declared before /{warehouse_code} so "batch" is not taken for a code
+@router.get("/batch", response_model=BatchGetResponse[WarehouseResponse])
+async def get_warehouses_batch(codes: str = Query(..., description=CODES_DESCRIPTION),
+                              db: AsyncSession = Depends(get_async_db)):
+    codes = split_codes(codes)
+    found = await cached_references('warehouses', codes, lambda missed: load_many(
+        db, Warehouse, WarehouseResponse, Warehouse.warehouse_code, missed))
+    return in_request_order(codes, found)
 
 @router.get("/{warehouse_code}", response_model=WarehouseResponse)
-async def get_warehouse_data(warehouse_code: str, db: Session = Depends(get_db)):
-    warehouse = db.query(Warehouse).filter_by(warehouse_code=warehouse_code).first()
+async def get_warehouse_data(warehouse_code: str, db: AsyncSession = Depends(get_async_db)):
+    warehouse = await cached_reference('warehouses', warehouse_code, lambda: load_one(
+        db, Warehouse, WarehouseResponse, warehouse_code=warehouse_code))
     if not warehouse:
         raise HTTPException(status_code=404, detail="Warehouse not found")
     return warehouse
 
 @router.post("/", response_model=WarehouseResponse)
-async def create_warehouse(warehouse: WarehouseCreate, db: Session = Depends(get_db)):
+async def create_warehouse(warehouse: WarehouseCreate, db: AsyncSession = Depends(get_async_db)):
     db_warehouse = Warehouse(**warehouse.dict())
     db.add(db_warehouse)
-    db.commit()
-    db.refresh(db_warehouse)
+    await db.commit()
+    invalidate_reference('warehouses')
+    await db.refresh(db_warehouse)
     return db_warehouse
 
 @router.put("/update/{warehouse_code}", response_model=WarehouseResponse)
-async def update_warehouse(warehouse_code: str, warehouse: WarehouseCreate, db: Session = Depends(get_db)):
+async def update_warehouse(warehouse_code: str, warehouse: WarehouseCreate, db: AsyncSession = Depends(get_async_db)):
     # Convert to string if necessary
     warehouse_code = str(warehouse_code)
 
     # Query to find the warehouse by code
-    db_warehouse = db.query(Warehouse).filter(Warehouse.warehouse_code == warehouse_code).first()
+    db_warehouse = await db.scalar(select(Warehouse).where(Warehouse.warehouse_code == warehouse_code))
 
     # Check if the warehouse exists
     if not db_warehouse:
@@ -46,25 +121,34 @@ async def update_warehouse(warehouse_code: str, warehouse: WarehouseCreate, db:
     for key, value in warehouse.dict().items():
         setattr(db_warehouse, key, value)
 
+    # Warehouse names are copied into the joined read model
+    await db.flush()
+    await db.run_sync(refresh_joined_warehouse, warehouse_code)
+    if db_warehouse.warehouse_code != warehouse_code:
+        await db.run_sync(refresh_joined_warehouse, db_warehouse.warehouse_code)
+
     # Commit changes to the database
-    db.commit()
-    db.refresh(db_warehouse)
+    await db.commit()
+    invalidate_reference('warehouses')
+    await db.refresh(db_warehouse)
 
     return db_warehouse
 
 
 @router.delete("/{warehouse_code}", response_model=dict)
-async def delete_warehouse(warehouse_code: str, db: Session = Depends(get_db)):
+async def delete_warehouse(warehouse_code: str, db: AsyncSession = Depends(get_async_db)):
     # First delete related inventory records
-    db.query(Inventory).filter(Inventory.warehouse_code == warehouse_code).delete(synchronize_session=False)
+    await db.run_sync(unindex_where, Inventory.warehouse_code == warehouse_code)
+    await db.run_sync(remove_joined_where, Inventory.warehouse_code == warehouse_code)
+    await db.run_sync(remove_stock_where, StockRollup.warehouse_code == warehouse_code)
+    await db.run_sync(record_removed_where, Inventory.warehouse_code == warehouse_code)
+    await db.execute(delete(Inventory).where(Inventory.warehouse_code == warehouse_code))
 
     # Then delete the warehouse
-    warehouse = db.query(Warehouse).filter_by(warehouse_code=warehouse_code).first()
+    warehouse = await db.scalar(select(Warehouse).filter_by(warehouse_code=warehouse_code))
     if not warehouse:
         raise HTTPException(status_code=404, detail="Warehouse not found")
-    db.delete(warehouse)
-    db.commit()
+    await db.delete(warehouse)
+    await db.commit()
+    invalidate_reference('warehouses')
     return {"message": "Warehouse deleted successfully"}
-
-
-
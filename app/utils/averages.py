@@ -0,0 +1,167 @@
+import time
+
+import pandas as pd
+from fastapi.logger import logger
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app.default.models import ConsumptionCoverage, ConsumptionTotal, InventoryHistory, InventorySnapshot, \
+    YearlyAverageConsumption
+from app.utils.bulk import WRITE_BATCH_SIZE, chunks
+from app.utils.forecast import DAYS_PER_YEAR
+from app.utils.read_model import refresh_joined_products
+from app.utils.schema import ensure_unique_constraints, missing_unique_constraints
+
+MIN_OBSERVED_DAYS = 7  # years with less snapshot coverage than this are too short to annualize
+
+_INSERTS = {
+    'mysql': mysql.insert,
+    'mariadb': mysql.insert,
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def _upsert(db, table, keys, records, updates):
+    """Insert ``records`` into ``table``; a row whose ``keys`` exist gets ``updates(existing, new)`` instead.
+
+    ``existing`` and ``new`` are the columns of the stored and of the inserted row.
+    """
+    dialect = db.get_bind().dialect.name
+    statement = _INSERTS[dialect](table)
+    if dialect in ('mysql', 'mariadb'):
+        statement = statement.on_duplicate_key_update(**updates(table.c, statement.inserted))
+    else:
+        statement = statement.on_conflict_do_update(index_elements=keys, set_=updates(table.c, statement.excluded))
+    for batch in chunks(records, WRITE_BATCH_SIZE):
+        db.execute(statement, batch)
+
+
+def ensure_average_uniqueness(db):
+    """Give an existing yearly_average_consumption its ``(product_code, year)`` unique index.
+
+    ``create_all`` leaves existing tables alone, and without the index MySQL's
+    ON DUPLICATE KEY never matches, so upserts inserted a row per upload. The
+    newest row of each pair is kept before the index is created.
+    """
+    table = YearlyAverageConsumption.__table__
+    if not missing_unique_constraints(db.get_bind(), table):
+        return
+    # Selected through a derived table: MySQL can't delete from a table its own subquery reads
+    newest = select(func.max(table.c.id).label('id')).group_by(table.c.product_code, table.c.year).subquery()
+    removed = db.execute(delete(table).where(
+        table.c.product_code.isnot(None), table.c.year.isnot(None), table.c.id.notin_(select(newest.c.id))
+    )).rowcount
+    db.commit()
+    logger.info(f"Removed {removed} duplicate yearly averages")
+    ensure_unique_constraints(db.get_bind(), table)
+
+
+def upsert_averages(db, records):
+    """Insert or overwrite ``{product_code, year, average_usage}`` records keyed on ``(product_code, year)``."""
+    _upsert(db, YearlyAverageConsumption.__table__, ['product_code', 'year'], records,
+            lambda existing, new: {'average_usage': new.average_usage})
+
+
+def save_averages(db, averages):
+    """Upsert a ``product_code, year, average_usage`` frame and refresh the read model of its products."""
+    upsert_averages(db, averages[['product_code', 'year', 'average_usage']].to_dict('records'))
+    refresh_joined_products(db, averages['product_code'].unique())
+    db.commit()
+
+
+def add_file_consumption(db, totals, coverage, replace=False):
+    """Add uploaded consumption to the running totals and re-annualize the averages of the years it covers.
+
+    ``totals`` is a ``product_code, year, consumed`` frame and ``coverage`` maps
+    each year to the days of it the upload covers. Uploads add up, so monthly
+    files can be sent one at a time; ``replace`` first drops what earlier
+    uploads stored for those years, for re-sending a period. A product's
+    average for a covered year is its consumption over the covered days scaled
+    to a year, the same rate ``compute_averages`` derives from history.
+    Returns the averages written.
+    """
+    years = [int(year) for year in coverage.index]
+    total, covered = ConsumptionTotal.__table__, ConsumptionCoverage.__table__
+    if replace:
+        # Zeroed rather than deleted, so products missing from the new file get an average of 0
+        db.execute(update(total).where(total.c.year.in_(years)).values(consumed=0))
+        db.execute(delete(covered).where(covered.c.year.in_(years)))
+    _upsert(db, total, ['product_code', 'year'], totals[['product_code', 'year', 'consumed']].to_dict('records'),
+            lambda existing, new: {'consumed': existing.consumed + new.consumed})
+    _upsert(db, covered, ['year'], [{'year': year, 'observed_days': float(days)} for year, days in coverage.items()],
+            lambda existing, new: {'observed_days': existing.observed_days + new.observed_days})
+
+    # Coverage grew for every product of those years, not only the uploaded ones
+    rows = db.execute(
+        select(total.c.product_code, total.c.year, total.c.consumed, covered.c.observed_days)
+        .join(covered, total.c.year == covered.c.year)
+        .where(total.c.year.in_(years))
+    ).all()
+    averages = pd.DataFrame(rows, columns=['product_code', 'year', 'consumed', 'observed_days'])
+    averages['average_usage'] = averages['consumed'] / averages['observed_days'] * DAYS_PER_YEAR
+    save_averages(db, averages)
+    return averages
+
+
+def _observed_days(snapshots):
+    # Each snapshot covers the time since the one before it, counted in the year it was taken
+    taken_at = pd.to_datetime(snapshots['taken_at'])
+    days = taken_at.diff().dt.total_seconds().fillna(0) / 86400
+    return days.groupby(taken_at.dt.year).sum()
+
+
+def history_averages(history, snapshots):
+    """Yearly consumption per product from inventory history rows, annualized.
+
+    Consumption is every drop in an inventory row's quantity between snapshots
+    while it stays in the same warehouse; restocks are ignored. Removal rows
+    (NULL quantity) and the first quantity after one are not consumption: a
+    row that moves warehouse or is removed and re-added keeps its stock. Only
+    products whose stock changed during a year get an average for it.
+    """
+    if history.empty:
+        return pd.DataFrame(columns=['product_code', 'year', 'average_usage'])
+    quantity = pd.to_numeric(history['quantity'])
+    previous = quantity.groupby([history['inventory_code'], history['product_code'],
+                                 history['warehouse_code']]).shift()
+    # NaN on either side (first sighting, removal, re-add) compares as no consumption
+    consumed = (previous - quantity).clip(lower=0).fillna(0)
+    year = pd.to_datetime(history['taken_at']).dt.year
+
+    averages = consumed.groupby([history['product_code'].rename('product_code'), year.rename('year')]).sum()
+    averages = averages.rename('consumed').reset_index()
+    averages['observed_days'] = averages['year'].map(_observed_days(snapshots))
+    averages = averages[averages['observed_days'] >= MIN_OBSERVED_DAYS]
+    return averages.assign(average_usage=averages['consumed'] / averages['observed_days'] * DAYS_PER_YEAR)
+
+
+def compute_averages(db, year=None):
+    """Derive every product's yearly average from the inventory history and upsert them."""
+    started = time.perf_counter()
+    history, snapshots = InventoryHistory, InventorySnapshot
+    rows = db.execute(
+        select(snapshots.taken_at, history.inventory_code, history.product_code, history.warehouse_code,
+               history.quantity)
+        .join(snapshots, history.snapshot_id == snapshots.id)
+        .order_by(history.id)
+    ).all()
+    frame = pd.DataFrame(rows, columns=['taken_at', 'inventory_code', 'product_code', 'warehouse_code', 'quantity'])
+    taken = pd.DataFrame(db.execute(select(snapshots.taken_at).order_by(snapshots.id)).all(), columns=['taken_at'])
+
+    averages = history_averages(frame, taken)
+    if year is not None:
+        averages = averages[averages['year'] == year]
+    try:
+        save_averages(db, averages)
+    except Exception:
+        db.rollback()
+        raise
+
+    return {
+        'history_rows': len(frame),
+        'products': int(averages['product_code'].nunique()),
+        'averages': len(averages),
+        'years': sorted(int(value) for value in averages['year'].unique()),
+        'elapsed_seconds': round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,183 @@
+import os
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import and_, bindparam, delete, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+
+from app.utils.bulk import IN_CLAUSE_SIZE, WRITE_BATCH_SIZE, chunks, existing_codes, bulk_insert
+
+# Items accepted per batch request; larger syncs are split by the client
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))
+
+ATOMIC_DESCRIPTION = "Write nothing if any item fails; by default the valid items are written"
+
+CODES_DESCRIPTION = "Comma-separated codes, e.g. A,B,C"
+
+DONE = {'create': 'created', 'update': 'updated', 'delete': 'deleted'}
+
+
+class BatchTable:
+    """How one router's entities are written in batches.
+
+    ``key`` names the identifying fields, ``references`` maps a field to the
+    column it must exist in. ``before_delete`` and ``after_write`` are called as
+    ``hook(db, previous, rows)`` with the old and new values of the written rows
+    (empty for creates and deletes respectively), inside the batch transaction.
+    """
+
+    def __init__(self, model, schema, key, references=None, before_delete=None, after_write=None):
+        self.table = model.__table__
+        self.schema = schema
+        self.key = tuple(key)
+        self.references = references or {}
+        self.before_delete = before_delete
+        self.after_write = after_write
+
+    def key_of(self, values):
+        return tuple(values[field] for field in self.key)
+
+    def show_key(self, key):
+        return key[0] if len(self.key) == 1 else dict(zip(self.key, key))
+
+
+def _errors(exc):
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors())
+
+
+def _fetch(db, spec, keys):
+    """Current rows of the given keys, one IN lookup per chunk."""
+    columns = [spec.table.c[field] for field in spec.key]
+    match = columns[0] if len(columns) == 1 else tuple_(*columns)
+    rows = {}
+    for chunk in chunks(sorted(keys), IN_CLAUSE_SIZE):
+        values = [key[0] for key in chunk] if len(columns) == 1 else chunk
+        for row in db.execute(select(spec.table).where(match.in_(values))).mappings():
+            rows[spec.key_of(row)] = dict(row)
+    return rows
+
+
+def run_batch(db, operation, items, spec, atomic=False):
+    """Validate, check and apply a create, update or delete batch in the caller's transaction.
+
+    ``items`` are dicts for create and update and key values for delete. Items
+    that fail validation, repeat an earlier key, clash with (or are missing
+    from) the table or reference an unknown code are reported and skipped; the
+    rest are written with one bulk statement per chunk. With ``atomic`` nothing
+    is written if any item fails. Returns the per-item results and counts.
+    """
+    results = {}
+    planned = {}  # key -> (index, values)
+
+    # One validation pass
+    for index, item in enumerate(items):
+        try:
+            if operation == 'delete':
+                values = dict(zip(spec.key, item if isinstance(item, (list, tuple)) else (item,)))
+            else:
+                values = spec.schema.parse_obj(item).dict()
+        except ValidationError as e:
+            results[index] = {"index": index, "key": None, "status": "failed", "detail": _errors(e)}
+            continue
+        key = spec.key_of(values)
+        if key in planned:
+            results[index] = {"index": index, "key": spec.show_key(key), "status": "failed",
+                              "detail": f"Repeats the key of item {planned[key][0]}"}
+            continue
+        planned[key] = (index, values)
+
+    def fail(key, detail):
+        index, _ = planned.pop(key)
+        results[index] = {"index": index, "key": spec.show_key(key), "status": "failed", "detail": detail}
+
+    # One IN lookup for existence and one per referenced table
+    previous = _fetch(db, spec, planned)
+    for key in list(planned):
+        if operation == 'create' and key in previous:
+            fail(key, "Already exists.")
+        elif operation != 'create' and key not in previous:
+            fail(key, "Not found.")
+    if operation != 'delete':
+        for field, column in spec.references.items():
+            wanted = {values[field] for _, values in planned.values() if values[field] is not None}
+            found = existing_codes(db, column, wanted)
+            for key, (_, values) in list(planned.items()):
+                if values[field] is not None and values[field] not in found:
+                    fail(key, f"Unknown {field} {values[field]!r}.")
+
+    applied = not (atomic and results)
+    for key, (index, _) in planned.items():
+        status = DONE[operation] if applied else "skipped"
+        results[index] = {"index": index, "key": spec.show_key(key), "status": status, "detail": None}
+
+    if applied and planned:
+        _apply(db, operation, spec, planned, previous)
+
+    failed = sum(result["status"] == "failed" for result in results.values())
+    return {
+        "requested": len(items),
+        "succeeded": len(planned) if applied else 0,
+        "failed": failed,
+        "applied": applied,
+        "results": [results[index] for index in sorted(results)],
+    }
+
+
+def _apply(db, operation, spec, planned, previous):
+    keys = list(planned)
+    old = [previous[key] for key in keys] if operation != 'create' else []
+    columns = [spec.table.c[field] for field in spec.key]
+
+    if operation == 'create':
+        rows = [values for _, values in planned.values()]
+        bulk_insert(db, spec.table, rows)
+    elif operation == 'update':
+        rows = [{**previous[key], **values} for key, (_, values) in planned.items()]
+        fields = [field for field in planned[keys[0]][1] if field not in spec.key]
+        statement = (
+            update(spec.table)
+            .where(and_(*[column == bindparam(f"b_{column.name}") for column in columns]))
+            .values(**{field: bindparam(f"b_{field}") for field in fields})
+        )
+        params = [{f"b_{name}": value for name, value in values.items()} for _, values in planned.values()]
+        for batch in chunks(params, WRITE_BATCH_SIZE):
+            db.execute(statement, batch)
+    else:
+        rows = []
+        if spec.before_delete:
+            spec.before_delete(db, old, rows)
+        match = columns[0] if len(columns) == 1 else tuple_(*columns)
+        for chunk in chunks(keys, IN_CLAUSE_SIZE):
+            db.execute(delete(spec.table).where(match.in_([key[0] for key in chunk] if len(columns) == 1 else chunk)))
+
+    if spec.after_write:
+        spec.after_write(db, old, rows)
+
+
+def check_batch_size(items):
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch.")
+
+
+def split_codes(codes):
+    """The codes of a ``?codes=A,B,C`` lookup in request order, without blanks and repeats."""
+    codes = list(dict.fromkeys(code.strip() for code in codes.split(',') if code.strip()))
+    check_batch_size(codes)
+    return codes
+
+
+def in_request_order(codes, found):
+    return {"data": [found[code] for code in codes if code in found],
+            "missing": [code for code in codes if code not in found]}
+
+
+async def apply_batch(db, operation, items, spec, atomic=False):
+    """Run a batch on an AsyncSession and commit it; integrity errors roll the whole batch back."""
+    check_batch_size(items)
+    try:
+        result = await db.run_sync(run_batch, operation, items, spec, atomic)
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail=f"Batch conflicts with existing data, nothing was written: {e.orig}")
+    return result
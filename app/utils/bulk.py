@@ -0,0 +1,27 @@
+from sqlalchemy import delete, insert, select
+
+WRITE_BATCH_SIZE = 5000  # rows per executemany call
+IN_CLAUSE_SIZE = 1000  # codes per IN (...) lookup
+
+
+def chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def existing_codes(db, column, codes):
+    found = set()
+    for chunk in chunks(sorted(codes), IN_CLAUSE_SIZE):
+        found.update(db.execute(select(column).where(column.in_(chunk))).scalars())
+    return found
+
+
+def bulk_insert(db, table, records):
+    for batch in chunks(records, WRITE_BATCH_SIZE):
+        db.execute(insert(table), batch)
+
+
+def bulk_delete(db, column, codes):
+    for chunk in chunks(sorted(codes), IN_CLAUSE_SIZE):
+        db.execute(delete(column.table).where(column.in_(chunk)))
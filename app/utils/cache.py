@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from app.utils.bulk import IN_CLAUSE_SIZE, chunks
+
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def evict(self, predicate):
+        """Drop every entry whose value matches ``predicate``; returns how many were dropped."""
+        with self._lock:
+            keys = [key for key, (value, _) in self._entries.items() if predicate(value)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+# Reference data (regions, cities, warehouses, products) changes a few times a day
+REFERENCE_CACHE_ENABLED = os.getenv("REFERENCE_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+REFERENCE_CACHE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", "300"))
+REFERENCE_CACHE_SIZE = int(os.getenv("REFERENCE_CACHE_SIZE", "10000"))
+
+# Keys of the full-table listing, plain and as an encoded body; tuples so no entity code can collide with them
+ALL = ('all',)
+ALL_JSON = ('all', 'json')
+
+reference_caches = {
+    name: TTLCache(REFERENCE_CACHE_SIZE, REFERENCE_CACHE_TTL)
+    for name in ('regions', 'cities', 'warehouses', 'products')
+}
+_settings = {"enabled": REFERENCE_CACHE_ENABLED}
+
+
+def reference_cache_enabled():
+    return _settings["enabled"]
+
+
+def set_reference_cache_enabled(enabled):
+    _settings["enabled"] = enabled
+    if not enabled:
+        invalidate_reference(*reference_caches)
+
+
+async def cached_reference(table, key, loader):
+    """Return ``await loader()`` for ``key``, cached per reference table; ``None`` is not cached."""
+    if not _settings["enabled"]:
+        return await loader()
+    cache = reference_caches[table]
+    value = cache.get(key)
+    if value is MISSING:
+        value = await loader()
+        if value is not None:
+            cache.set(key, value)
+    return value
+
+
+async def cached_references(table, codes, loader):
+    """Look up many keys like ``cached_reference``; the misses are loaded with one ``await loader(missed)``.
+
+    ``loader`` returns a ``{code: value}`` dict of the codes it found.
+    """
+    found = {}
+    cache = reference_caches[table] if _settings["enabled"] else None
+    if cache is not None:
+        for code in codes:
+            value = cache.get(code)
+            if value is not MISSING:
+                found[code] = value
+    missed = [code for code in codes if code not in found]
+    if missed:
+        loaded = await loader(missed)
+        found.update(loaded)
+        if cache is not None:
+            for code, value in loaded.items():
+                cache.set(code, value)
+    return found
+
+
+def as_dict(schema, obj):
+    return schema.from_orm(obj).dict() if obj is not None else None
+
+
+async def load_all(db, model, schema):
+    return [as_dict(schema, row) for row in (await db.scalars(select(model))).all()]
+
+
+async def load_one(db, model, schema, **key):
+    return as_dict(schema, await db.scalar(select(model).filter_by(**key)))
+
+
+def invalidate_reference(*tables):
+    for table in tables:
+        reference_caches[table].clear()
+
+
+def reference_cache_stats():
+    return {
+        "enabled": _settings["enabled"],
+        "tables": {name: cache.stats() for name, cache in reference_caches.items()},
+    }
+
+
+# Verified JWT principals, keyed by token; an entry never outlives its token's exp
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+
+def invalidate_principal(user_id):
+    return principal_cache.evict(lambda principal: principal.id == user_id)
+
+
+async def load_many(db, model, schema, column, codes):
+    """``{code: row}`` of the rows whose ``column`` is in ``codes``, one IN query per chunk."""
+    rows = {}
+    for chunk in chunks(codes, IN_CLAUSE_SIZE):
+        for obj in (await db.scalars(select(model).where(column.in_(chunk)))).all():
+            rows[getattr(obj, column.key)] = as_dict(schema, obj)
+    return rows
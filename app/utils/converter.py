@@ -1,6 +1,8 @@
 import pandas as pd
 import xml.etree.ElementTree as ET
 
+SS_NAMESPACE = 'urn:schemas-microsoft-com:office:spreadsheet'
+
 
 def xml_to_dataframe(xml_file):
     tree = ET.parse(xml_file)
@@ -8,7 +10,7 @@ def xml_to_dataframe(xml_file):
 
     # Define the namespace dictionary
     namespaces = {
-        'ss': 'urn:schemas-microsoft-com:office:spreadsheet'
+        'ss': SS_NAMESPACE
     }
 
     # Initialize data list
@@ -36,9 +38,11 @@ def xml_to_excel(xml_file, excel_file):
     df.to_excel(excel_file, index=False)
 
 
-# Example usage
-xml_file = '../data/firma_stok_31.XML'  # Replace with your XML file
-excel_file = '../data/output.xlsx'  # Replace with your desired Excel file name
+if __name__ == '__main__':
+    # Example usage
+    xml_file = '../data/firma_stok_31.XML'  # Replace with your XML file
+    excel_file = '../data/output.xlsx'  # Replace with your desired Excel file name
+
+    xml_to_excel(xml_file, excel_file)
+    print(f"Converted {xml_file} to {excel_file}")
 
-xml_to_excel(xml_file, excel_file)
-print(f"Converted {xml_file} to {excel_file}")
@@ -0,0 +1,76 @@
+import os
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import select
+
+try:
+    import orjson
+except ImportError:  # the fast path stays off without it
+    orjson = None
+
+# Opt-in: large list endpoints select plain column tuples and encode them with orjson,
+# skipping ORM entities and response-model validation
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_ENABLED", "0").lower() not in ("0", "false", "no")
+
+_settings = {"enabled": FAST_JSON_ENABLED and orjson is not None}
+
+
+def fast_json_enabled():
+    return _settings["enabled"]
+
+
+def set_fast_json_enabled(enabled):
+    _settings["enabled"] = enabled and orjson is not None
+    return fast_json_settings()
+
+
+def fast_json_settings():
+    return {"enabled": _settings["enabled"], "orjson": orjson.__version__ if orjson is not None else None}
+
+
+def _prints_alike(value):
+    # repr() switches to exponent notation outside [1e-4, 1e16), where orjson writes 1e-05 as 0.00001
+    return value is None or value == 0 or 1e-4 <= abs(value) < 1e16
+
+
+def encode(content, floats=()):
+    """The bytes FastAPI's JSONResponse would send for ``content``.
+
+    orjson writes the same bytes as ``json.dumps`` for the str, int, bool,
+    None and naive datetime values of the list endpoints. ``floats`` are the
+    float values in ``content``; if any of them would print differently the
+    body goes through FastAPI's own encoder instead.
+    """
+    if all(_prints_alike(value) for value in floats):
+        return orjson.dumps(content)
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def schema_columns(model, schema):
+    """The columns of ``model`` named like the fields of ``schema``, in field order."""
+    return [getattr(model, name) for name in schema.__fields__]
+
+
+def rows_content(schema, rows):
+    """Dicts in ``schema`` field order from rows of ``schema_columns``, and the float values among them."""
+    names = list(schema.__fields__)
+    float_at = [index for index, field in enumerate(schema.__fields__.values()) if field.type_ is float]
+    floats = [row[index] for row in rows for index in float_at]
+    return [dict(zip(names, row)) for row in rows], floats
+
+
+async def list_json(db, model, schema):
+    """Every ``model`` row encoded as a ``List[schema]`` body, from one column select."""
+    rows = (await db.execute(select(*schema_columns(model, schema)))).all()
+    return encode(*rows_content(schema, rows))
+
+
+def page_json(schema, page):
+    """Encode a pagination dict whose ``data`` holds rows of ``schema_columns``."""
+    data, floats = rows_content(schema, page["data"])
+    return encode({**page, "data": data}, floats)
+
+
+def json_response(body):
+    return Response(content=body, media_type="application/json")
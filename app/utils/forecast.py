@@ -0,0 +1,81 @@
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select
+
+from app.utils.read_model import latest_averages
+from app.utils.rollups import stock_totals
+
+DAYS_PER_YEAR = 365  # average_usage is a yearly consumption
+MAX_FORECAST_DAYS = 36500  # stockout dates further out than this are left empty
+
+
+def forecast_inputs(warehouse_code=None, city_code=None, region_code=None):
+    """Select ``(product_code, quantity, average_usage)`` per product in scope, from the stock rollup."""
+    totals = stock_totals(['product'], warehouse_code=warehouse_code, city_code=city_code,
+                          region_code=region_code).subquery()
+    averages = latest_averages().subquery()
+    return (
+        select(totals.c.product_code, totals.c.quantity, averages.c.average_usage)
+        .outerjoin(averages, totals.c.product_code == averages.c.product_code)
+        .order_by(totals.c.product_code)
+    )
+
+
+def forecast(quantity, average_usage, lead_time_days, today=None):
+    """Days of cover, stockout date and reorder flag for every product in one pass.
+
+    ``quantity`` and ``average_usage`` are equal-length arrays; a missing or
+    zero usage means the stock never runs out (infinite cover, no stockout
+    date). Returns ``(days_of_cover, stockout_date, reorder)`` arrays, with
+    stockout dates as ``datetime64[D]`` (NaT when there is none).
+    """
+    quantity = np.clip(np.asarray(quantity, dtype=float), 0, None)
+    daily_usage = np.asarray(average_usage, dtype=float) / DAYS_PER_YEAR
+    consuming = daily_usage > 0  # False for NaN as well
+
+    days_of_cover = np.full(quantity.shape, np.inf)
+    np.divide(quantity, daily_usage, out=days_of_cover, where=consuming)
+
+    dated = days_of_cover <= MAX_FORECAST_DAYS
+    offsets = np.floor(np.where(dated, days_of_cover, 0)).astype('timedelta64[D]')
+    stockout_date = np.where(dated, np.datetime64(today or date.today(), 'D') + offsets, np.datetime64('NaT'))
+
+    reorder = days_of_cover < lead_time_days
+    return days_of_cover, stockout_date, reorder
+
+
+def forecast_rows(rows, lead_time_days, max_cover_days=None, reorder_only=False, today=None):
+    """Forecast ``(product_code, quantity, average_usage)`` rows into plain JSON-ready dicts, shortest cover first.
+
+    Quantities and usages are converted to ``int`` and ``float`` first, so
+    ``Decimal`` sums from MySQL serialize like SQLite's integers.
+    """
+    if not rows:
+        return []
+    product_codes, quantity, average_usage = (list(column) for column in zip(*rows))
+    quantity = np.array([int(value) if value is not None else 0 for value in quantity], dtype=np.int64)
+    average_usage = np.array([float(value) if value is not None else np.nan for value in average_usage], dtype=float)
+    days_of_cover, stockout_date, reorder = forecast(quantity, average_usage, lead_time_days, today)
+
+    keep = np.ones(len(rows), dtype=bool)
+    if max_cover_days is not None:
+        keep &= days_of_cover < max_cover_days
+    if reorder_only:
+        keep &= reorder
+    # Shortest cover first
+    order = np.flatnonzero(keep)[np.argsort(days_of_cover[keep], kind="stable")]
+
+    cover = days_of_cover[order].astype(object)
+    cover[~np.isfinite(days_of_cover[order])] = None  # no consumption
+    usage = average_usage[order].astype(object)
+    usage[np.isnan(average_usage[order])] = None
+    stockout = np.datetime_as_string(stockout_date[order]).astype(object)
+    stockout[np.isnat(stockout_date[order])] = None
+    columns = zip(np.array(product_codes, dtype=object)[order].tolist(), quantity[order].tolist(), usage.tolist(),
+                  cover.tolist(), stockout.tolist(), reorder[order].tolist())
+    return [
+        {"product_code": code, "quantity": stock, "average_usage": amount,
+         "days_of_cover": days, "stockout_date": day, "reorder": flag}
+        for code, stock, amount, days, day, flag in columns
+    ]
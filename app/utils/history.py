@@ -0,0 +1,164 @@
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import func, insert, literal, null, or_, select, update
+
+from app.default.models import Inventory, InventoryHistory, InventorySnapshot
+from app.utils.bulk import bulk_insert
+
+HISTORY_FIELDS = ['inventory_code', 'product_code', 'warehouse_code', 'quantity']
+
+
+def open_snapshot(db, source, taken_at=None):
+    """Start a snapshot in the current transaction and return its id."""
+    result = db.execute(insert(InventorySnapshot.__table__).values(
+        taken_at=taken_at or datetime.now(), source=source, changed_rows=0))
+    return result.inserted_primary_key[0]
+
+
+def _count_changes(db, snapshot_id, count):
+    table = InventorySnapshot.__table__
+    db.execute(update(table).where(table.c.id == snapshot_id).values(changed_rows=table.c.changed_rows + count))
+
+
+def _history_insert(snapshot_id, rows, quantity=None):
+    # INSERT ... SELECT of (inventory_code, product_code, warehouse_code) rows; NULL quantity marks a removal
+    columns = rows.selected_columns
+    return insert(InventoryHistory.__table__).from_select(
+        ['snapshot_id'] + HISTORY_FIELDS,
+        rows.with_only_columns(literal(snapshot_id), columns.inventory_code, columns.product_code,
+                               columns.warehouse_code, quantity if quantity is not None else null())
+    )
+
+
+def record_changes(db, snapshot_id, previous, current):
+    """Append what changed from ``previous`` to ``current`` to the snapshot.
+
+    Both hold ``HISTORY_FIELDS`` rows (frames, dicts or tuples) of the inventory
+    codes written: codes only in ``previous`` were deleted, codes only in
+    ``current`` were added. Unchanged rows are not stored.
+    """
+    previous = pd.DataFrame(previous, columns=HISTORY_FIELDS).drop_duplicates('inventory_code', keep='last')
+    current = pd.DataFrame(current, columns=HISTORY_FIELDS).drop_duplicates('inventory_code', keep='last')
+    merged = current.merge(previous, on='inventory_code', how='outer', suffixes=('', '_previous'), indicator=True)
+
+    both = merged['_merge'] == 'both'
+    moved = both & ((merged['product_code'] != merged['product_code_previous'])
+                    | (merged['warehouse_code'] != merged['warehouse_code_previous']))
+    removed = merged[(merged['_merge'] == 'right_only') | moved]
+    added = merged[(merged['_merge'] == 'left_only') | moved
+                   | (both & (merged['quantity'] != merged['quantity_previous']))]
+
+    # Removals first, so a moved row's new state has the higher id
+    records = [
+        {'snapshot_id': snapshot_id, 'inventory_code': row.inventory_code, 'product_code': row.product_code_previous,
+         'warehouse_code': row.warehouse_code_previous, 'quantity': None}
+        for row in removed.itertuples(index=False)
+    ] + [
+        {'snapshot_id': snapshot_id, 'inventory_code': row.inventory_code, 'product_code': row.product_code,
+         'warehouse_code': row.warehouse_code, 'quantity': int(row.quantity)}
+        for row in added.itertuples(index=False)
+    ]
+    bulk_insert(db, InventoryHistory.__table__, records)
+    _count_changes(db, snapshot_id, len(records))
+
+
+def record_staged(db, snapshot_id, live_table, staged_table):
+    """Append the difference between the live inventory and a staged replacement, in SQL."""
+    live, staged = live_table.c, staged_table.c
+    same_code = staged.inventory_code == live.inventory_code
+    moved = or_(staged.product_code.is_distinct_from(live.product_code),
+                staged.warehouse_code.is_distinct_from(live.warehouse_code))
+    removed = db.execute(_history_insert(
+        snapshot_id,
+        select(live_table).select_from(live_table.outerjoin(staged_table, same_code))
+        .where(or_(staged.inventory_code.is_(None), moved))
+    ))
+    added = db.execute(_history_insert(
+        snapshot_id,
+        select(staged_table).select_from(staged_table.outerjoin(live_table, same_code))
+        .where(or_(live.inventory_code.is_(None), moved, staged.quantity.is_distinct_from(live.quantity))),
+        quantity=staged.quantity
+    ))
+    _count_changes(db, snapshot_id, removed.rowcount + added.rowcount)
+
+
+def record_edit(db, previous, current):
+    # Single-row API writes get a snapshot of their own
+    record_changes(db, open_snapshot(db, 'api'), previous, current)
+
+
+def record_removed_where(db, condition):
+    """Record the inventory rows matching ``condition`` as removed; call before deleting them."""
+    snapshot_id = open_snapshot(db, 'api')
+    result = db.execute(_history_insert(snapshot_id, select(Inventory.__table__).where(condition)))
+    _count_changes(db, snapshot_id, result.rowcount)
+
+
+def ensure_history(db):
+    # First start after history was added: the current inventory is the baseline every later change builds on
+    has_snapshots = db.execute(select(InventorySnapshot.id).limit(1)).first()
+    has_inventory = db.execute(select(Inventory.inventory_code).limit(1)).first()
+    if has_inventory and not has_snapshots:
+        inventory = Inventory.__table__
+        snapshot_id = open_snapshot(db, 'baseline')
+        result = db.execute(_history_insert(snapshot_id, select(inventory), quantity=inventory.c.quantity))
+        _count_changes(db, snapshot_id, result.rowcount)
+        db.commit()
+
+
+def stock_as_of(at, product_code=None, warehouse_code=None):
+    """Select the inventory rows as they were at ``at``: the latest history row of each code up to then."""
+    history, snapshots = InventoryHistory, InventorySnapshot
+    last_snapshot = select(func.max(snapshots.id)).where(snapshots.taken_at <= at).scalar_subquery()
+    latest = select(history.inventory_code, func.max(history.id).label('id')).where(history.snapshot_id <= last_snapshot)
+    # A row that later left the product or warehouse has a removal under the old codes, so filtering here is safe
+    if product_code:
+        latest = latest.where(history.product_code == product_code)
+    if warehouse_code:
+        latest = latest.where(history.warehouse_code == warehouse_code)
+    latest = latest.group_by(history.inventory_code).subquery()
+    return (
+        select(history.inventory_code, history.product_code, history.warehouse_code, history.quantity,
+               snapshots.taken_at)
+        .join(latest, history.id == latest.c.id)
+        .join(snapshots, history.snapshot_id == snapshots.id)
+        .where(history.quantity.is_not(None))
+        .order_by(history.inventory_code)
+    )
+
+
+def product_history(product_code, warehouse_code=None):
+    """Select every history row of a product, oldest first, for ``quantity_series``."""
+    history, snapshots = InventoryHistory, InventorySnapshot
+    query = (
+        select(history.snapshot_id, snapshots.taken_at, history.inventory_code, history.quantity)
+        .join(snapshots, history.snapshot_id == snapshots.id)
+        .where(history.product_code == product_code)
+        .order_by(history.id)
+    )
+    if warehouse_code:
+        query = query.where(history.warehouse_code == warehouse_code)
+    return query
+
+
+def quantity_series(rows, start=None, end=None):
+    """Total quantity after each snapshot that changed it, from ``product_history`` rows.
+
+    Each row replaces its inventory code's previous quantity, so the total moves
+    by the difference; the running sum of those is the series.
+    """
+    frame = pd.DataFrame(rows, columns=['snapshot_id', 'taken_at', 'inventory_code', 'quantity'])
+    if frame.empty:
+        return []
+    quantity = frame['quantity'].fillna(0)
+    frame['change'] = quantity - quantity.groupby(frame['inventory_code']).shift(fill_value=0)
+    series = frame.groupby(['snapshot_id', 'taken_at'], sort=True)['change'].sum().cumsum().reset_index()
+    if start is not None:
+        series = series[series['taken_at'] >= start]
+    if end is not None:
+        series = series[series['taken_at'] <= end]
+    return [
+        {'snapshot_id': int(row.snapshot_id), 'taken_at': row.taken_at, 'quantity': int(row.change)}
+        for row in series.itertuples(index=False)
+    ]
@@ -0,0 +1,392 @@
+import time
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import bindparam, select, update
+
+from app.default.models import City, Warehouse, Product, Inventory, InventorySearchTerm, StockRollup
+from app.utils.averages import add_file_consumption
+from app.utils.bulk import IN_CLAUSE_SIZE, WRITE_BATCH_SIZE, chunks, existing_codes, bulk_insert, bulk_delete
+from app.joined.joined_models import JoinedInventory
+from app.utils.cache import invalidate_reference
+from app.utils.forecast import DAYS_PER_YEAR
+from app.utils.history import open_snapshot, record_changes, record_staged
+from app.utils.read_model import refresh_joined, remove_joined, fill_joined
+from app.utils.rollups import apply_stock_changes, fill_stock_rollup
+from app.utils.search import index_inventory, unindex_inventory, fill_search_index
+from app.utils.table_swap import create_staging_table, swap_tables, drop_table, drop_tables_later
+
+# Excel column -> inventory field
+INVENTORY_COLUMNS = {
+    'Malzeme': 'product_code',
+    'Malzeme Tanım': 'product_name',
+    'DepoY.': 'warehouse_code',
+    'UNIQID': 'inventory_code',
+    'Toplam Miktar': 'quantity',
+}
+REQUIRED_FIELDS = ['product_code', 'warehouse_code', 'inventory_code', 'quantity']
+INVENTORY_FIELDS = ['inventory_code', 'product_code', 'warehouse_code', 'quantity']
+ROLLUP_FIELDS = ['product_code', 'warehouse_code', 'quantity']
+
+# Excel column -> consumption field; a row has either a date or a year
+CONSUMPTION_COLUMNS = {
+    'Malzeme': 'product_code',
+    'Tarih': 'date',
+    'Yıl': 'year',
+    'Miktar': 'consumed',
+}
+
+
+def _as_codes(series):
+    # Numeric codes come back from Excel as floats when the column has blanks
+    if pd.api.types.is_float_dtype(series) and (series % 1 == 0).all():
+        series = series.astype('int64')
+    return series.astype(str).str.strip()
+
+
+def _with_throughput(stats, started):
+    elapsed = time.perf_counter() - started
+    stats['elapsed_seconds'] = round(elapsed, 3)
+    stats['rows_per_sec'] = round(stats['rows'] / elapsed) if elapsed else stats['rows']
+    return stats
+
+
+def prepare_inventory_frame(df):
+    missing = [column for column in INVENTORY_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Excel file is missing required columns: {', '.join(missing)}")
+
+    frame = df[list(INVENTORY_COLUMNS)].rename(columns=INVENTORY_COLUMNS)
+    frame['quantity'] = pd.to_numeric(frame['quantity'], errors='coerce')
+    frame = frame.dropna(subset=REQUIRED_FIELDS)
+    for field in ['product_code', 'warehouse_code', 'inventory_code']:
+        frame[field] = _as_codes(frame[field])
+    frame = frame[(frame['product_code'] != '') & (frame['warehouse_code'] != '') & (frame['inventory_code'] != '')].copy()
+
+    frame['quantity'] = frame['quantity'].round().astype('int64')
+    # Products created from the upload need a name; a blank one falls back to the product code
+    names = frame['product_name'].astype(object)
+    blank = names.isna() | (names.astype(str).str.strip() == '')
+    frame['product_name'] = names.where(~blank, frame['product_code'])
+    frame['city_code'] = frame['warehouse_code'].str[:2]
+    return frame, len(df) - len(frame)
+
+
+def _ensure_reference_data(db, frame, known):
+    cities = set(frame['city_code']) - known['cities']
+    if cities:
+        missing = cities - existing_codes(db, City.city_code, cities)
+        bulk_insert(db, City.__table__, [
+            {'city_code': code, 'city_name': f"City {code}"} for code in sorted(missing)
+        ])
+        known['cities'] |= cities
+
+    warehouses = frame.drop_duplicates('warehouse_code').set_index('warehouse_code')['city_code']
+    codes = set(warehouses.index) - known['warehouses']
+    if codes:
+        missing = codes - existing_codes(db, Warehouse.warehouse_code, codes)
+        bulk_insert(db, Warehouse.__table__, [
+            {'warehouse_code': code, 'warehouse_name': f"Warehouse {code}", 'city_code': warehouses[code]}
+            for code in sorted(missing)
+        ])
+        known['warehouses'] |= codes
+
+    products = frame.drop_duplicates('product_code').set_index('product_code')['product_name']
+    codes = set(products.index) - known['products']
+    if codes:
+        missing = codes - existing_codes(db, Product.product_code, codes)
+        bulk_insert(db, Product.__table__, [
+            {'product_code': code, 'product_name': products[code], 'unit_price': 0}
+            for code in sorted(missing)
+        ])
+        known['products'] |= codes
+
+
+def _write_inventory(db, table, frame, timestamp, written, check_existing, stats, snapshot_id):
+    # Later rows win, same as the old ON DUPLICATE KEY UPDATE loop
+    deduped = frame.drop_duplicates('inventory_code', keep='last')
+    stats['updated'] += len(frame) - len(deduped)
+
+    codes = set(deduped['inventory_code'])
+    existing = codes & written
+    if check_existing:
+        # Upserts write the live table, so the stock rollup moves from the old rows to the new ones
+        previous = load_inventory_frame(db, table, codes)
+        existing |= set(previous['inventory_code'])
+        apply_stock_changes(db, previous[ROLLUP_FIELDS], deduped[ROLLUP_FIELDS])
+        record_changes(db, snapshot_id, previous, deduped[INVENTORY_FIELDS])
+    written |= codes
+
+    records = deduped[INVENTORY_FIELDS].assign(timestamp=timestamp)
+    is_update = records['inventory_code'].isin(existing)
+
+    inserts = records[~is_update].to_dict('records')
+    bulk_insert(db, table, inserts)
+    stats['inserted'] += len(inserts)
+
+    updates = records[is_update]
+    bulk_update_inventory(db, table, updates)
+    stats['updated'] += len(updates)
+
+
+def bulk_update_inventory(db, table, records):
+    statement = (
+        update(table)
+        .where(table.c.inventory_code == bindparam('b_inventory_code'))
+        .values(
+            product_code=bindparam('b_product_code'),
+            warehouse_code=bindparam('b_warehouse_code'),
+            quantity=bindparam('b_quantity'),
+            timestamp=bindparam('b_timestamp'),
+        )
+    )
+    params = records.rename(columns=lambda name: f"b_{name}").to_dict('records')
+    for batch in chunks(params, WRITE_BATCH_SIZE):
+        db.execute(statement, batch)
+
+
+def load_inventory_frame(db, table=None, codes=None):
+    table = table if table is not None else Inventory.__table__
+    statement = select(table.c.inventory_code, table.c.product_code, table.c.warehouse_code, table.c.quantity)
+    if codes is None:
+        return pd.DataFrame(db.execute(statement).all(), columns=INVENTORY_FIELDS)
+    rows = []
+    for chunk in chunks(sorted(codes), IN_CLAUSE_SIZE):
+        rows.extend(db.execute(statement.where(table.c.inventory_code.in_(chunk))).all())
+    return pd.DataFrame(rows, columns=INVENTORY_FIELDS)
+
+
+def diff_inventory(current, uploaded):
+    """Split an upload into inserts, updates and deletes against the current rows.
+
+    Both frames carry ``INVENTORY_FIELDS``; ``uploaded`` must be unique on
+    ``inventory_code``. Returns ``(inserts, updates, deletes)`` frames, all
+    indexed by position and holding the uploaded values (current for deletes).
+    """
+    merged = uploaded[INVENTORY_FIELDS].merge(
+        current[INVENTORY_FIELDS], on='inventory_code', how='outer', suffixes=('', '_current'), indicator=True
+    )
+    inserts = merged[merged['_merge'] == 'left_only']
+    deletes = merged[merged['_merge'] == 'right_only']
+
+    both = merged[merged['_merge'] == 'both']
+    changed = (
+        (both['quantity'] != both['quantity_current'])
+        | (both['product_code'] != both['product_code_current'])
+        | (both['warehouse_code'] != both['warehouse_code_current'])
+    )
+    updates = both[changed]
+
+    deletes = deletes[['inventory_code']].assign(
+        **{field: deletes[f"{field}_current"] for field in INVENTORY_FIELDS[1:]}
+    )
+    return (
+        inserts[INVENTORY_FIELDS].reset_index(drop=True),
+        updates[INVENTORY_FIELDS].reset_index(drop=True),
+        deletes[INVENTORY_FIELDS].reset_index(drop=True),
+    )
+
+
+def _apply_inventory_delta(db, uploaded, timestamp, stats, snapshot_id):
+    uploaded = uploaded.drop_duplicates('inventory_code', keep='last')
+    current = load_inventory_frame(db)
+    inserts, updates, deletes = diff_inventory(current, uploaded)
+
+    table = Inventory.__table__
+    bulk_insert(db, table, inserts.assign(quantity=inserts['quantity'].astype('int64'), timestamp=timestamp).to_dict('records'))
+    bulk_update_inventory(db, table, updates.assign(quantity=updates['quantity'].astype('int64'), timestamp=timestamp))
+    bulk_delete(db, Inventory.inventory_code, deletes['inventory_code'])
+
+    replaced = current[current['inventory_code'].isin(updates['inventory_code'])]
+    apply_stock_changes(db, pd.concat([replaced, deletes])[ROLLUP_FIELDS], pd.concat([inserts, updates])[ROLLUP_FIELDS])
+    record_changes(db, snapshot_id, pd.concat([replaced, deletes]), pd.concat([inserts, updates]))
+
+    changed = pd.concat([inserts['inventory_code'], updates['inventory_code']])
+    index_inventory(db, changed)
+    unindex_inventory(db, deletes['inventory_code'])
+    refresh_joined(db, changed)
+    remove_joined(db, deletes['inventory_code'])
+
+    stats['inserted'] += len(inserts)
+    stats['updated'] += len(updates)
+    stats['deleted'] = len(deletes)
+    stats['unchanged'] = len(uploaded) - len(inserts) - len(updates)
+
+
+def ingest_inventory(db, frames, mode='replace', progress=None):
+    """Load inventory rows from an iterable of DataFrames in a single transaction.
+
+    Reference data (cities, warehouses, products) is resolved per chunk with one
+    IN lookup per table and the missing codes are inserted in bulk.
+
+    ``replace`` loads into a staging copy of the inventory table and swaps it in
+    once the load is committed, so readers never see a partial inventory.
+    ``upsert`` writes into the live table on ``inventory_code``. ``delta``
+    treats the upload as the full new inventory but only writes the rows that
+    were added, changed or removed. ``progress`` is called with the running
+    stats after every chunk.
+    """
+    started = time.perf_counter()
+    timestamp = datetime.now()
+    stats = {'rows': 0, 'inserted': 0, 'updated': 0, 'skipped': 0}
+    known = {'cities': set(), 'warehouses': set(), 'products': set()}
+    written = set()
+    uploaded = []
+
+    bind = db.get_bind()
+    staged = []
+    if mode == 'replace':
+        # The search index and joined read model are rebuilt next to the inventory and swapped in with it
+        staged = [
+            (Inventory.__table__, create_staging_table(bind, Inventory.__table__)),
+            (InventorySearchTerm.__table__, create_staging_table(bind, InventorySearchTerm.__table__)),
+            (JoinedInventory.__table__, create_staging_table(bind, JoinedInventory.__table__)),
+            (StockRollup.__table__, create_staging_table(bind, StockRollup.__table__)),
+        ]
+    target = staged[0][1] if staged else Inventory.__table__
+    try:
+        # Every upload is a history snapshot holding only the rows it changed
+        snapshot_id = stats['snapshot_id'] = open_snapshot(db, mode, timestamp)
+        for df in frames:
+            stats['rows'] += len(df)
+            frame, skipped = prepare_inventory_frame(df)
+            stats['skipped'] += skipped
+            if frame.empty:
+                continue
+            _ensure_reference_data(db, frame, known)
+            if mode == 'delta':
+                uploaded.append(frame[INVENTORY_FIELDS])
+            else:
+                _write_inventory(db, target, frame, timestamp, written, mode == 'upsert', stats, snapshot_id)
+            if progress:
+                progress(_with_throughput(dict(stats), started))
+        if mode != 'upsert' and not (written or uploaded):
+            # Replacing the inventory with nothing is almost certainly a bad file
+            raise ValueError("Uploaded file has no valid inventory rows.")
+        if mode == 'delta':
+            _apply_inventory_delta(db, pd.concat(uploaded), timestamp, stats, snapshot_id)
+        elif mode == 'upsert':
+            index_inventory(db, written)
+            refresh_joined(db, written)
+        else:
+            record_staged(db, snapshot_id, Inventory.__table__, target)
+            fill_search_index(db, target, staged[1][1])
+            fill_joined(db, target, staged[2][1])
+            fill_stock_rollup(db, target, staged[3][1])
+        db.commit()
+        invalidate_reference('cities', 'warehouses', 'products')
+        if staged:
+            drop_tables_later(bind, swap_tables(bind, staged))
+    except Exception:
+        db.rollback()
+        for _, staging in staged:
+            drop_table(bind, staging)
+        raise
+
+    return _with_throughput(stats, started)
+
+
+def ingest_products(db, frames, progress=None):
+    """Insert products that are not in the database yet, one IN lookup per chunk."""
+    started = time.perf_counter()
+    stats = {'rows': 0, 'inserted': 0, 'existing': 0, 'skipped': 0}
+    seen = set()
+
+    try:
+        for df in frames:
+            stats['rows'] += len(df)
+            frame = df[['Malzeme', 'Malzeme Tanım']].dropna()
+            frame = frame.assign(Malzeme=_as_codes(frame['Malzeme']))
+            frame = frame[(frame['Malzeme'] != '') & (frame['Malzeme Tanım'].astype(str).str.strip() != '')]
+            stats['skipped'] += len(df) - len(frame)
+
+            products = frame.drop_duplicates('Malzeme').set_index('Malzeme')['Malzeme Tanım']
+            codes = set(products.index) - seen
+            missing = sorted(codes - existing_codes(db, Product.product_code, codes))
+            bulk_insert(db, Product.__table__, [
+                {'product_code': code, 'product_name': products[code], 'unit_price': 0} for code in missing
+            ])
+            stats['inserted'] += len(missing)
+            stats['existing'] += len(frame) - len(missing)
+            seen |= codes
+            if progress:
+                progress(_with_throughput(dict(stats), started))
+        db.commit()
+        invalidate_reference('products')
+    except Exception:
+        db.rollback()
+        raise
+
+    return _with_throughput(stats, started)
+
+
+def prepare_consumption_frame(df):
+    missing = [column for column in ['Malzeme', 'Miktar'] if column not in df.columns]
+    if missing or not {'Tarih', 'Yıl'} & set(df.columns):
+        raise ValueError("Consumption file needs the columns Malzeme, Miktar and either Tarih or Yıl")
+
+    frame = df[[column for column in CONSUMPTION_COLUMNS if column in df.columns]].rename(columns=CONSUMPTION_COLUMNS)
+    # Without dates a row stands for its whole year
+    frame['date'] = pd.to_datetime(frame['date'], errors='coerce', dayfirst=True) if 'date' in frame.columns else pd.NaT
+    if 'year' in frame.columns:
+        frame['year'] = pd.to_numeric(frame['year'], errors='coerce')
+    else:
+        frame['year'] = frame['date'].dt.year
+    frame['consumed'] = pd.to_numeric(frame['consumed'], errors='coerce')
+    frame = frame.dropna(subset=['product_code', 'year', 'consumed'])
+    frame['product_code'] = _as_codes(frame['product_code'])
+    frame = frame[frame['product_code'] != ''].astype({'year': 'int64'})
+    return frame[['product_code', 'year', 'date', 'consumed']], len(df) - len(frame)
+
+
+def consumption_coverage(spans):
+    """Days of each year a file covers, from per-year ``min``/``max`` date frames of its chunks.
+
+    Dated rows cover their year from the first to the last date, inclusive;
+    a year given without dates counts as fully covered.
+    """
+    span = pd.concat(spans).groupby(level=0).agg({'min': 'min', 'max': 'max'})
+    days = (span['max'] - span['min']).dt.days + 1
+    return days.fillna(DAYS_PER_YEAR).clip(upper=DAYS_PER_YEAR)
+
+
+def ingest_consumption(db, frames, progress=None, replace=False):
+    """Total consumption files per product and year and annualize them into the yearly averages.
+
+    The totals are added to those of earlier uploads together with the days
+    the file covers, so partial-year files (e.g. one per month) accumulate into
+    one yearly rate; ``replace`` drops the stored totals of the file's years
+    first. See ``add_file_consumption``. Products that are not in the database
+    are left out and counted.
+    """
+    started = time.perf_counter()
+    stats = {'rows': 0, 'skipped': 0}
+    totals = []
+    spans = []
+
+    for df in frames:
+        stats['rows'] += len(df)
+        frame, skipped = prepare_consumption_frame(df)
+        stats['skipped'] += skipped
+        totals.append(frame.groupby(['product_code', 'year'])['consumed'].sum())
+        spans.append(frame.groupby('year')['date'].agg(['min', 'max']))
+        if progress:
+            progress(_with_throughput(dict(stats), started))
+    if not totals or all(total.empty for total in totals):
+        raise ValueError("Uploaded file has no valid consumption rows.")
+
+    consumed = pd.concat(totals).groupby(level=['product_code', 'year']).sum().rename('consumed').reset_index()
+    coverage = consumption_coverage(spans)
+    known = consumed['product_code'].isin(existing_codes(db, Product.product_code, set(consumed['product_code'])))
+    try:
+        averages = add_file_consumption(db, consumed[known], coverage, replace=replace)
+    except Exception:
+        db.rollback()
+        raise
+
+    stats['products'] = int(consumed.loc[known, 'product_code'].nunique())
+    stats['averages'] = len(averages)
+    stats['unknown_products'] = int(consumed.loc[~known, 'product_code'].nunique())
+    stats['covered_days'] = {int(year): float(days) for year, days in coverage.items()}
+    stats['replaced'] = replace
+    return _with_throughput(stats, started)
@@ -0,0 +1,169 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from fastapi.logger import logger
+from sqlalchemy import func, or_, select, text, update
+
+from app.database import SessionLocal, engine
+from app.default.models import ImportJob
+from app.utils.ingestion import ingest_inventory, ingest_products, ingest_consumption
+from app.utils.schema import ensure_columns
+from app.utils.spreadsheet import iter_upload_chunks
+
+# Imports running at the same time across all workers (counted in import_jobs); the rest wait queued
+MAX_CONCURRENT_IMPORTS = int(os.getenv("IMPORT_MAX_CONCURRENT_JOBS", "2"))
+# How often a queued job checks for a free slot
+IMPORT_SLOT_POLL_SECONDS = float(os.getenv("IMPORT_SLOT_POLL_SECONDS", "1"))
+SLOT_LOCK = 'import_job_slots'
+# A running job renews heartbeat_at this often; one not renewed for the lease is treated as dead
+IMPORT_HEARTBEAT_SECONDS = float(os.getenv("IMPORT_HEARTBEAT_SECONDS", "15"))
+IMPORT_LEASE_SECONDS = float(os.getenv("IMPORT_LEASE_SECONDS", "120"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+INGESTERS = {
+    'inventory': ingest_inventory,
+    'products': ingest_products,
+    'averages': ingest_consumption,
+}
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_IMPORTS, thread_name_prefix="import-job")
+
+
+def _update_job(job_id, **values):
+    # Job state is written in its own short transaction, outside the import's
+    db = SessionLocal()
+    try:
+        db.execute(update(ImportJob).where(ImportJob.job_id == job_id).values(**values))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _lock_slots(conn):
+    # Serializes slot claims of every worker; released with the transaction (or explicitly on MySQL)
+    if conn.dialect.name == 'sqlite':
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif conn.dialect.name in ('mysql', 'mariadb'):
+        conn.execute(text("SELECT GET_LOCK(:name, -1)"), {"name": SLOT_LOCK})
+    elif conn.dialect.name == 'postgresql':
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": SLOT_LOCK})
+
+
+def _lease_expired():
+    # Jobs from before heartbeats were recorded fall back to their start time
+    cutoff = datetime.now() - timedelta(seconds=IMPORT_LEASE_SECONDS)
+    return (ImportJob.status == 'running') & or_(
+        func.coalesce(ImportJob.heartbeat_at, ImportJob.started_at) < cutoff,
+        func.coalesce(ImportJob.heartbeat_at, ImportJob.started_at).is_(None),
+    )
+
+
+def claim_slot(job_id):
+    """Mark a queued job running if fewer than MAX_CONCURRENT_IMPORTS jobs run in any worker.
+
+    Running jobs whose lease expired (their worker crashed or was killed) are
+    failed first, so they don't hold a slot forever.
+    """
+    with engine.connect() as conn:
+        _lock_slots(conn)
+        try:
+            now = datetime.now()
+            conn.execute(update(ImportJob).where(_lease_expired())
+                         .values(status='failed', error="Worker stopped renewing the job's lease", finished_at=now))
+            running = conn.scalar(select(func.count()).select_from(ImportJob).where(ImportJob.status == 'running'))
+            claimed = running < MAX_CONCURRENT_IMPORTS
+            if claimed:
+                conn.execute(update(ImportJob).where(ImportJob.job_id == job_id)
+                             .values(status='running', started_at=now, heartbeat_at=now))
+            conn.commit()
+        finally:
+            if conn.dialect.name in ('mysql', 'mariadb'):
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": SLOT_LOCK})
+    return claimed
+
+
+def _keep_alive(job_id, stopped):
+    # Renews the lease until the job ends, however long a single chunk takes
+    while not stopped.wait(IMPORT_HEARTBEAT_SECONDS):
+        try:
+            _update_job(job_id, heartbeat_at=datetime.now())
+        except Exception as e:
+            logger.warning(f"Could not renew the lease of import job {job_id}: {str(e)}")
+
+
+def _run_job(job_id, kind, path, file_format, options):
+    def progress(stats):
+        # Best effort: a locked status row must not abort the import itself
+        try:
+            _update_job(job_id, rows_processed=stats['rows'], rows_per_sec=stats['rows_per_sec'])
+        except Exception as e:
+            logger.warning(f"Could not record progress of import job {job_id}: {str(e)}")
+
+    db = None
+    stopped = threading.Event()
+    try:
+        while not claim_slot(job_id):
+            time.sleep(IMPORT_SLOT_POLL_SECONDS)
+        threading.Thread(target=_keep_alive, args=(job_id, stopped), daemon=True,
+                         name=f"import-lease-{job_id[:8]}").start()
+        db = SessionLocal()
+        stats = INGESTERS[kind](db, iter_upload_chunks(path, file_format), progress=progress, **options)
+        _update_job(job_id, status='succeeded', result=stats, rows_processed=stats['rows'],
+                    rows_per_sec=stats['rows_per_sec'], finished_at=datetime.now())
+    except Exception as e:
+        logger.error(f"Import job {job_id} failed: {str(e)}")
+        _update_job(job_id, status='failed', error=str(e), finished_at=datetime.now())
+    finally:
+        stopped.set()
+        if db is not None:
+            db.close()
+        os.remove(path)
+
+
+def submit_import(db, kind, path, file_format, filename=None, **options):
+    job = ImportJob(job_id=str(uuid.uuid4()), kind=kind, filename=filename, status='queued',
+                    worker=WORKER_ID, rows_processed=0, created_at=datetime.now())
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _executor.submit(_run_job, job.job_id, kind, path, file_format, options)
+    return job
+
+
+def _worker_alive(worker):
+    host, _, pid = (worker or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return True  # can't tell from here, leave it to its own host
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def ensure_import_jobs(db):
+    # Columns added to import_jobs after it was first created (heartbeat_at)
+    ensure_columns(db.get_bind(), ImportJob.__table__)
+
+
+def fail_interrupted_jobs(db):
+    # The spooled file of an unfinished job is gone once its worker has died. This runs at
+    # startup, before this process submitted anything: a job already carrying our WORKER_ID
+    # is from an earlier process with the same host name and pid (e.g. pid 1 in a container)
+    db.execute(update(ImportJob).where(_lease_expired())
+               .values(status='failed', error="Worker stopped renewing the job's lease", finished_at=datetime.now()))
+    jobs = db.query(ImportJob).filter(ImportJob.status.in_(['queued', 'running'])).all()
+    for job in jobs:
+        if job.worker == WORKER_ID or not _worker_alive(job.worker):
+            job.status = 'failed'
+            job.error = "Interrupted by a worker restart"
+            job.finished_at = datetime.now()
+    db.commit()
@@ -0,0 +1,74 @@
+import threading
+from bisect import bisect_left
+
+# Seconds; covers a pool checkout as well as a slow report query
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_collectors = []
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the shape Prometheus expects."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return {"buckets": list(zip(self.buckets, cumulative)), "count": running, "sum": total}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render_histogram(name, help_text, series):
+    """``series`` is a list of ``(labels, Histogram)``."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        data = histogram.snapshot()
+        for bound, count in data["buckets"]:
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {count}")
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {data['count']}")
+        lines.append(f"{name}_sum{_labels(labels)} {data['sum']}")
+        lines.append(f"{name}_count{_labels(labels)} {data['count']}")
+    return lines
+
+
+def render_values(name, kind, help_text, series):
+    """Counter or gauge lines; ``series`` is a list of ``(labels, value)``."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in series)
+    return lines
+
+
+def register_collector(collector):
+    # ``collector()`` returns the text exposition lines of one subsystem
+    _collectors.append(collector)
+
+
+def render_metrics():
+    lines = []
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,20 @@
+import base64
+import json
+
+from fastapi import HTTPException
+
+
+def encode_cursor(last_key):
+    payload = json.dumps({"after": last_key}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    # An empty cursor starts from the first page
+    if not cursor:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return json.loads(payload)["after"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
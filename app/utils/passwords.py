@@ -0,0 +1,55 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+# Cost factor for new hashes; logins rehash passwords stored with a different cost
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so threads hash in parallel without starving the shared threadpool
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Requests allowed to wait for a worker before new ones are turned away with 503
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "64"))
+RETRY_AFTER_SECONDS = 1
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_lock = threading.Lock()
+_stats = {"pending": 0, "completed": 0, "rejected": 0}
+
+
+async def _run(function, *args):
+    with _lock:
+        if _stats["pending"] >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT:
+            _stats["rejected"] += 1
+            raise HTTPException(status_code=503, detail="Too many concurrent logins, try again shortly.",
+                                headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+        _stats["pending"] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, function, *args)
+    finally:
+        with _lock:
+            _stats["pending"] -= 1
+            _stats["completed"] += 1
+
+
+async def hash_password(password):
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_password(password, hashed_password):
+    """Return ``(valid, new_hash)``; ``new_hash`` is set when the stored hash should be replaced."""
+    return await _run(pwd_context.verify_and_update, password, hashed_password)
+
+
+def password_pool_stats():
+    with _lock:
+        return {
+            **_stats,
+            "workers": PASSWORD_HASH_WORKERS,
+            "queue_limit": PASSWORD_HASH_QUEUE_LIMIT,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+        }
@@ -0,0 +1,141 @@
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.utils.metrics import Histogram, register_collector, render_histogram, render_values
+
+
+class PoolMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.pool = None
+        self.wait = Histogram()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self._lock = threading.Lock()
+
+    def checked_out(self):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def checked_in(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def stats(self):
+        pool = self.pool
+        wait = self.wait.snapshot()
+        return {
+            "pool_size": pool.size() if pool is not None else None,
+            "overflow": pool.overflow() if pool is not None else None,
+            "idle": pool.checkedin() if pool is not None else None,
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "checkouts": self.checkouts,
+            "checkout_timeouts": self.timeouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "checkout_wait_seconds_total": round(wait["sum"], 6),
+            "checkout_wait_seconds_avg": round(wait["sum"] / wait["count"], 6) if wait["count"] else None,
+        }
+
+
+class _TimedCheckout:
+    """Times how long a checkout waits on the pool; there is no pool event for the start of one."""
+
+    metrics = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.timeouts += 1
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.wait.observe(time.perf_counter() - started)
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        if self.metrics is not None:
+            self.metrics.pool = pool
+        return pool
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+pool_metrics = {}
+
+
+def instrument_pool(engine, name):
+    """Track checkouts, waits and connection churn of ``engine``'s pool under ``name``."""
+    metrics = PoolMetrics(name)
+    metrics.pool = engine.pool
+    engine.pool.metrics = metrics
+    pool_metrics[name] = metrics
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checked_out()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        metrics.checked_in()
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
+
+    return metrics
+
+
+def pool_stats():
+    return {name: metrics.stats() for name, metrics in pool_metrics.items()}
+
+
+def _collect():
+    series = [({"pool": name}, metrics.stats()) for name, metrics in pool_metrics.items()]
+    lines = render_histogram(
+        "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.",
+        [({"pool": name}, metrics.wait) for name, metrics in pool_metrics.items()],
+    )
+    for key, kind, help_text in (
+        ("pool_size", "gauge", "Configured number of persistent connections."),
+        ("in_use", "gauge", "Connections currently checked out."),
+        ("peak_in_use", "gauge", "Most connections checked out at once since start."),
+        ("overflow", "gauge", "Connections open beyond pool_size (negative while the pool is filling)."),
+        ("idle", "gauge", "Connections idle in the pool."),
+        ("checkouts", "counter", "Connections handed out by the pool."),
+        ("checkout_timeouts", "counter", "Checkouts that gave up after pool_timeout."),
+        ("connects", "counter", "New DBAPI connections opened."),
+        ("invalidations", "counter", "Connections invalidated (e.g. failed pre-ping)."),
+    ):
+        name = f"db_pool_{key}_total" if kind == "counter" else f"db_pool_{key}"
+        lines.extend(render_values(name, kind, help_text, [(labels, stats[key]) for labels, stats in series]))
+    return lines
+
+
+register_collector(_collect)
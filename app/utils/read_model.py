@@ -0,0 +1,135 @@
+from datetime import datetime
+
+from sqlalchemy import and_, delete, exists, func, insert, or_, select
+
+from app.default.models import Inventory, Product, Warehouse, YearlyAverageConsumption
+from app.joined.joined_models import JoinedInventory
+from app.utils.bulk import IN_CLAUSE_SIZE, chunks
+from app.utils.table_swap import create_staging_table, swap_tables, drop_table, drop_tables_later
+
+JOINED_FIELDS = ['warehouse_code', 'inventory_code', 'product_code', 'quantity', 'timestamp',
+                 'warehouse_name', 'product_name', 'average_consumption', 'average_year']
+
+# Averages for a later year only apply once that year starts; see refresh_for_new_year
+_state = {"year": None}
+
+
+def latest_averages(year=None):
+    """Select ``(product_code, average_usage, year)``: each product's latest average for a year <= ``year``."""
+    year = year or datetime.now().year
+    averages = YearlyAverageConsumption
+    latest = (
+        select(averages.product_code, func.max(averages.year).label('year'))
+        .where(averages.year <= year)
+        .group_by(averages.product_code)
+        .subquery()
+    )
+    # max() keeps one row should a product have two averages for the same year
+    return (
+        select(averages.product_code, func.max(averages.average_usage).label('average_usage'),
+               averages.year)
+        .join(latest, and_(averages.product_code == latest.c.product_code, averages.year == latest.c.year))
+        .group_by(averages.product_code, averages.year)
+    )
+
+
+def _joined_rows(inventory_table):
+    inventory = inventory_table.c
+    averages = latest_averages().subquery()
+    return (
+        select(inventory.warehouse_code, inventory.inventory_code, inventory.product_code, inventory.quantity,
+               inventory.timestamp, Warehouse.warehouse_name, Product.product_name,
+               averages.c.average_usage, averages.c.year)
+        .join(Warehouse, inventory.warehouse_code == Warehouse.warehouse_code)
+        .join(Product, inventory.product_code == Product.product_code)
+        .outerjoin(averages, inventory.product_code == averages.c.product_code)
+    )
+
+
+def _fill(db, joined_table, rows):
+    db.execute(insert(joined_table).from_select(JOINED_FIELDS, rows))
+
+
+def remove_joined(db, codes):
+    table = JoinedInventory.__table__
+    for chunk in chunks(sorted(codes), IN_CLAUSE_SIZE):
+        db.execute(delete(table).where(table.c.inventory_code.in_(chunk)))
+
+
+def refresh_joined(db, codes):
+    """Rebuild the read-model rows of the given inventory rows; call before committing their write."""
+    remove_joined(db, codes)
+    inventory = Inventory.__table__
+    for chunk in chunks(sorted(codes), IN_CLAUSE_SIZE):
+        _fill(db, JoinedInventory.__table__, _joined_rows(inventory).where(inventory.c.inventory_code.in_(chunk)))
+
+
+def remove_joined_where(db, condition):
+    # Drop the read-model rows of the inventory rows matching ``condition`` before they are deleted
+    table = JoinedInventory.__table__
+    codes = select(Inventory.inventory_code).where(condition)
+    db.execute(delete(table).where(table.c.inventory_code.in_(codes)))
+
+
+def _refresh_where(db, joined_condition, inventory_condition):
+    db.execute(delete(JoinedInventory.__table__).where(joined_condition))
+    _fill(db, JoinedInventory.__table__, _joined_rows(Inventory.__table__).where(inventory_condition))
+
+
+def refresh_joined_products(db, product_codes):
+    # Product names and averages are copied into every row holding the product
+    for chunk in chunks(sorted(set(product_codes)), IN_CLAUSE_SIZE):
+        _refresh_where(db, JoinedInventory.product_code.in_(chunk), Inventory.product_code.in_(chunk))
+
+
+def refresh_joined_warehouse(db, warehouse_code):
+    refresh_joined_warehouses(db, [warehouse_code])
+
+
+def refresh_joined_warehouses(db, warehouse_codes):
+    # Warehouse names are copied into every row of the warehouse
+    for chunk in chunks(sorted(set(warehouse_codes)), IN_CLAUSE_SIZE):
+        _refresh_where(db, JoinedInventory.warehouse_code.in_(chunk), Inventory.warehouse_code.in_(chunk))
+
+
+def fill_joined(db, inventory_table, joined_table):
+    _fill(db, joined_table, _joined_rows(inventory_table))
+
+
+def rebuild_joined(db):
+    bind = db.get_bind()
+    staging = create_staging_table(bind, JoinedInventory.__table__)
+    try:
+        fill_joined(db, Inventory.__table__, staging)
+        db.commit()
+        drop_tables_later(bind, swap_tables(bind, [(JoinedInventory.__table__, staging)]))
+    except Exception:
+        db.rollback()
+        drop_table(bind, staging)
+        raise
+
+
+def ensure_joined(db):
+    # First start after the read model was added: build it from the current inventory
+    has_rows = db.execute(select(JoinedInventory.inventory_code).limit(1)).first()
+    has_inventory = db.execute(select(Inventory.inventory_code).limit(1)).first()
+    if has_inventory and not has_rows:
+        rebuild_joined(db)
+
+
+def refresh_for_new_year(db):
+    """Once per process and year, switch rows still showing an older average to this year's."""
+    year = datetime.now().year
+    if _state["year"] == year:
+        return
+    averages, joined = YearlyAverageConsumption, JoinedInventory
+    stale = db.execute(
+        select(averages.product_code).distinct()
+        .where(averages.year == year)
+        .where(exists().where(joined.product_code == averages.product_code,
+                              or_(joined.average_year.is_(None), joined.average_year < year)))
+    ).scalars().all()
+    if stale:
+        refresh_joined_products(db, stale)
+        db.commit()
+    _state["year"] = year
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from app.utils.metrics import Histogram, register_collector, render_histogram, render_values
+
+REQUEST_METRICS_ENABLED = os.getenv("REQUEST_METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+UNMATCHED = "unmatched"  # 404s and mounts; keeps arbitrary paths out of the label set
+
+# Mutable per-request totals; the threadpool copies the context, so sync handlers add to the same object
+current_request = ContextVar("current_request", default=None)
+
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "db_time")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.db_time = 0.0
+
+
+def current_route():
+    """``"METHOD /route/{template}"`` of the request being served, or ``None`` outside one."""
+    stats = current_request.get()
+    if stats is None:
+        return None
+    route = stats.scope.get("route")
+    return f"{stats.scope['method']} {route.path if route is not None else stats.scope['path']}"
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.duration = Histogram()
+        self.db_time = Histogram()
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.statuses = {}
+
+
+_routes = {}
+_routes_lock = threading.Lock()
+
+
+def _route_metrics(key):
+    metrics = _routes.get(key)
+    if metrics is None:
+        with _routes_lock:
+            metrics = _routes.setdefault(key, RouteMetrics())
+    return metrics
+
+
+def instrument_queries(engine):
+    """Count statements and time spent in the database for the request being served."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += time.perf_counter() - context._query_started
+
+
+class RequestMetricsMiddleware:
+    """Per-route latency, SQL count and DB time, plus a ``Server-Timing`` header on every response.
+
+    Plain ASGI rather than ``BaseHTTPMiddleware`` so streamed responses pass
+    straight through and the per-request cost stays a few microseconds.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not REQUEST_METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                elapsed = time.perf_counter() - started
+                timing = (f"app;dur={elapsed * 1000:.1f}, "
+                          f"db;dur={stats.db_time * 1000:.1f};desc=\"{stats.queries} queries\"")
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"server-timing", timing.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            route = scope.get("route")
+            key = (scope["method"], route.path if route is not None else UNMATCHED)
+            metrics = _route_metrics(key)
+            metrics.duration.observe(time.perf_counter() - started)
+            metrics.db_time.observe(stats.db_time)
+            metrics.queries.observe(stats.queries)
+            metrics.statuses[status[0]] = metrics.statuses.get(status[0], 0) + 1
+
+
+def _collect():
+    routes = [({"method": method, "route": path}, metrics) for (method, path), metrics in list(_routes.items())]
+    lines = render_histogram("http_request_duration_seconds", "Wall time per request, by route.",
+                             [(labels, metrics.duration) for labels, metrics in routes])
+    lines += render_histogram("http_request_db_seconds", "Time spent executing SQL per request, by route.",
+                              [(labels, metrics.db_time) for labels, metrics in routes])
+    lines += render_histogram("http_request_queries", "SQL statements executed per request, by route.",
+                              [(labels, metrics.queries) for labels, metrics in routes])
+    lines += render_values("http_responses_total", "counter", "Responses by route and status code.", [
+        ({**labels, "status": status}, count)
+        for labels, metrics in routes for status, count in sorted(metrics.statuses.items())
+    ])
+    return lines
+
+
+register_collector(_collect)
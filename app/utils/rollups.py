@@ -0,0 +1,134 @@
+import pandas as pd
+from sqlalchemy import BigInteger, bindparam, cast, delete, func, insert, select, tuple_, update
+
+from app.default.models import City, Inventory, Product, StockRollup, Warehouse
+from app.utils.bulk import IN_CLAUSE_SIZE, WRITE_BATCH_SIZE, chunks, bulk_insert
+from app.utils.table_swap import create_staging_table, swap_tables, drop_table, drop_tables_later
+
+PAIR = ['product_code', 'warehouse_code']
+
+# group_by level -> column it groups on
+LEVELS = {
+    'product': Product.product_code,
+    'warehouse': Warehouse.warehouse_code,
+    'city': City.city_code,
+    'region': City.region_code,
+}
+
+
+def _totals(rows, sign):
+    rows = pd.DataFrame(rows, columns=PAIR + ['quantity'])
+    return (
+        rows.groupby(PAIR, as_index=False)
+        .agg(quantity=('quantity', 'sum'), row_count=('quantity', 'size'))
+        .assign(quantity=lambda totals: totals['quantity'] * sign, row_count=lambda totals: totals['row_count'] * sign)
+    )
+
+
+def apply_stock_changes(db, removed, added):
+    """Move the rollup from ``removed`` to ``added`` inventory rows (product_code, warehouse_code, quantity).
+
+    Updates pass the old row as removed and the new one as added. Call before
+    committing the inventory write.
+    """
+    changes = pd.concat([_totals(removed, -1), _totals(added, 1)]).groupby(PAIR, as_index=False).sum()
+    changes = changes[(changes['quantity'] != 0) | (changes['row_count'] != 0)]
+    if changes.empty:
+        return
+
+    table = StockRollup.__table__
+    pairs = list(changes[PAIR].itertuples(index=False, name=None))
+    existing = set()
+    for chunk in chunks(pairs, IN_CLAUSE_SIZE):
+        existing.update(db.execute(
+            select(table.c.product_code, table.c.warehouse_code)
+            .where(tuple_(table.c.product_code, table.c.warehouse_code).in_(chunk))
+        ).all())
+
+    is_existing = pd.Series([pair in existing for pair in pairs], index=changes.index, dtype=bool)
+    records = changes.astype({'quantity': 'int64', 'row_count': 'int64'})
+    bulk_insert(db, table, records[~is_existing].to_dict('records'))
+
+    statement = (
+        update(table)
+        .where(table.c.product_code == bindparam('b_product_code'),
+               table.c.warehouse_code == bindparam('b_warehouse_code'))
+        .values(quantity=table.c.quantity + bindparam('b_quantity'),
+                row_count=table.c.row_count + bindparam('b_row_count'))
+    )
+    params = records[is_existing].rename(columns=lambda name: f"b_{name}").to_dict('records')
+    for batch in chunks(params, WRITE_BATCH_SIZE):
+        db.execute(statement, batch)
+
+    # Pairs whose last inventory row went away
+    shrunk = list(changes.loc[changes['row_count'] < 0, PAIR].itertuples(index=False, name=None))
+    for chunk in chunks(shrunk, IN_CLAUSE_SIZE):
+        db.execute(delete(table).where(tuple_(table.c.product_code, table.c.warehouse_code).in_(chunk),
+                                       table.c.row_count <= 0))
+
+
+def remove_stock_where(db, condition):
+    # Product and warehouse deletes take all of their inventory with them
+    db.execute(delete(StockRollup.__table__).where(condition))
+
+
+def fill_stock_rollup(db, inventory_table, rollup_table):
+    inventory = inventory_table.c
+    db.execute(insert(rollup_table).from_select(
+        ['product_code', 'warehouse_code', 'quantity', 'row_count'],
+        select(inventory.product_code, inventory.warehouse_code, func.sum(inventory.quantity), func.count())
+        .group_by(inventory.product_code, inventory.warehouse_code)
+    ))
+
+
+def rebuild_stock_rollup(db):
+    bind = db.get_bind()
+    staging = create_staging_table(bind, StockRollup.__table__)
+    try:
+        fill_stock_rollup(db, Inventory.__table__, staging)
+        db.commit()
+        drop_tables_later(bind, swap_tables(bind, [(StockRollup.__table__, staging)]))
+    except Exception:
+        db.rollback()
+        drop_table(bind, staging)
+        raise
+
+
+def ensure_stock_rollup(db):
+    # First start after the rollup was added: build it from the current inventory
+    has_rows = db.execute(select(StockRollup.product_code).limit(1)).first()
+    has_inventory = db.execute(select(Inventory.inventory_code).limit(1)).first()
+    if has_inventory and not has_rows:
+        rebuild_stock_rollup(db)
+
+
+def stock_totals(group_by, product_code=None, warehouse_code=None, city_code=None, region_code=None):
+    """Select quantity, stock value (quantity * unit_price) and row count grouped by the given levels."""
+    rollup = StockRollup
+    keys = [LEVELS[level].label(f"{level}_code") for level in group_by]
+    # MySQL returns SUM of integers as DECIMAL; cast back so callers get ints
+    query = (
+        select(*keys,
+               cast(func.sum(rollup.quantity), BigInteger).label('quantity'),
+               func.sum(rollup.quantity * func.coalesce(Product.unit_price, 0)).label('stock_value'),
+               cast(func.sum(rollup.row_count), BigInteger).label('rows'))
+        .select_from(rollup)
+        .join(Product, rollup.product_code == Product.product_code)
+        .group_by(*[LEVELS[level] for level in group_by])
+        .order_by(*[LEVELS[level] for level in group_by])
+    )
+    # Only walk up the hierarchy as far as the grouping and filters need
+    needs_city = city_code or region_code or {'city', 'region'} & set(group_by)
+    if needs_city or 'warehouse' in group_by:
+        query = query.join(Warehouse, rollup.warehouse_code == Warehouse.warehouse_code)
+    if needs_city:
+        query = query.outerjoin(City, Warehouse.city_code == City.city_code)
+    if product_code:
+        query = query.where(rollup.product_code == product_code)
+    if warehouse_code:
+        query = query.where(rollup.warehouse_code == warehouse_code)
+    if city_code:
+        query = query.where(Warehouse.city_code == city_code)
+    if region_code:
+        query = query.where(City.region_code == region_code)
+    return query
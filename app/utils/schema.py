@@ -0,0 +1,61 @@
+from fastapi.logger import logger
+from sqlalchemy import UniqueConstraint, inspect
+
+
+def ensure_columns(bind, table):
+    """Add the columns of ``table`` that its live table lacks; ``create_all`` only creates missing tables.
+
+    New columns must be nullable without a server default, so existing rows
+    simply read as NULL. Returns the names of the columns added.
+    """
+    existing = {column['name'] for column in inspect(bind).get_columns(table.name)}
+    missing = [column for column in table.columns if column.name not in existing]
+    quote = bind.dialect.identifier_preparer.quote
+    with bind.connect() as conn:
+        for column in missing:
+            logger.info(f"Adding column {table.name}.{column.name}")
+            conn.exec_driver_sql(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} "
+                                 f"{column.type.compile(dialect=bind.dialect)}")
+        conn.commit()
+    return [column.name for column in missing]
+
+
+def missing_unique_constraints(bind, table):
+    """The ``UniqueConstraint``s of ``table`` its live table has neither as a constraint nor as a unique index."""
+    inspector = inspect(bind)
+    existing = {tuple(constraint['column_names']) for constraint in inspector.get_unique_constraints(table.name)}
+    existing |= {tuple(index['column_names']) for index in inspector.get_indexes(table.name) if index['unique']}
+    return [constraint for constraint in table.constraints
+            if isinstance(constraint, UniqueConstraint) and tuple(constraint.columns.keys()) not in existing]
+
+
+def ensure_unique_constraints(bind, table):
+    """Create the missing unique constraints of ``table`` as unique indexes; the rows must already be unique."""
+    missing = missing_unique_constraints(bind, table)
+    quote = bind.dialect.identifier_preparer.quote
+    with bind.connect() as conn:
+        for constraint in missing:
+            logger.info(f"Adding unique index {constraint.name} on {table.name}")
+            columns = ', '.join(quote(name) for name in constraint.columns.keys())
+            conn.exec_driver_sql(f"CREATE UNIQUE INDEX {quote(constraint.name)} ON {quote(table.name)} ({columns})")
+        conn.commit()
+    return [constraint.name for constraint in missing]
+
+
+def ensure_indexes(bind, table):
+    """Create the indexes of ``table`` that its live table has on none of the same columns.
+
+    Does nothing while the table itself doesn't exist. Returns the names of the
+    indexes created.
+    """
+    inspector = inspect(bind)
+    if not inspector.has_table(table.name):
+        return []
+    existing = {tuple(index['column_names']) for index in inspector.get_indexes(table.name)}
+    existing |= {tuple(constraint['column_names']) for constraint in inspector.get_unique_constraints(table.name)}
+    existing.add(tuple(inspector.get_pk_constraint(table.name)['constrained_columns']))
+    missing = [index for index in table.indexes if tuple(index.columns.keys()) not in existing]
+    for index in missing:
+        logger.info(f"Adding index {index.name} on {table.name}")
+        index.create(bind=bind)
+    return [index.name for index in missing]
@@ -0,0 +1,162 @@
+import pandas as pd
+from sqlalchemy import Boolean, case, delete, distinct, func, literal, select, union_all
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+
+from app.default.models import Inventory, InventorySearchTerm, Product
+from app.utils.bulk import IN_CLAUSE_SIZE, WRITE_BATCH_SIZE, chunks, bulk_insert
+from app.utils.table_swap import create_staging_table, swap_tables, drop_table, drop_tables_later
+
+TERM_LENGTH = 100
+MAX_SEARCH_TOKENS = 5
+
+# Exact and prefix hits on codes rank above hits on product name words
+FIELD_WEIGHTS = {'inventory_code': 4, 'product_code': 3, 'warehouse_code': 2}
+NAME_WEIGHT = 1
+
+ROW_FIELDS = ['inventory_code', 'product_code', 'warehouse_code', 'product_name']
+
+
+def build_terms(rows):
+    parts = [
+        pd.DataFrame({'term': rows[field], 'inventory_code': rows['inventory_code'], 'weight': weight})
+        for field, weight in FIELD_WEIGHTS.items()
+    ]
+    names = rows[['inventory_code', 'product_name']].dropna()
+    words = names.assign(term=names['product_name'].astype(str).str.split(r'[^\w]+', regex=True)).explode('term')
+    parts.append(words[['term', 'inventory_code']].assign(weight=NAME_WEIGHT))
+
+    terms = pd.concat(parts, ignore_index=True).dropna(subset=['term'])
+    terms['term'] = terms['term'].astype(str).str.strip().str.lower().str.slice(0, TERM_LENGTH)
+    terms = terms[terms['term'] != '']
+    return terms.sort_values('weight', ascending=False).drop_duplicates(['term', 'inventory_code'])
+
+
+def _indexed_rows(inventory_table):
+    return (
+        select(inventory_table.c.inventory_code, inventory_table.c.product_code,
+               inventory_table.c.warehouse_code, Product.product_name)
+        .outerjoin(Product, inventory_table.c.product_code == Product.product_code)
+    )
+
+
+def _write_terms(db, terms_table, rows):
+    terms = build_terms(pd.DataFrame(rows, columns=ROW_FIELDS))
+    bulk_insert(db, terms_table, terms.to_dict('records'))
+
+
+def unindex_inventory(db, codes, terms_table=None):
+    terms_table = terms_table if terms_table is not None else InventorySearchTerm.__table__
+    for chunk in chunks(sorted(codes), IN_CLAUSE_SIZE):
+        db.execute(delete(terms_table).where(terms_table.c.inventory_code.in_(chunk)))
+
+
+def index_inventory(db, codes, inventory_table=None, terms_table=None):
+    """(Re)index the given inventory rows; call before committing their write."""
+    inventory_table = inventory_table if inventory_table is not None else Inventory.__table__
+    terms_table = terms_table if terms_table is not None else InventorySearchTerm.__table__
+    unindex_inventory(db, codes, terms_table)
+    for chunk in chunks(sorted(codes), IN_CLAUSE_SIZE):
+        rows = db.execute(_indexed_rows(inventory_table).where(inventory_table.c.inventory_code.in_(chunk))).all()
+        _write_terms(db, terms_table, rows)
+
+
+def reindex_product(db, product_code):
+    reindex_products(db, [product_code])
+
+
+def reindex_products(db, product_codes):
+    # Product names are part of the index of every inventory row holding the product
+    for chunk in chunks(sorted(set(product_codes)), IN_CLAUSE_SIZE):
+        codes = db.execute(select(Inventory.inventory_code).where(Inventory.product_code.in_(chunk))).scalars().all()
+        index_inventory(db, codes)
+
+
+def unindex_where(db, condition):
+    # Drop the terms of the inventory rows matching ``condition`` before they are deleted
+    terms_table = InventorySearchTerm.__table__
+    codes = select(Inventory.inventory_code).where(condition)
+    db.execute(delete(terms_table).where(terms_table.c.inventory_code.in_(codes)))
+
+
+def fill_search_index(db, inventory_table, terms_table):
+    # Buffered rather than streamed: MySQL can't run the inserts while a result is streaming
+    rows = db.execute(_indexed_rows(inventory_table)).all()
+    for batch in chunks(rows, WRITE_BATCH_SIZE):
+        _write_terms(db, terms_table, batch)
+
+
+def rebuild_search_index(db):
+    bind = db.get_bind()
+    staging = create_staging_table(bind, InventorySearchTerm.__table__)
+    try:
+        fill_search_index(db, Inventory.__table__, staging)
+        db.commit()
+        drop_tables_later(bind, swap_tables(bind, [(InventorySearchTerm.__table__, staging)]))
+    except Exception:
+        db.rollback()
+        drop_table(bind, staging)
+        raise
+
+
+def ensure_search_index(db):
+    # First start after the index table was added: build it from the current inventory
+    has_terms = db.execute(select(InventorySearchTerm.term).limit(1)).first()
+    has_inventory = db.execute(select(Inventory.inventory_code).limit(1)).first()
+    if has_inventory and not has_terms:
+        rebuild_search_index(db)
+
+
+def search_tokens(search):
+    return [token[:TERM_LENGTH] for token in search.lower().split()][:MAX_SEARCH_TOKENS]
+
+
+class prefix_match(ColumnElement):
+    """``column`` starts with ``prefix``, as a pattern the column's index can serve under any collation.
+
+    A ``>= token AND < next(token)`` range only holds under binary collation;
+    MySQL's default ``utf8mb4_0900_ai_ci`` sorts ':' and '{' before digits and
+    letters, so tokens ending in '9' or 'z' matched nothing.
+    """
+    type = Boolean()
+    inherit_cache = False
+    _is_implicitly_boolean = True  # a comparison already, so no "= 1" is added in WHERE
+
+    def __init__(self, column, prefix):
+        self.column = column
+        self.prefix = prefix
+
+
+@compiles(prefix_match)
+def _prefix_like(element, compiler, **kw):
+    pattern = element.prefix.replace('/', '//').replace('%', '/%').replace('_', '/_') + '%'
+    return f"{compiler.process(element.column, **kw)} LIKE {compiler.process(literal(pattern), **kw)} ESCAPE '/'"
+
+
+@compiles(prefix_match, 'sqlite')
+def _prefix_glob(element, compiler, **kw):
+    # SQLite's LIKE ignores case and so can't use the BINARY term index; GLOB is case-sensitive and can
+    pattern = ''.join(f"[{char}]" if char in '*?[' else char for char in element.prefix) + '*'
+    return f"{compiler.process(element.column, **kw)} GLOB {compiler.process(literal(pattern), **kw)}"
+
+
+def search_ranking(tokens):
+    """Select ``(inventory_code, rank)`` for rows where every token prefixes a term.
+
+    Each token is a prefix match served by the term primary key, so the cost
+    follows the number of matches rather than the size of the inventory.
+    """
+    terms = InventorySearchTerm.__table__.c
+    matches = union_all(*[
+        select(
+            terms.inventory_code,
+            literal(position).label('position'),
+            case((terms.term == token, terms.weight * 2), else_=terms.weight).label('score'),
+        ).where(prefix_match(terms.term, token))
+        for position, token in enumerate(tokens)
+    ]).subquery()
+    return (
+        select(matches.c.inventory_code, func.sum(matches.c.score).label('rank'))
+        .group_by(matches.c.inventory_code)
+        .having(func.count(distinct(matches.c.position)) == len(tokens))
+    )
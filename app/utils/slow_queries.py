@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from fastapi.logger import logger
+from sqlalchemy import event
+
+from app.utils.request_metrics import current_route
+
+# Off by default; turn on per deployment or at runtime through PUT /admin/slow-queries
+SLOW_QUERY_LOG_ENABLED = os.getenv("SLOW_QUERY_LOG_ENABLED", "0").lower() in ("1", "true", "yes")
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "500"))
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "200"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "1").lower() not in ("0", "false", "no")
+
+STATEMENT_LENGTH = 4000
+PARAMETERS_LENGTH = 1000
+EXPLAINABLE = ("select", "with")
+
+_settings = {"enabled": SLOW_QUERY_LOG_ENABLED, "threshold_ms": SLOW_QUERY_THRESHOLD_MS}
+_entries = deque(maxlen=SLOW_QUERY_BUFFER_SIZE)
+_lock = threading.Lock()
+# One thread: EXPLAIN runs off the request path and never competes with itself
+_explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+
+
+def slow_query_settings():
+    return {**_settings, "buffer_size": SLOW_QUERY_BUFFER_SIZE, "explain": SLOW_QUERY_EXPLAIN}
+
+
+def configure_slow_query_log(enabled=None, threshold_ms=None):
+    if enabled is not None:
+        _settings["enabled"] = enabled
+    if threshold_ms is not None:
+        _settings["threshold_ms"] = threshold_ms
+    return slow_query_settings()
+
+
+def slow_queries(limit=None):
+    with _lock:
+        entries = list(reversed(_entries))
+    return entries[:limit] if limit else entries
+
+
+def clear_slow_queries():
+    with _lock:
+        _entries.clear()
+
+
+def _parameter_types(row):
+    if isinstance(row, dict):
+        return {key: type(value).__name__ for key, value in row.items()}
+    return [type(value).__name__ for value in row or ()]
+
+
+def _describe_parameters(parameters, executemany):
+    # Types and counts only: bound values include user emails and password hashes
+    if executemany:
+        rows = list(parameters)
+        text = f"{len(rows)} rows, first: {_parameter_types(rows[0])!r}" if rows else "0 rows"
+    else:
+        text = repr(_parameter_types(parameters))
+    return text[:PARAMETERS_LENGTH]
+
+
+def _explain(explain_engine, entry, statement, parameters):
+    prefix = "EXPLAIN QUERY PLAN " if explain_engine.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        with explain_engine.connect() as conn:
+            result = conn.execution_options(slow_query_log=False).exec_driver_sql(prefix + statement, parameters)
+            columns = list(result.keys())
+            entry["plan"] = [dict(zip(columns, [str(value) for value in row])) for row in result]
+    except Exception as e:
+        entry["explain_error"] = str(e)
+
+
+def instrument_slow_queries(engine, explain_engine):
+    """Log statements on ``engine`` slower than the threshold; plans are taken on ``explain_engine``.
+
+    ``explain_engine`` must be a sync engine (the async engine's statements are
+    explained on a fresh connection to the same database).
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _settings["enabled"]:
+            context._slow_query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_slow_query_started", None)
+        if started is None or not context.execution_options.get("slow_query_log", True):
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms < _settings["threshold_ms"]:
+            return
+
+        entry = {
+            "at": datetime.now().isoformat(),
+            "duration_ms": round(duration_ms, 2),
+            "route": current_route(),
+            "statement": statement[:STATEMENT_LENGTH],
+            "parameters": _describe_parameters(parameters, executemany),
+            "plan": None,
+        }
+        with _lock:
+            _entries.append(entry)
+        logger.warning(f"Slow query ({entry['duration_ms']} ms, {entry['route']}): {entry['statement']} "
+                       f"-- {entry['parameters']}")
+
+        if SLOW_QUERY_EXPLAIN and not executemany and statement.lstrip().lower().startswith(EXPLAINABLE):
+            _explainer.submit(_explain, explain_engine, entry, statement, parameters)
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from app.utils.converter import SS_NAMESPACE
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+XML_CONTENT_TYPES = {'application/xml', 'text/xml'}
+
+CHUNK_ROWS = 10000  # rows per yielded DataFrame
+SPOOL_BLOCK_SIZE = 1024 * 1024
+
+_ROW = f'{{{SS_NAMESPACE}}}Row'
+_CELL = f'{{{SS_NAMESPACE}}}Cell'
+_DATA = f'{{{SS_NAMESPACE}}}Data'
+_TABLE = f'{{{SS_NAMESPACE}}}Table'
+_WORKSHEET = f'{{{SS_NAMESPACE}}}Worksheet'
+_INDEX = f'{{{SS_NAMESPACE}}}Index'
+_TYPE = f'{{{SS_NAMESPACE}}}Type'
+
+
+def spreadsheet_format(file):
+    extension = os.path.splitext(file.filename or '')[1].lower()
+    if file.content_type == XLSX_CONTENT_TYPE or extension == '.xlsx':
+        return 'xlsx'
+    if file.content_type in XML_CONTENT_TYPES or extension == '.xml':
+        return 'xml'
+    return None
+
+
+async def spool_upload(file):
+    # Copy the upload to a temp file block by block instead of reading it whole
+    handle, path = tempfile.mkstemp(suffix=os.path.splitext(file.filename or '')[1])
+    try:
+        with os.fdopen(handle, 'wb') as out:
+            while True:
+                block = await file.read(SPOOL_BLOCK_SIZE)
+                if not block:
+                    break
+                out.write(block)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def _header(values):
+    return [str(value).strip() if value is not None else f"Unnamed: {index}" for index, value in enumerate(values)]
+
+
+def _frames(columns, rows, chunk_rows):
+    width = len(columns)
+    batch = []
+    for row in rows:
+        row = tuple(row[:width]) + (None,) * (width - len(row))
+        if all(value is None for value in row):
+            continue
+        batch.append(row)
+        if len(batch) >= chunk_rows:
+            yield pd.DataFrame.from_records(batch, columns=columns)
+            batch = []
+    if batch:
+        yield pd.DataFrame.from_records(batch, columns=columns)
+
+
+def iter_xlsx_chunks(path, chunk_rows=CHUNK_ROWS):
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        yield from _frames(_header(header), rows, chunk_rows)
+    finally:
+        workbook.close()
+
+
+def _cell_value(cell):
+    data = cell.find(_DATA)
+    if data is None or data.text is None:
+        return None
+    if data.get(_TYPE) == 'Number':
+        number = float(data.text)
+        return int(number) if number.is_integer() else number
+    return data.text
+
+
+def _spreadsheetml_rows(path):
+    table = None
+    for event, element in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            if element.tag == _TABLE:
+                table = element
+            continue
+        if element.tag == _ROW:
+            values = []
+            for cell in element.iter(_CELL):
+                # ss:Index is 1-based and skips over empty cells
+                index = cell.get(_INDEX)
+                if index is not None:
+                    values.extend([None] * (int(index) - 1 - len(values)))
+                values.append(_cell_value(cell))
+            yield values
+            element.clear()
+            if table is not None:
+                table.remove(element)
+        elif element.tag == _WORKSHEET:
+            # Only the first worksheet is read, like pd.read_excel
+            return
+
+
+def iter_spreadsheetml_chunks(path, chunk_rows=CHUNK_ROWS):
+    rows = _spreadsheetml_rows(path)
+    header = next(rows, None)
+    if header is None:
+        return
+    yield from _frames(_header(header), rows, chunk_rows)
+
+
+def iter_upload_chunks(path, file_format, chunk_rows=CHUNK_ROWS):
+    if file_format == 'xml':
+        return iter_spreadsheetml_chunks(path, chunk_rows)
+    return iter_xlsx_chunks(path, chunk_rows)
@@ -0,0 +1,101 @@
+import threading
+import uuid
+
+from fastapi.logger import logger
+from sqlalchemy import MetaData
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+_MYSQL = ('mysql', 'mariadb')
+
+
+def _referenced_tables(table):
+    return {fk.column.table for fk in table.foreign_keys}
+
+
+def _constrained_columns(constraint):
+    return [column.name for column in constraint.columns]
+
+
+def create_staging_table(bind, table):
+    """Create an empty copy of ``table`` under a unique name and return it.
+
+    Each load gets its own name, so two replace uploads running at the same
+    time never write into each other's staging table.
+    """
+    token = uuid.uuid4().hex[:12]
+    metadata = MetaData()
+    for referenced in _referenced_tables(table):
+        referenced.to_metadata(metadata)
+    staging = table.to_metadata(metadata, name=f"{table.name}_staging_{token}")
+    for number, index in enumerate(staging.indexes):
+        # SQLite index names are database-wide, so they can't be copied as-is
+        index.name = f"ix_{table.name}_{token}_{number}"
+    for number, constraint in enumerate(sorted(staging.foreign_key_constraints, key=_constrained_columns)):
+        # Nor are MySQL's foreign key names
+        constraint.name = f"fk_{table.name}_{token}_{number}"
+    with bind.connect() as conn:
+        for statement in staging_ddl(conn.dialect, table, staging):
+            conn.exec_driver_sql(statement)
+        conn.commit()
+    return staging
+
+
+def staging_ddl(dialect, table, staging):
+    """The statements that create ``staging`` as an empty copy of ``table`` on ``dialect``.
+
+    MySQL copies the live table with ``CREATE TABLE ... LIKE``: models such as
+    ``Inventory`` declare ``Column(String)`` without a length, which MySQL
+    can't compile to DDL. ``LIKE`` leaves out foreign keys, so those are added
+    from the model afterwards. Other databases get the table built from metadata.
+    """
+    if dialect.name in _MYSQL:
+        quote = dialect.identifier_preparer.quote
+        # Rendered by the DDL compiler directly: AddConstraint would stop CreateTable emitting them
+        compiler = dialect.ddl_compiler(dialect, None)
+        return [f"CREATE TABLE {quote(staging.name)} LIKE {quote(table.name)}"] + [
+            f"ALTER TABLE {quote(staging.name)} ADD {compiler.process(constraint)}"
+            for constraint in sorted(staging.foreign_key_constraints, key=_constrained_columns)
+        ]
+    statements = [CreateTable(staging)] + [CreateIndex(index) for index in staging.indexes]
+    return [str(statement.compile(dialect=dialect)) for statement in statements]
+
+
+def drop_table(bind, table):
+    try:
+        table.drop(bind=bind, checkfirst=True)
+    except Exception as e:
+        logger.error(f"Could not drop table {table.name}: {str(e)}")
+
+
+def swap_tables(bind, pairs):
+    """Atomically replace each ``(table, staging)`` pair; returns the retired tables."""
+    quote = bind.dialect.identifier_preparer.quote
+    retired = [
+        staging.to_metadata(MetaData(), name=staging.name.replace('_staging_', '_retired_'))
+        for _, staging in pairs
+    ]
+    renames = []
+    for (table, staging), old in zip(pairs, retired):
+        renames.append((quote(table.name), quote(old.name)))
+        renames.append((quote(staging.name), quote(table.name)))
+
+    with bind.connect() as conn:
+        if conn.dialect.name in _MYSQL:
+            # A multi-table RENAME is atomic: readers see either the old or the new tables
+            conn.exec_driver_sql("RENAME TABLE " + ", ".join(f"{source} TO {target}" for source, target in renames))
+        else:
+            if conn.dialect.name == 'sqlite':
+                # pysqlite doesn't open a transaction for DDL on its own
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+            for source, target in renames:
+                conn.exec_driver_sql(f"ALTER TABLE {source} RENAME TO {target}")
+        conn.commit()
+    return retired
+
+
+def drop_tables_later(bind, tables):
+    def _drop():
+        for table in tables:
+            drop_table(bind, table)
+
+    threading.Thread(target=_drop, daemon=True).start()
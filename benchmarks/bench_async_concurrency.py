@@ -0,0 +1,127 @@
+"""Latency of a cheap endpoint while slow queries are in flight.
+
+Runs the app in-process on an aiosqlite stand-in and compares three cases:
+no background load, slow requests through the AsyncSession handlers, and the
+same slow query run the old way (sync Session inside an ``async def``).
+SQLite runs its queries in this process, so some slowdown under load is CPU
+contention; against MySQL the query work happens on the server.
+
+    python -m benchmarks.bench_async_concurrency --rows 200000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.database import get_db, get_async_db
+from app.default.models import Base, Inventory
+from app.main import app
+from benchmarks.check_inventory_swap import sqlite_engine
+from benchmarks.synthetic import percentile, seed_inventory
+
+legacy = APIRouter()
+
+
+@legacy.get('/bench/legacy-deep-page')
+async def legacy_deep_page(page: int, db: Session = Depends(get_db)):
+    # How every handler used to query: a sync Session call blocking the event loop
+    return len(db.query(Inventory).offset(page * 50).limit(50).all())
+
+
+async def measure(client, slow_path, slow_clients, duration):
+    done = asyncio.Event()
+
+    async def slow_loop():
+        while not done.is_set():
+            await client.get(slow_path)
+
+    async def cheap_loop():
+        samples = []
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get('/inventory/U000000123')
+            response.raise_for_status()
+            samples.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.005)
+        return samples
+
+    slow_tasks = [asyncio.create_task(slow_loop()) for _ in range(slow_clients if slow_path else 0)]
+    samples = await cheap_loop()
+    done.set()
+    await asyncio.gather(*slow_tasks)
+    return {
+        'requests': len(samples),
+        'p50_ms': round(statistics.median(samples), 2),
+        'p95_ms': round(percentile(samples, 0.95), 2),
+        'max_ms': round(max(samples), 2),
+    }
+
+
+async def run(args, workdir):
+    path = os.path.join(workdir, 'bench.db')
+    engine = sqlite_engine(path)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with SessionLocal() as db:
+        seed_inventory(db, args.rows)
+
+    async_engine = create_async_engine(f'sqlite+aiosqlite:///{path}')
+    AsyncSessionLocal = sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    def override_db():
+        with SessionLocal() as db:
+            yield db
+
+    async def override_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_async_db] = override_async_db
+    app.include_router(legacy)
+
+    deep_page = args.rows // 50 - 10
+    scenarios = {
+        'idle': None,
+        'async slow queries': f'/inventory/?page={deep_page}&page_size=50',
+        'legacy slow queries': f'/bench/legacy-deep-page?page={deep_page}',
+    }
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for name, slow_path in scenarios.items():
+            results[name] = await measure(client, slow_path, args.slow_clients, args.duration)
+            print(f'{name:22} {results[name]}')
+
+    await async_engine.dispose()
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--slow-clients', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per scenario')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = asyncio.run(run(args, workdir))
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Stock forecast: the vectorized engine vs. the same rules in a per-row Python loop.
+
+Both sides get the same synthetic quantities and yearly usages (a tenth of the
+products have no average) and must agree on every cover, stockout date and
+reorder flag. With --rows, GET /stock/forecast is also timed end to end over a
+seeded SQLite inventory of that size.
+
+    python -m benchmarks.bench_forecast --products 200000 --rows 500000
+"""
+import argparse
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.utils.forecast import DAYS_PER_YEAR, MAX_FORECAST_DAYS, forecast
+from benchmarks.synthetic import seed_inventory, timed, use_sqlite
+
+
+def forecast_loop(quantity, average_usage, lead_time_days, today):
+    results = []
+    for stock, usage in zip(quantity, average_usage):
+        stock = max(float(stock), 0.0)
+        daily = usage / DAYS_PER_YEAR if usage is not None else 0.0
+        if daily > 0:
+            cover = stock / daily
+            stockout = today + timedelta(days=int(cover)) if cover <= MAX_FORECAST_DAYS else None
+        else:
+            cover, stockout = float('inf'), None
+        results.append((cover, stockout, cover < lead_time_days))
+    return results
+
+
+def compare(products, lead_time_days, repeat):
+    rng = np.random.default_rng(42)
+    quantity = rng.integers(0, 50000, products)
+    usage = rng.uniform(0, 100000, products)
+    usage[rng.random(products) < 0.1] = np.nan
+    usage_list = [None if np.isnan(value) else float(value) for value in usage]
+    quantity_list = quantity.tolist()
+    today = date.today()
+
+    (cover, stockout, reorder), vectorized = timed(lambda: forecast(quantity, usage, lead_time_days, today), repeat)
+    looped, loop = timed(lambda: forecast_loop(quantity_list, usage_list, lead_time_days, today), repeat)
+
+    expected_cover = np.array([row[0] for row in looped])
+    identical = (
+        np.allclose(cover, expected_cover, rtol=1e-12, equal_nan=False)
+        and stockout.tolist() == [row[1] for row in looped]
+        and reorder.tolist() == [row[2] for row in looped]
+    )
+    return {'products': products, 'vectorized_ms': round(vectorized * 1000, 1), 'loop_ms': round(loop * 1000, 1),
+            'speedup': round(loop / vectorized, 1), 'identical': identical}
+
+
+def endpoint(rows, repeat):
+    with tempfile.TemporaryDirectory() as workdir:
+        use_sqlite(os.path.join(workdir, 'forecast.db'))
+        from fastapi.testclient import TestClient
+        from sqlalchemy import insert, select
+        from sqlalchemy.orm import sessionmaker
+        from app.database import engine
+        from app.default.models import Base, Product, YearlyAverageConsumption
+        from app.main import app
+
+        Base.metadata.create_all(bind=engine)
+        with sessionmaker(bind=engine)() as db:
+            seed_inventory(db, rows)
+            codes = db.scalars(select(Product.product_code)).all()
+            db.execute(insert(YearlyAverageConsumption.__table__), [
+                {'product_code': code, 'average_usage': float(index % 5000), 'year': date.today().year}
+                for index, code in enumerate(codes)
+            ])
+            db.commit()
+
+        with TestClient(app) as client:
+            response, seconds = timed(lambda: client.get('/stock/forecast'), repeat)
+        return {'rows': rows, 'products': len(response.json()), 'endpoint_ms': round(seconds * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=200000)
+    parser.add_argument('--rows', type=int, help='also time GET /stock/forecast over this many inventory rows')
+    parser.add_argument('--lead-time-days', type=float, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = {'engine': compare(args.products, args.lead_time_days, args.repeat)}
+    print(f"engine   {results['engine']}")
+    if args.rows:
+        results['endpoint'] = endpoint(args.rows, args.repeat)
+        print(f"endpoint {results['endpoint']}")
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
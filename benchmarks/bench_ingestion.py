@@ -0,0 +1,152 @@
+"""End-to-end upload throughput: /products/upload/ and /inventory/upload/ on a SQLite stand-in.
+
+Every upload runs in a fresh interpreter against a fresh database, so peak
+memory and query counts belong to that request alone. The query count and DB
+time come from the request's Server-Timing header.
+
+    python -m benchmarks.bench_ingestion --rows 10000 100000 1000000 --output ingestion.json
+    python -m benchmarks.bench_ingestion --rows 10000 --baseline ingestion.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import stock_rows, write_xlsx, write_spreadsheetml
+
+WRITERS = {'xlsx': write_xlsx, 'xml': write_spreadsheetml}
+CONTENT_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'xml': 'application/xml',
+}
+ENDPOINTS = {'products': '/products/upload/', 'inventory': '/inventory/upload/'}
+
+
+def _peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _upload(path, file_format, endpoint, mode):
+    # Runs in a child whose DATABASE_URL points at an empty SQLite file
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    url = ENDPOINTS[endpoint] + (f"?mode={mode}" if endpoint == 'inventory' else '')
+    with TestClient(app) as client:
+        baseline = _peak_rss_kb()
+        started = time.perf_counter()
+        with open(path, 'rb') as handle:
+            response = client.post(url, files={'file': (os.path.basename(path), handle, CONTENT_TYPES[file_format])})
+        seconds = time.perf_counter() - started
+
+    timing = response.headers.get('server-timing', '')
+    db = re.search(r'db;dur=([\d.]+);desc="(\d+) queries"', timing)
+    body = response.json()
+    print(json.dumps({
+        'status': response.status_code,
+        'seconds': round(seconds, 3),
+        'peak_rss_mb': round((_peak_rss_kb() - baseline) / 1024, 1),
+        'queries': int(db.group(2)) if db else None,
+        'db_seconds': round(float(db.group(1)) / 1000, 3) if db else None,
+        'result': body,
+    }))
+
+
+def measure(path, file_format, endpoint, mode, workdir):
+    db_path = os.path.join(workdir, f"{endpoint}.db")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", ASYNC_DATABASE_URL=f"sqlite+aiosqlite:///{db_path}")
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_ingestion', '--child', path, file_format, endpoint, mode],
+        check=True, capture_output=True, text=True, env=env,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def stock_file(data_dir, count, file_format):
+    # Generated files are kept in --data-dir between runs; the 1M row xlsx takes a while to write
+    path = os.path.join(data_dir, f"stock_{count}.{file_format}")
+    if not os.path.exists(path):
+        WRITERS[file_format](path + '.part', stock_rows(count))
+        os.replace(path + '.part', path)
+    return path
+
+
+def revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], check=True, capture_output=True,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as handle:
+        baseline = {(r['endpoint'], r['format'], r['rows']): r for r in json.load(handle)['results']}
+    for result in results:
+        before = baseline.get((result['endpoint'], result['format'], result['rows']))
+        if before and before['rows_per_sec']:
+            print(f"{result['endpoint']:9} {result['format']:5} {result['rows']:>9} rows  "
+                  f"rows/sec x{result['rows_per_sec'] / before['rows_per_sec']:.2f}  "
+                  f"peak RSS {before['peak_rss_mb']} -> {result['peak_rss_mb']} MB  "
+                  f"queries {before['queries']} -> {result['queries']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--formats', nargs='+', default=['xlsx', 'xml'], choices=sorted(WRITERS))
+    parser.add_argument('--endpoints', nargs='+', default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument('--mode', default='replace', choices=['replace', 'delta', 'upsert'],
+                        help='inventory upload mode')
+    parser.add_argument('--data-dir', help='keep generated stock files here and reuse them')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON from an earlier run to compare against')
+    parser.add_argument('--child', nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _upload(*args.child)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        data_dir = args.data_dir or workdir
+        os.makedirs(data_dir, exist_ok=True)
+        for file_format in args.formats:
+            for count in args.rows:
+                path = stock_file(data_dir, count, file_format)
+                for endpoint in args.endpoints:
+                    run = measure(path, file_format, endpoint, args.mode, workdir)
+                    if run['status'] != 200:
+                        raise SystemExit(f"{endpoint} upload failed: {run['status']} {run['result']}")
+                    result = {
+                        'endpoint': endpoint, 'format': file_format, 'rows': count,
+                        'file_mb': round(os.path.getsize(path) / 2 ** 20, 1),
+                        'seconds': run['seconds'],
+                        'rows_per_sec': round(count / run['seconds']) if run['seconds'] else None,
+                        'peak_rss_mb': run['peak_rss_mb'],
+                        'queries': run['queries'],
+                        'db_seconds': run['db_seconds'],
+                    }
+                    results.append(result)
+                    print(f"{endpoint:9} {file_format:5} {count:>9} rows  {result['rows_per_sec']:>8} rows/s  "
+                          f"peak RSS +{result['peak_rss_mb']:>7} MB  {result['queries']} queries")
+
+    if args.baseline:
+        compare(results, args.baseline)
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump({'revision': revision(), 'python': platform.python_version(), 'mode': args.mode,
+                       'results': results}, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
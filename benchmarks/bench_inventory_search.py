@@ -0,0 +1,82 @@
+"""GET /inventory/?search= cost as the inventory grows: ILIKE scan vs. the term index.
+
+    python -m benchmarks.bench_inventory_search --rows 20000 100000 200000
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import or_
+from sqlalchemy.orm import sessionmaker
+
+from app.default.models import Base, Inventory
+from app.utils.ingestion import ingest_inventory
+from app.utils.search import search_tokens, search_ranking
+from benchmarks.check_inventory_swap import sqlite_engine
+from benchmarks.synthetic import HEADER, stock_rows
+
+TERMS = ['m0000042', 'm00001', '34w001', 'u00000012']
+
+
+def ilike_page(db, search, page_size=50):
+    # The query get_inventories used before the search index
+    query = db.query(Inventory).filter(
+        or_(
+            Inventory.inventory_code.ilike(f"%{search}%"),
+            Inventory.product_code.ilike(f"%{search}%"),
+            Inventory.warehouse_code.ilike(f"%{search}%"),
+            Inventory.quantity.ilike(f"%{search}%")
+        )
+    )
+    return query.count(), query.limit(page_size).all()
+
+
+def indexed_page(db, search, page_size=50):
+    ranking = search_ranking(search_tokens(search)).subquery()
+    query = db.query(Inventory).join(ranking, Inventory.inventory_code == ranking.c.inventory_code)
+    return query.count(), query.order_by(ranking.c.rank.desc(), Inventory.inventory_code).limit(page_size).all()
+
+
+def timed(function, db, search, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(db, search)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[20000, 100000, 200000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    for count in args.rows:
+        with tempfile.TemporaryDirectory() as workdir:
+            engine = sqlite_engine(os.path.join(workdir, 'search.db'))
+            Base.metadata.create_all(bind=engine)
+            SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            with SessionLocal() as db:
+                ingest_inventory(db, [pd.DataFrame(list(stock_rows(count)), columns=HEADER)])
+                for term in TERMS:
+                    ilike_ms = timed(ilike_page, db, term, args.repeat)
+                    indexed_ms = timed(indexed_page, db, term, args.repeat)
+                    results.append({'rows': count, 'term': term, 'ilike_ms': round(ilike_ms, 2),
+                                    'indexed_ms': round(indexed_ms, 2)})
+                    print(f"{count:>8} rows  {term:12} ilike {ilike_ms:8.2f} ms  indexed {indexed_ms:8.2f} ms")
+            engine.dispose()
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Whole-country joined inventory: NDJSON stream vs. one /joined/inventory call per warehouse.
+
+Each side gets a fresh uvicorn server on the same seeded SQLite file, so time
+to first byte is measured over a real socket. Server memory is the growth of
+its peak RSS (VmHWM) across the run. Linux only.
+
+    python -m benchmarks.bench_joined_stream --rows 500000
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import pandas as pd
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.synthetic import HEADER, stock_rows
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _peak_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+
+
+def _start_server(env):
+    port = _free_port()
+    server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(port),
+                               '--log-level', 'warning'], env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            httpx.get(base_url + '/metrics')
+            return server, base_url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise SystemExit('uvicorn did not start')
+
+
+def measure(mode, env, warehouses):
+    server, base_url = _start_server(env)
+    try:
+        baseline = _peak_rss_mb(server.pid)
+        started = time.perf_counter()
+        first_byte, rows = None, 0
+        with httpx.Client(base_url=base_url, timeout=None) as client:
+            if mode == 'stream':
+                with client.stream('GET', '/joined/inventory/stream') as response:
+                    for line in response.iter_lines():
+                        if first_byte is None:
+                            first_byte = time.perf_counter() - started
+                        rows += bool(line)
+            else:
+                for code in warehouses:
+                    response = client.get('/joined/inventory', params={'warehouse_code': code})
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                    rows += len(response.json()) if response.status_code == 200 else 0
+        seconds = time.perf_counter() - started
+        return {'rows': rows, 'ttfb_ms': round(first_byte * 1000, 1), 'seconds': round(seconds, 2),
+                'server_peak_rss_growth_mb': round(_peak_rss_mb(server.pid) - baseline, 1)}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'stream.db')
+        os.environ.update(DATABASE_URL=f"sqlite:///{db_path}", ASYNC_DATABASE_URL=f"sqlite+aiosqlite:///{db_path}")
+        from sqlalchemy import select
+        from app.database import engine
+        from app.default.models import Base, Warehouse
+        from app.utils.ingestion import ingest_inventory
+
+        Base.metadata.create_all(bind=engine)
+        with sessionmaker(bind=engine)() as db:
+            ingest_inventory(db, [pd.DataFrame(list(stock_rows(args.rows)), columns=HEADER)])
+            warehouses = db.scalars(select(Warehouse.warehouse_code).order_by(Warehouse.warehouse_code)).all()
+        engine.dispose()
+
+        for mode in ('per-warehouse', 'stream'):
+            results[mode] = measure(mode, dict(os.environ), warehouses)
+            print(f"{mode:14} {results[mode]}")
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
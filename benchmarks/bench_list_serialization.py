@@ -0,0 +1,166 @@
+"""Large list endpoints: the default response-model path vs. the fast JSON path.
+
+Seeds a SQLite database, then requests every endpoint with FAST_JSON_ENABLED
+off and on. The two paths must send byte-identical bodies, except that
+/inventory/ pages only have to decode to the same JSON: the default path
+writes each row's keys in the order SQLAlchemy set the ORM attributes (the
+page ``data`` is not validated against the row schema), the fast path in
+schema field order. The timings are the best of --repeat runs, with the reference cache off (every request reads
+the table) and on (products, cities and warehouses served from the cache).
+A last check sets a price Python prints in exponent notation and expects the
+fast path to still match byte for byte.
+
+    python -m benchmarks.bench_list_serialization --products 50000 --rows 200000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+
+from benchmarks.synthetic import CITY_CODES, seed_inventory, timed, use_sqlite
+
+CITY_NAMES = ['Adana', 'Ankara', 'Antalya', 'Bursa', 'İstanbul', 'İzmir', 'Kocaeli', 'Konya', 'Samsun', 'Trabzon']
+
+
+def _seed(engine, products, rows):
+    from sqlalchemy import bindparam, insert, select, update
+    from sqlalchemy.orm import sessionmaker
+    from app.default.models import Base, City, Product, Region, YearlyAverageConsumption
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    with sessionmaker(bind=engine)() as db:
+        db.execute(insert(Region.__table__), [{'region_code': 'R1', 'region_name': 'Marmara Bölgesi'}])
+        db.execute(insert(City.__table__), [
+            {'city_code': code, 'city_name': name, 'region_code': 'R1' if index % 2 else None}
+            for index, (code, name) in enumerate(zip(CITY_CODES, CITY_NAMES))
+        ])
+        db.commit()
+        seed_inventory(db, rows, products=products)
+        codes = db.scalars(select(Product.product_code)).all()
+        db.execute(update(Product.__table__).where(Product.product_code == bindparam('code')), [
+            {'code': code, 'unit_price': round(rng.uniform(0.5, 50000), rng.choice([0, 2, 4]))} for code in codes
+        ])
+        db.execute(insert(YearlyAverageConsumption.__table__), [
+            {'product_code': code, 'year': year, 'average_usage': None if rng.random() < 0.05 else rng.uniform(0, 1e6)}
+            for code in codes for year in (2023, 2024)
+        ])
+        db.commit()
+
+
+def _bodies(client, paths, repeat):
+    """Body bytes per path and the best time of fetching all of them."""
+    def fetch():
+        bodies = {}
+        for path in paths:
+            response = client.get(path)
+            assert response.status_code == 200, (path, response.status_code, response.text[:200])
+            bodies[path] = (response.headers['content-type'], response.content)
+        return bodies
+    return timed(fetch, repeat)
+
+
+def _paths(client, pages):
+    paths = {
+        'products': ['/products/'],
+        'cities': ['/cities/'],
+        'warehouses': ['/warehouses/'],
+        'averages': ['/average/'],
+        'inventory': ['/inventory/?page_size=200', '/inventory/?page=5&page_size=200',
+                      '/inventory/?search=malzeme&page_size=200', '/inventory/?cursor=&page_size=200&include_total=false'],
+    }
+    # Walk the cursor pages once so both modes request the same ones
+    cursor = ''
+    for _ in range(pages):
+        body = client.get('/inventory/', params={'cursor': cursor, 'page_size': 200, 'include_total': 'false'}).json()
+        if not body['next_cursor']:
+            break
+        cursor = body['next_cursor']
+        paths['inventory'].append(f"/inventory/?cursor={cursor}&page_size=200&include_total=false")
+    return paths
+
+
+def compare(client, paths, repeat):
+    from app.utils.cache import set_reference_cache_enabled
+    from app.utils.fast_json import set_fast_json_enabled
+
+    results = {}
+    for name, endpoint_paths in paths.items():
+        results[name] = {'requests': len(endpoint_paths)}
+        for cached in (False, True):
+            set_reference_cache_enabled(cached)
+            timings = {}
+            bodies = {}
+            for fast in (False, True):
+                set_fast_json_enabled(fast)
+                bodies[fast], timings[fast] = _bodies(client, endpoint_paths, repeat)
+            suffix = '_cached' if cached else ''
+            results[name].update({
+                f'default_ms{suffix}': round(timings[False] * 1000, 1),
+                f'fast_ms{suffix}': round(timings[True] * 1000, 1),
+                f'speedup{suffix}': round(timings[False] / timings[True], 1),
+            })
+            results[name]['identical'] = results[name].get('identical', True) and bodies[False] == bodies[True]
+            results[name]['same_json'] = results[name].get('same_json', True) and all(
+                bodies[False][path][0] == bodies[True][path][0]
+                and json.loads(bodies[False][path][1]) == json.loads(bodies[True][path][1])
+                for path in endpoint_paths
+            )
+        results[name]['bytes'] = sum(len(body) for _, body in bodies[True].values())
+    set_reference_cache_enabled(True)
+    set_fast_json_enabled(False)
+    return results
+
+
+def exponent_prices(client, engine):
+    """Products whose prices repr() writes as 1e-05 and 1e+16 still encode identically."""
+    from sqlalchemy import select, update
+    from sqlalchemy.orm import sessionmaker
+    from app.default.models import Product
+    from app.utils.cache import invalidate_reference
+    from app.utils.fast_json import set_fast_json_enabled
+
+    with sessionmaker(bind=engine)() as db:
+        codes = db.scalars(select(Product.product_code).limit(2)).all()
+        for code, price in zip(codes, (1e-05, 1e16)):
+            db.execute(update(Product.__table__).where(Product.product_code == code).values(unit_price=price))
+        db.commit()
+    bodies = []
+    for fast in (False, True):
+        set_fast_json_enabled(fast)
+        invalidate_reference('products')
+        bodies.append(client.get('/products/').content)
+    set_fast_json_enabled(False)
+    return bodies[0] == bodies[1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--rows', type=int, default=200000, help='inventory rows to seed')
+    parser.add_argument('--pages', type=int, default=20, help='cursor pages of /inventory/ to request')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        use_sqlite(os.path.join(workdir, 'lists.db'))
+        from fastapi.testclient import TestClient
+        from app.database import engine
+        from app.main import app
+
+        _seed(engine, args.products, args.rows)
+        with TestClient(app) as client:
+            results = compare(client, _paths(client, args.pages), args.repeat)
+            results['exponent_prices_identical'] = exponent_prices(client, engine)
+
+    for name, result in results.items():
+        print(f"{name:<26} {result}")
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
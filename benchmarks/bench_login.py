@@ -0,0 +1,133 @@
+"""Login throughput under a burst, and what it does to other sync endpoints.
+
+Many clients hit POST /auth/login at once while a probe keeps calling
+/auth/me, a sync handler served from FastAPI's shared threadpool. The same
+burst is then sent to a copy of the old login that verifies inline in that
+threadpool, for comparison.
+
+    python -m benchmarks.bench_login --clients 200 --duration 10 --rounds 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.synthetic import percentile, use_sqlite
+
+
+def summary(samples):
+    if not samples:
+        return {'requests': 0}
+    return {
+        'requests': len(samples),
+        'p50_ms': round(statistics.median(samples), 1),
+        'p95_ms': round(percentile(samples, 0.95), 1),
+        'max_ms': round(max(samples), 1),
+    }
+
+
+async def burst(client, path, users, clients, duration, token):
+    statuses = {}
+    logins, probes = [], []
+    deadline = time.perf_counter() + duration
+    api_key = {'api-key': '7c7f55abb883c3d4b16f69a15e0c29fc'}
+
+    async def login_loop(index):
+        while time.perf_counter() < deadline:
+            email = f"user{index % users}@example.com"
+            started = time.perf_counter()
+            response = await client.post(path, json={'email': email, 'password': 'secret'}, headers=api_key)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                logins.append((time.perf_counter() - started) * 1000)
+            elif response.status_code == 503:
+                await asyncio.sleep(float(response.headers.get('retry-after', '1')))
+
+    async def probe_loop():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await client.get('/auth/me', headers={'Authorization': f"Bearer {token}"})
+            probes.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(probe_loop(), *[login_loop(index) for index in range(clients)])
+    return {
+        'logins_per_sec': round(len(logins) / duration, 1),
+        'statuses': statuses,
+        'login': summary(logins),
+        'auth_me_probe': summary(probes),
+    }
+
+
+async def run(args):
+    import httpx
+    from fastapi import Depends, HTTPException
+    from sqlalchemy import insert
+    from sqlalchemy.orm import Session
+
+    from app import auth_model
+    from app.auth import auth_schema
+    from app.database import engine, get_db
+    from app.main import app
+    from app.routers.auth import create_access_token
+    from app.utils.passwords import pwd_context
+
+    @app.post('/bench/legacy-login')
+    def legacy_login(user: auth_schema.UserCreate, db: Session = Depends(get_db)):
+        # The login before the password pool: bcrypt inline on a shared threadpool thread
+        db_user = db.query(auth_model.User).filter(auth_model.User.email == user.email).first()
+        if not db_user or not pwd_context.verify(user.password, db_user.hashed_password):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        return {'access_token': create_access_token({'sub': user.email}), 'token_type': 'bearer'}
+
+    auth_model.Base.metadata.create_all(bind=engine)
+    hashed = pwd_context.hash('secret')
+    with engine.begin() as conn:
+        conn.execute(insert(auth_model.User.__table__), [
+            {'username': f"user{i}", 'email': f"user{i}@example.com", 'hashed_password': hashed}
+            for i in range(args.users)
+        ])
+    token = create_access_token({'sub': 'user0@example.com'})
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+            await client.get('/auth/me', headers={'Authorization': f"Bearer {token}"})
+            for name, path in (('password pool', '/auth/login'), ('inline (old)', '/bench/legacy-login')):
+                results[name] = await burst(client, path, args.users, args.clients, args.duration, token)
+                print(f"{name:14} {json.dumps(results[name])}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--rounds', type=int, default=10, help='BCRYPT_ROUNDS for the run')
+    parser.add_argument('--workers', type=int, help='PASSWORD_HASH_WORKERS for the run')
+    parser.add_argument('--queue-limit', type=int, help='PASSWORD_HASH_QUEUE_LIMIT for the run')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Settings are read at import time, so set them before the app is imported
+        settings = {'BCRYPT_ROUNDS': args.rounds}
+        if args.workers:
+            settings['PASSWORD_HASH_WORKERS'] = args.workers
+        if args.queue_limit is not None:
+            settings['PASSWORD_HASH_QUEUE_LIMIT'] = args.queue_limit
+        use_sqlite(os.path.join(workdir, 'login.db'), **settings)
+        results = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
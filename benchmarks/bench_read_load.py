@@ -0,0 +1,272 @@
+"""Concurrent load on the read API, with p50/p95/p99 latency per route.
+
+The app from app/main.py runs in-process (httpx ASGITransport) against a
+seeded SQLite database, and many client tasks send a weighted mix of
+/inventory/, /joined/inventory, /warehouses/ and /auth/me requests.
+
+Pass git revisions to compare them: each one is checked out into a temporary
+``git worktree`` and measured in its own interpreter with identical data.
+
+    python -m benchmarks.bench_read_load --clients 32 --duration 15
+    python -m benchmarks.bench_read_load --revisions HEAD~5 HEAD --output load.json
+
+This file is run by path for other revisions, so the child side only imports
+``app`` (from the revision under test) and nothing from ``benchmarks``: it
+seeds with the revision's own models and sends back raw latencies, which the
+parent summarizes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+WORKING_TREE = '.'
+DEFAULT_MIX = 'inventory=4,joined=2,warehouses=3,me=1'
+CITY_CODES = ['01', '06', '07', '16', '34', '35', '41', '42', '55', '61']
+USER_EMAIL = 'load@example.com'
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {'inventory', 'joined', 'warehouses', 'me'}
+    if unknown:
+        raise SystemExit(f"Unknown routes in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+# --- child: runs inside the revision under test -------------------------------------------------
+
+def _seed(engine, rows, warehouses, products):
+    from sqlalchemy import insert
+    from app import auth_model
+    from app.default.models import Base, Region, City, Warehouse, Product, Inventory, YearlyAverageConsumption
+
+    Base.metadata.create_all(bind=engine)
+    auth_model.Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(Region.__table__), [{'region_code': 'R1', 'region_name': 'Region 1'}])
+        conn.execute(insert(City.__table__), [
+            {'city_code': code, 'city_name': f"City {code}", 'region_code': 'R1'} for code in CITY_CODES
+        ])
+        conn.execute(insert(Warehouse.__table__), [
+            {'warehouse_code': f"{CITY_CODES[w % len(CITY_CODES)]}W{w:03d}", 'warehouse_name': f"Depo {w}",
+             'city_code': CITY_CODES[w % len(CITY_CODES)]}
+            for w in range(warehouses)
+        ])
+        conn.execute(insert(Product.__table__), [
+            {'product_code': f"M{p:07d}", 'product_name': f"Malzeme {p}", 'unit_price': rng.randrange(1, 500)}
+            for p in range(products)
+        ])
+        conn.execute(insert(YearlyAverageConsumption.__table__), [
+            {'product_code': f"M{p:07d}", 'average_usage': rng.randrange(0, 1000), 'year': now.year - 1}
+            for p in range(products)
+        ])
+        for start in range(0, rows, 10000):
+            conn.execute(insert(Inventory.__table__), [
+                {'inventory_code': f"U{i:09d}", 'product_code': f"M{rng.randrange(products):07d}",
+                 'warehouse_code': f"{CITY_CODES[w % len(CITY_CODES)]}W{w:03d}",
+                 'quantity': rng.randrange(0, 5000), 'timestamp': now}
+                for i in range(start, min(rows, start + 10000)) for w in [rng.randrange(warehouses)]
+            ])
+        conn.execute(insert(auth_model.User.__table__), [
+            {'username': 'load', 'email': USER_EMAIL, 'hashed_password': 'not-used'}
+        ])
+
+
+def _use_database(path):
+    """Point the revision's app at the SQLite file, whether or not it reads DATABASE_URL."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    import app.database as database
+
+    if database.engine.url.get_backend_name() != 'sqlite':
+        # Revisions with a hard-coded MySQL URL
+        database.engine = create_engine(f"sqlite:///{path}", connect_args={'check_same_thread': False})
+        database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=database.engine)
+        if hasattr(database, 'AsyncSessionLocal'):
+            from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+            database.async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+            database.AsyncSessionLocal = sessionmaker(bind=database.async_engine, class_=AsyncSession,
+                                                      autoflush=False, expire_on_commit=False)
+    return database.engine
+
+
+async def _drive(app, mix, clients, duration, warmup, warehouses, pages, token):
+    import httpx
+
+    routes = list(mix)
+    weights = [mix[name] for name in routes]
+    samples = {name: [] for name in routes}
+    errors = {name: 0 for name in routes}
+    headers = {'Authorization': f"Bearer {token}"}
+
+    def request_for(name, rng):
+        if name == 'inventory':
+            return f"/inventory/?page={rng.randrange(1, pages + 1)}&page_size=50"
+        if name == 'joined':
+            w = rng.randrange(warehouses)
+            return f"/joined/inventory?warehouse_code={CITY_CODES[w % len(CITY_CODES)]}W{w:03d}"
+        if name == 'warehouses':
+            return "/warehouses/"
+        return "/auth/me"
+
+    async def client_loop(client, seed, started, deadline):
+        rng = random.Random(seed)
+        while True:
+            name = rng.choices(routes, weights)[0]
+            sent = time.perf_counter()
+            if sent >= deadline:
+                return
+            response = await client.get(request_for(name, rng), headers=headers)
+            if sent >= started + warmup:
+                samples[name].append((time.perf_counter() - sent) * 1000)
+                if response.status_code >= 400:
+                    errors[name] += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://load') as client:
+            started = time.perf_counter()
+            deadline = started + warmup + duration
+            await asyncio.gather(*[client_loop(client, seed, started, deadline) for seed in range(clients)])
+
+    return {'duration': duration, 'samples': samples, 'errors': errors}
+
+
+def _child(args):
+    path = os.path.join(args.workdir, 'load.db')
+    engine = _use_database(path)
+    _seed(engine, args.rows, args.warehouses, args.products)
+
+    from app.main import app
+    from app.routers.auth import create_access_token
+
+    token = create_access_token({'sub': USER_EMAIL})
+    pages = max(1, args.rows // 50)
+    results = asyncio.run(_drive(app, parse_mix(args.mix), args.clients, args.duration, args.warmup,
+                                 args.warehouses, pages, token))
+    print(json.dumps(results))
+
+
+# --- parent --------------------------------------------------------------------------------------
+
+def _checkout(revision, workdir):
+    if revision == WORKING_TREE:
+        return os.getcwd(), None
+    path = os.path.join(workdir, 'rev-' + revision.replace('/', '_').replace('~', '_').replace('^', '_'))
+    subprocess.run(['git', 'worktree', 'add', '--detach', path, revision], check=True, capture_output=True)
+    return path, path
+
+
+def summarize(run):
+    """Requests, rate and p50/p95/p99 per route from a child's raw latencies."""
+    from benchmarks.synthetic import percentile
+
+    duration, samples = run['duration'], run['samples']
+    results = {}
+    for name, values in samples.items():
+        if not values:
+            continue
+        results[name] = {
+            'requests': len(values),
+            'errors': run['errors'][name],
+            'rps': round(len(values) / duration, 1),
+            'p50_ms': round(statistics.median(values), 2),
+            'p95_ms': round(percentile(values, 0.95), 2),
+            'p99_ms': round(percentile(values, 0.99), 2),
+        }
+    results['total'] = {'requests': sum(len(v) for v in samples.values()),
+                        'rps': round(sum(len(v) for v in samples.values()) / duration, 1)}
+    return results
+
+
+def measure(revision, args, workdir):
+    tree, worktree = _checkout(revision, workdir)
+    rundir = tempfile.mkdtemp(dir=workdir)
+    db_path = os.path.join(rundir, 'load.db')
+    env = dict(os.environ, PYTHONPATH=tree, DATABASE_URL=f"sqlite:///{db_path}",
+               ASYNC_DATABASE_URL=f"sqlite+aiosqlite:///{db_path}")
+    command = [sys.executable, os.path.abspath(__file__), '--child', '--workdir', rundir,
+               '--rows', str(args.rows), '--warehouses', str(args.warehouses), '--products', str(args.products),
+               '--clients', str(args.clients), '--duration', str(args.duration), '--warmup', str(args.warmup),
+               '--mix', args.mix]
+    try:
+        completed = subprocess.run(command, cwd=tree, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise SystemExit(f"Load run for {revision} failed:\n{completed.stderr[-4000:]}")
+        return summarize(json.loads(completed.stdout.strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(rundir, ignore_errors=True)
+        if worktree:
+            subprocess.run(['git', 'worktree', 'remove', '--force', worktree], capture_output=True)
+
+
+def report(results):
+    revisions = list(results)
+    routes = [name for name in results[revisions[0]] if name != 'total']
+    for name in routes + ['total']:
+        for revision in revisions:
+            stats = results[revision].get(name)
+            if stats is None:
+                continue
+            if name == 'total':
+                print(f"{name:11} {revision:14} {stats['rps']:>9} req/s")
+            else:
+                print(f"{name:11} {revision:14} {stats['rps']:>9} req/s  p50 {stats['p50_ms']:>8} ms  "
+                      f"p95 {stats['p95_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms  errors {stats['errors']}")
+    if len(revisions) == 2:
+        before, after = (results[r] for r in revisions)
+        for name in routes:
+            if name in before and name in after:
+                print(f"{name:11} p95 x{after[name]['p95_ms'] / before[name]['p95_ms']:.2f} "
+                      f"({revisions[0]} -> {revisions[1]})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--revisions', nargs='+', default=[WORKING_TREE],
+                        help="git revisions to measure; '.' is the working tree")
+    parser.add_argument('--rows', type=int, default=50000, help='inventory rows to seed')
+    parser.add_argument('--warehouses', type=int, default=200)
+    parser.add_argument('--products', type=int, default=2500)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0, help='measured seconds per revision')
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='route weights, e.g. inventory=4,me=1')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args)
+        return
+
+    parse_mix(args.mix)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for revision in args.revisions:
+            results[revision] = measure(revision, args, workdir)
+    report(results)
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump({'settings': {'rows': args.rows, 'clients': args.clients, 'duration': args.duration,
+                                    'mix': args.mix}, 'results': results}, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
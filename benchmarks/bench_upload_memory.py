@@ -0,0 +1,80 @@
+"""Peak RSS of parsing a stock file: whole-file pandas read vs. the streaming reader.
+
+    python -m benchmarks.bench_upload_memory --rows 20000 50000 100000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import stock_rows, write_xlsx, write_spreadsheetml
+
+WRITERS = {'xlsx': write_xlsx, 'xml': write_spreadsheetml}
+
+
+def _peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _parse(path, file_format, mode):
+    # Runs in a fresh interpreter so ru_maxrss only reflects this parse
+    import pandas as pd
+    from io import BytesIO
+    from app.utils.converter import xml_to_dataframe
+    from app.utils.spreadsheet import iter_upload_chunks
+
+    baseline = _peak_rss_kb()
+    rows = 0
+    if mode == 'full':
+        with open(path, 'rb') as handle:
+            content = handle.read()
+        df = pd.read_excel(BytesIO(content)) if file_format == 'xlsx' else xml_to_dataframe(BytesIO(content))
+        rows = len(df)
+    else:
+        for chunk in iter_upload_chunks(path, file_format):
+            rows += len(chunk)
+    print(json.dumps({'rows': rows, 'peak_rss_mb': round((_peak_rss_kb() - baseline) / 1024, 1)}))
+
+
+def measure(path, file_format, mode):
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_upload_memory', '--child', path, file_format, mode],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[20000, 50000, 100000])
+    parser.add_argument('--formats', nargs='+', default=['xlsx', 'xml'], choices=sorted(WRITERS))
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--child', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _parse(*args.child)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for file_format in args.formats:
+            for count in args.rows:
+                path = os.path.join(workdir, f"stock_{count}.{file_format}")
+                WRITERS[file_format](path, stock_rows(count))
+                for mode in ('full', 'streaming'):
+                    result = measure(path, file_format, mode)
+                    result.update(format=file_format, mode=mode, file_mb=round(os.path.getsize(path) / 2 ** 20, 1))
+                    results.append(result)
+                    print(f"{file_format:5} {count:>9} rows {mode:10} peak RSS +{result['peak_rss_mb']:>7} MB")
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Yearly averages from consumption uploads and from inventory history, on a scratch SQLite database.
+
+- Two consecutive monthly uploads add up into one annualized rate instead of
+  the second overwriting the first; ``replace`` drops the earlier uploads.
+- In history, a row that moves warehouse or is removed and re-added keeps its
+  stock: only real drops count as consumption.
+- A yearly_average_consumption table created before its unique index keeps the
+  newest of each duplicated (product, year) and gets the index, so upserts
+  overwrite again.
+
+    python -m benchmarks.check_consumption_averages
+"""
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.default.models import Base, Product, YearlyAverageConsumption
+from app.utils.averages import ensure_average_uniqueness, history_averages, upsert_averages
+from app.utils.forecast import DAYS_PER_YEAR
+from app.utils.ingestion import ingest_consumption
+
+
+def _daily(product_usage, first, days):
+    # One row per product and day, dated like the ERP exports
+    return pd.DataFrame([
+        {'Malzeme': product, 'Tarih': (first + timedelta(days=day)).strftime('%d.%m.%Y'), 'Miktar': usage}
+        for product, usage in product_usage.items() for day in range(days)
+    ])
+
+
+def _averages(db):
+    return {row.product_code: round(row.average_usage, 6)
+            for row in db.execute(select(YearlyAverageConsumption).where(YearlyAverageConsumption.year == 2024))
+            .scalars()}
+
+
+def uploads(db):
+    db.execute(insert(Product.__table__), [{'product_code': code, 'product_name': code, 'unit_price': 1.0}
+                                           for code in ('P1', 'P2')])
+    db.commit()
+    january = ingest_consumption(db, [_daily({'P1': 1, 'P2': 2}, date(2024, 1, 1), 31)])
+    after_january = _averages(db)
+    february = ingest_consumption(db, [_daily({'P1': 3}, date(2024, 2, 1), 29)])
+    after_february = _averages(db)
+    ingest_consumption(db, [pd.DataFrame([{'Malzeme': 'P1', 'Yıl': 2024, 'Miktar': 730}])], replace=True)
+    replaced = _averages(db)
+    return {
+        'january covers 31 days': january['covered_days'] == {2024: 31.0},
+        'january annualized': after_january == {'P1': DAYS_PER_YEAR * 1.0, 'P2': DAYS_PER_YEAR * 2.0},
+        'february adds to january': february['covered_days'] == {2024: 29.0} and after_february == {
+            'P1': round((31 + 3 * 29) / 60 * DAYS_PER_YEAR, 6), 'P2': round(62 / 60 * DAYS_PER_YEAR, 6)},
+        'replace drops earlier uploads': replaced == {'P1': 730.0, 'P2': 0.0},
+    }
+
+
+def history():
+    start = datetime(2024, 1, 1)
+    taken = [start + timedelta(days=10 * index) for index in range(5)]
+    rows = [
+        # I1 moves from W1 to W2 with its stock, then 20 are used
+        (taken[0], 'I1', 'P1', 'W1', 100), (taken[1], 'I1', 'P1', 'W2', 100), (taken[2], 'I1', 'P1', 'W2', 80),
+        # I2 is removed and re-added with the same stock, then 5 are used
+        (taken[0], 'I2', 'P2', 'W1', 50), (taken[1], 'I2', 'P2', 'W1', None), (taken[2], 'I2', 'P2', 'W1', 50),
+        (taken[3], 'I2', 'P2', 'W1', 45),
+    ]
+    frame = pd.DataFrame(rows, columns=['taken_at', 'inventory_code', 'product_code', 'warehouse_code', 'quantity'])
+    averages = history_averages(frame, pd.DataFrame({'taken_at': taken}))
+    consumed = dict(zip(averages['product_code'], averages['consumed']))
+    return {
+        'warehouse move is not consumption': consumed.get('P1') == 20,
+        'removal and re-add is not consumption': consumed.get('P2') == 5,
+    }
+
+
+def existing_table(engine):
+    table = YearlyAverageConsumption.__table__
+    with engine.connect() as conn:
+        # As create_all made it before the model had the unique constraint
+        conn.exec_driver_sql("CREATE TABLE yearly_average_consumption (id INTEGER PRIMARY KEY, "
+                             "product_code VARCHAR(50), year INTEGER, average_usage FLOAT)")
+        conn.execute(insert(table), [{'product_code': 'P1', 'year': 2024, 'average_usage': usage} for usage in (1, 2, 3)]
+                     + [{'product_code': 'P2', 'year': 2024, 'average_usage': 4}])
+        conn.commit()
+    with sessionmaker(bind=engine)() as db:
+        ensure_average_uniqueness(db)
+        kept = _averages(db)
+        upsert_averages(db, [{'product_code': 'P1', 'year': 2024, 'average_usage': 5}])
+        db.commit()
+        rows = db.scalar(select(func.count()).select_from(table))
+        return {
+            'duplicates keep the newest row': kept == {'P1': 3.0, 'P2': 4.0},
+            'upsert overwrites after the index exists': rows == 2 and _averages(db)['P1'] == 5.0,
+        }
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'averages.db')}")
+        Base.metadata.create_all(bind=engine)
+        with sessionmaker(bind=engine)() as db:
+            checks = {**uploads(db), **history()}
+        engine.dispose()
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'existing.db')}")
+        checks.update(existing_table(engine))
+        engine.dispose()
+    for name, ok in checks.items():
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == '__main__':
+    main()
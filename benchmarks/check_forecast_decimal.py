@@ -0,0 +1,42 @@
+"""Stock forecast rows from MySQL-typed inputs must serialize like SQLite's.
+
+MySQL returns ``SUM`` over integers as ``Decimal``; the forecast rows handed
+to ``JSONResponse`` have to be plain ints and floats either way. Also checks
+that ``stock_totals`` casts its sums for the mysql dialect.
+
+    python -m benchmarks.check_forecast_decimal
+"""
+import json
+import sys
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy.dialects import mysql
+
+from app.utils.forecast import forecast_rows
+from app.utils.rollups import stock_totals
+
+ROWS = [('P1', 120, 3650.0), ('P2', 0, 10.5), ('P3', 5000, None), ('P4', 40, 0.0)]
+
+
+def main():
+    today = date(2024, 1, 1)
+    expected = json.dumps(forecast_rows(ROWS, 30, today=today))
+    decimal_rows = [(code, Decimal(quantity), None if usage is None else Decimal(str(usage)))
+                    for code, quantity, usage in ROWS]
+    try:
+        actual = json.dumps(forecast_rows(decimal_rows, 30, today=today))
+    except TypeError as e:
+        actual = f"TypeError: {e}"
+    sql = str(stock_totals(['product']).compile(dialect=mysql.dialect()))
+    checks = {
+        'decimal rows serialize like int rows': actual == expected,
+        'stock_totals casts SUM for mysql': sql.count('CAST(sum(') == 2,
+    }
+    for name, ok in checks.items():
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Inventory uploads with a blank 'Malzeme Tanım' must create products the read API can serve.
+
+The rows are ingested into a scratch SQLite database, then every product and
+joined read-model row is validated against its response schema (a ``None``
+name made GET /products/ and /joined/inventory fail with 500).
+
+    python -m benchmarks.check_inventory_names
+"""
+import os
+import sys
+import tempfile
+
+import pandas as pd
+from pydantic import ValidationError
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app.default.models import Base, Product
+from app.default.schemas import Product as ProductSchema
+from app.joined.joined_models import JoinedInventory
+from app.joined.joined_schemas import JoinedInventoryResponse
+from app.utils.ingestion import ingest_inventory
+from benchmarks.synthetic import HEADER
+
+ROWS = [
+    ('M1', 'Vida', '34W001', 'U1', 10),
+    ('M2', None, '34W001', 'U2', 20),
+    ('M3', '   ', '06W002', 'U3', 30),
+]
+
+
+def _valid(schema, rows):
+    try:
+        return [schema.from_orm(row) for row in rows]
+    except ValidationError as e:
+        print(e)
+        return None
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'names.db')}")
+        Base.metadata.create_all(bind=engine)
+        with sessionmaker(bind=engine)() as db:
+            ingest_inventory(db, [pd.DataFrame(ROWS, columns=HEADER)])
+            products = _valid(ProductSchema, db.scalars(select(Product).order_by(Product.product_code)).all())
+            joined = _valid(JoinedInventoryResponse, db.scalars(select(JoinedInventory)).all())
+        engine.dispose()
+
+    checks = {
+        'products validate': products is not None,
+        'joined rows validate': joined is not None and len(joined) == len(ROWS),
+        'blank names fall back to the code': products is not None
+        and [product.product_name for product in products] == ['Vida', 'M2', 'M3'],
+    }
+    for name, ok in checks.items():
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == '__main__':
+    main()
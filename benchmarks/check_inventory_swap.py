@@ -0,0 +1,82 @@
+"""Replace uploads against a local SQLite stand-in while readers keep querying.
+
+Every count a reader sees must be the size of a complete upload; an empty or
+partially loaded inventory fails the check.
+
+    python -m benchmarks.check_inventory_swap --loads 6
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+import pandas as pd
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.default.models import Base, Inventory
+from app.utils.ingestion import ingest_inventory
+from benchmarks.synthetic import HEADER, stock_rows
+
+
+def sqlite_engine(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={'check_same_thread': False, 'timeout': 30})
+
+    @event.listens_for(engine, 'connect')
+    def _wal(dbapi_connection, connection_record):
+        # WAL lets readers run while the loader writes, like InnoDB does
+        dbapi_connection.execute('PRAGMA journal_mode=WAL')
+
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs=2, default=[20000, 30000])
+    parser.add_argument('--loads', type=int, default=6)
+    parser.add_argument('--readers', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = sqlite_engine(os.path.join(workdir, 'swap.db'))
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        frames = [pd.DataFrame(list(stock_rows(size, seed=size)), columns=HEADER) for size in args.sizes]
+
+        with SessionLocal() as db:
+            ingest_inventory(db, [frames[0]])
+
+        observed = set()
+        done = threading.Event()
+
+        def reader():
+            with engine.connect() as conn:
+                while not done.is_set():
+                    observed.add(conn.execute(select(func.count()).select_from(Inventory)).scalar())
+                    conn.rollback()
+
+        threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for load in range(args.loads):
+                with SessionLocal() as db:
+                    stats = ingest_inventory(db, [frames[(load + 1) % 2]])
+                print(f"load {load + 1}: {stats['inserted']} rows, {stats['rows_per_sec']} rows/sec")
+        finally:
+            done.set()
+            for thread in threads:
+                thread.join()
+        engine.dispose()
+
+    unexpected = observed - set(args.sizes)
+    print(f"reader saw counts {sorted(observed)}")
+    if unexpected:
+        print(f"FAIL: partial inventory visible to readers: {sorted(unexpected)}")
+        sys.exit(1)
+    print("OK: readers only saw complete inventories")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Search token prefix matching: correct for any token and served by the term index.
+
+Terms are inserted into a scratch SQLite index and every token is matched in
+SQL and in Python; they must agree, including tokens ending in '9' or 'z'
+(an upper range bound of ':' or '{' broke those under MySQL's default
+collation) and tokens holding LIKE/GLOB wildcards. SQLite's plan must search
+the term index rather than scan the table, and the MySQL statement must be a
+plain escaped ``LIKE 'prefix%'``.
+
+    python -m benchmarks.check_search_prefix
+"""
+import os
+import sys
+import tempfile
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.dialects import mysql
+
+from app.default.models import Base, InventorySearchTerm
+from app.utils.search import prefix_match
+
+TERMS = ['m009', 'm0091', 'm00a', 'm010', 'wz', 'wza', 'wz{', 'x9', 'x:', 'a_b', 'axb', '50%', '500', 'a*b', 'a[1]',
+         'a?', 'a/b', 'ş1', 'şz']
+TOKENS = ['m009', 'm00', 'wz', 'x9', 'a_', 'a_b', '50%', 'a*', 'a[', 'a?', 'a/', 'ş', 'z', '9']
+
+
+def main():
+    terms = InventorySearchTerm.__table__
+    checks = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'terms.db')}")
+        Base.metadata.create_all(bind=engine, tables=[terms])
+        with engine.begin() as conn:
+            conn.execute(insert(terms), [{'term': term, 'inventory_code': f"I{index}", 'weight': 1}
+                                         for index, term in enumerate(TERMS)])
+            for token in TOKENS:
+                found = sorted(conn.scalars(select(terms.c.term).where(prefix_match(terms.c.term, token))))
+                expected = sorted(term for term in TERMS if term.startswith(token))
+                checks[f"sqlite {token!r} matches {expected}"] = found == expected
+            statement = select(terms.c.inventory_code).where(prefix_match(terms.c.term, 'm009'))
+            compiled = statement.compile(dialect=engine.dialect)
+            plan = ' '.join(str(row[-1]) for row in conn.exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {compiled}", tuple(compiled.params.values())))
+            checks[f"sqlite searches the term index ({plan})"] = 'SEARCH' in plan
+        engine.dispose()
+
+    compiled = select(terms.c.inventory_code).where(prefix_match(terms.c.term, 'a_9%')).compile(dialect=mysql.dialect())
+    checks["mysql uses an escaped LIKE 'prefix%'"] = (
+        "LIKE %s ESCAPE '/'" in str(compiled) and list(compiled.params.values()) == ['a/_9/%%']
+    )
+
+    for name, ok in checks.items():
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == '__main__':
+    main()
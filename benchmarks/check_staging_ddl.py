@@ -0,0 +1,51 @@
+"""Compile the staging-table DDL of every swapped table for each production dialect.
+
+Replace uploads and rebuilds create their staging tables through
+``staging_ddl``; a statement that can't compile for a dialect (MySQL refuses
+``VARCHAR`` without a length) would fail every upload before a row is loaded.
+Every dialect must also carry the table's foreign keys: MySQL's
+``CREATE TABLE ... LIKE`` copies none, so the swapped-in table would lose them.
+Nothing connects to a database.
+
+    python -m benchmarks.check_staging_ddl
+"""
+import sys
+
+from sqlalchemy import MetaData
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app.default.models import Inventory, InventorySearchTerm, StockRollup
+from app.joined.joined_models import JoinedInventory
+from app.utils.table_swap import staging_ddl
+
+SWAPPED = [Inventory.__table__, InventorySearchTerm.__table__, JoinedInventory.__table__, StockRollup.__table__]
+DIALECTS = [mysql.dialect(), postgresql.dialect(), sqlite.dialect()]
+
+
+def main():
+    failures = 0
+    for table in SWAPPED:
+        metadata = MetaData()
+        for fk in table.foreign_keys:
+            fk.column.table.to_metadata(metadata)
+        staging = table.to_metadata(metadata, name=f"{table.name}_staging_check")
+        for dialect in DIALECTS:
+            try:
+                statements = staging_ddl(dialect, table, staging)
+            except Exception as e:
+                failures += 1
+                print(f"FAIL {table.name:<24} {dialect.name:<10} {type(e).__name__}: {e}")
+                continue
+            foreign_keys = sum(statement.count('FOREIGN KEY') for statement in statements)
+            if foreign_keys != len(table.foreign_key_constraints):
+                failures += 1
+                print(f"FAIL {table.name:<24} {dialect.name:<10} {foreign_keys} of "
+                      f"{len(table.foreign_key_constraints)} foreign keys")
+                continue
+            print(f"ok   {table.name:<24} {dialect.name:<10} {statements[0].split('(')[0].strip()}"
+                  f" + {foreign_keys} foreign keys")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import os
+import random
+import time
+from xml.sax.saxutils import escape
+
+from openpyxl import Workbook
+
+from app.utils.converter import SS_NAMESPACE
+
+HEADER = ['Malzeme', 'Malzeme Tanım', 'DepoY.', 'UNIQID', 'Toplam Miktar']
+CITY_CODES = ['01', '06', '07', '16', '34', '35', '41', '42', '55', '61']
+
+
+def stock_rows(count, products=None, warehouses=None, seed=42):
+    rng = random.Random(seed)
+    products = products or max(1, count // 20)
+    warehouses = warehouses or max(1, min(500, count // 200))
+    for index in range(count):
+        product = rng.randrange(products)
+        warehouse = rng.randrange(warehouses)
+        city = CITY_CODES[warehouse % len(CITY_CODES)]
+        yield (
+            f"M{product:07d}",
+            f"Malzeme {product}",
+            f"{city}W{warehouse:03d}",
+            f"U{index:09d}",
+            rng.randrange(0, 5000),
+        )
+
+
+def write_xlsx(path, rows):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+def _xml_cell(value):
+    kind = 'Number' if isinstance(value, (int, float)) else 'String'
+    return f'<Cell><Data ss:Type="{kind}">{escape(str(value))}</Data></Cell>'
+
+
+def write_spreadsheetml(path, rows):
+    with open(path, 'w', encoding='utf-8') as out:
+        out.write('<?xml version="1.0"?>\n')
+        out.write(f'<Workbook xmlns="{SS_NAMESPACE}" xmlns:ss="{SS_NAMESPACE}">\n')
+        out.write('<Worksheet ss:Name="Sheet1"><Table>\n')
+        out.write('<Row>' + ''.join(_xml_cell(value) for value in HEADER) + '</Row>\n')
+        for row in rows:
+            out.write('<Row>' + ''.join(_xml_cell(value) for value in row) + '</Row>\n')
+        out.write('</Table></Worksheet>\n</Workbook>\n')
+
+
+def use_sqlite(path, **settings):
+    """Point the app at a SQLite file; settings are read at import time, so call this before importing ``app``."""
+    os.environ.update(DATABASE_URL=f"sqlite:///{path}", ASYNC_DATABASE_URL=f"sqlite+aiosqlite:///{path}",
+                      **{name: str(value) for name, value in settings.items()})
+
+
+def seed_inventory(db, rows, products=None):
+    """Load ``rows`` synthetic stock rows through the inventory import, creating their products and warehouses."""
+    import pandas as pd
+    from app.utils.ingestion import ingest_inventory
+
+    return ingest_inventory(db, [pd.DataFrame(list(stock_rows(rows, products=products)), columns=HEADER)])
+
+
+def timed(function, repeat):
+    """The result of ``function`` and its best time in seconds over ``repeat`` calls."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]